@@ -2,7 +2,47 @@ import numpy as np
 import pandas as pd
 import re
 
-
+import instrumentation
+import row_guard
+
+
+# Dog breeds by breed group
+DOG_BREED_GROUPS = {
+    "Herding": ["Australian Cattle Dog", "Australian Shepherd", "Bearded Collie", "Beauceron", "Belgian Malinois", "Belgian Sheepdog", "Belgian Tervuren", "Black", "Black Mouth Cur", "Blue Lacy", "Border Collie", "Cardigan Welsh Corgi", "Catahoula", "Collie Rough", "Collie Smooth", "English Shepherd", "Entlebucher", "German Shepherd", "Old English Sheepdog", "Pembroke Welsh Corgi", "Picardy Sheepdog", "Queensland Heeler", "Shetland Sheepdog", "Spanish Water Dog", "Swedish Vallhund"],
+    "Hound": ["Afghan Hound", "American Foxhound", "Basenji", "Basset Hound", "Beagle", "Bloodhound", "Bluetick Hound", "Borzoi", "Dachshund", "Dachshund Longhair", "Dachshund Wirehair", "English Coonhound", "English Foxhound", "Greyhound", "Harrier", "Ibizan Hound", "Irish Wolfhound", "Norwegian Elkhound", "Otterhound", "Pbgv", "Pharaoh Hound", "Plott Hound", "Podengo Pequeno", "Redbone Hound", "Rhod Ridgeback"],
+    "Non-Sporting": ["American Bulldog", "American Eskimo", "Bichon Frise", "Boston Terrier", "Bulldog", "Chinese Sharpei", "Chow Chow", "Dalmatian", "English Bulldog", "Finnish Spitz", "French Bulldog", "Jindo", "Keeshond", "Lhasa Apso", "Lowchen", "Mexican Hairless", "Miniature Poodle", "Schipperke", "Shiba Inu", "Standard Poodle", "Tibetan Spaniel", "Tibetan Terrier"],
+    "Sporting": ["Anatol Shepherd", "Boykin Span", "Brittany", "Chesa Bay Retr", "Cocker Spaniel", "Dutch Shepherd", "English Cocker Spaniel", "English Pointer", "English Setter", "English Springer Spaniel", "Field Spaniel", "Flat Coat Retriever", "German Shorthair Pointer", "German Wirehaired Pointer", "Golden Retriever", "Irish Setter", "Labrador Retriever", "Nova Scotia Duck Tolling Retriever", "Pointer", "Spinone Italiano", "Vizsla", "Weimaraner", "Welsh Springer Spaniel", "Wirehaired Pointing Griffon"],
+    "Terrier": ["Airedale Terrier", "American Pit Bull Terrier", "American Pit Terrier", "American Staffordshire Terrier", "Australian Terrier", "Bedlington Terr", "Border Terrier", "Bull Terrier", "Bull Terrier Miniature", "Cairn Terrier", "Feist", "Glen Of Imaal", "Irish Terrier", "Jack Russell Terrier", "Manchester Terrier", "Miniature Schnauzer", "Norfolk Terrier", "Norwich Terrier", "Parson Russell Terrier", "Patterdale Terr", "Rat Terrier", "Scottish Terrier", "Sealyham Terr", "Skye Terrier", "Smooth Fox Terrier"],
+    "Toy": ["Affenpinscher", "Bruss Griffon", "Cavalier Span", "Chihuahua Longhair", "Chihuahua Shorthair", "Chinese Crested", "Havanese", "Italian Greyhound", "Japanese Chin", "Maltese", "Miniature Pinscher", "Papillon", "Pekingese", "Pomeranian", "Pug", "Shih Tzu", "Silky Terrier", "Toy Fox Terrier", "Toy Poodle", "Yorkshire", "Yorkshire Terrier"],
+    "Working": ["Akita", "Alaskan Malamute", "Australian Kelpie", "Bernese Mountain Dog", "Boerboel", "Boxer", "Bullmastiff", "Canaan Dog", "Cane Corso", "Doberman Pinsch", "Dogue De Bordeaux", "German Pinscher", "Great Dane", "Great Pyrenees", "Greater Swiss Mountain Dog", "Kuvasz", "Leonberger", "Mastiff", "Neapolitan Mastiff", "Newfoundland", "Port Water Dog", "Rottweiler", "Samoyed", "Schnauzer Giant", "Siberian Husky"]
+}
+# Cat breeds by breed type
+CAT_BREED_GROUPS = {
+    "Domestic Longhair": ["Domestic Longhair"],
+    "Domestic Mediumhair": ["Domestic Medium Hair"],
+    "Domestic Shorthair": ["Domestic Shorthair", "British Shorthair", "American Shorthair"],
+    "Pixiebob": ["Pixiebob Shorthair"]
+}
+# Replacements applied in order to the 'Breed' column for consistency
+BREED_REPLACEMENTS = [
+    (r'\s+', ' '),  # replace multiple spaces with a single space
+    (r'/unknown', r' Mix'),  # replace '/Unknown' with 'Mix'
+    (r'unknown', ''),  # replace 'Unknown' with ''
+    (r'Devon Rex', r'Rex'),  # replace "Devon Rex" with "Rex"
+    (r'Cornish Rex', r'Rex'),  # replace "Cornish Rex" with "Rex"
+    (r'Wirehair', ''),  # remove "Wirehair"
+    (r'Smooth Coat', ''),  # remove "Smooth Coat"
+    (r'Smooth', ''),  # remove "Smooth"
+    (r'Flat Coat', ''),   # remove "Flat Coat"
+    (r'Exotic Shorthair', r'American Shorthair/Persian')   # replace 'Exotic Shorthair' with 'American Shorthair/Persian'
+]
+# Color replacements applied by `replace_colors` when no animal-specific rule matches; only the first match is used
+COLOR_REPLACEMENTS = {"Buff": "Cream", "Pink": "White", "Tan": "Cream", "Silver": "White", "Apricot": "Cream", "Flame": "Orange", "Gold": "Yellow", "Blue": "Gray"}
+# Coat patterns recognised in the 'Color' column
+COAT_PATTERNS = ["Brindle", "Merle", "Point", "Smoke", "Tabby", "Tick", "Tiger"]
+
+
+@instrumentation.instrument
 def load_data(
     raw_data_path: str,
     dep_var: str = r"OutcomeType"
@@ -36,6 +76,27 @@ def load_data(
     """
     data = pd.read_csv(raw_data_path)
 
+    return clean_raw_data(data, dep_var=dep_var)
+
+
+def clean_raw_data(
+    data: pd.DataFrame,
+    dep_var: str = r"OutcomeType"
+) -> pd.DataFrame:
+    """
+    Cleans a raw outcomes DataFrame as read from the Austin Animal Center CSV.
+
+    Renames specific columns for consistency, removes duplicate entries, and filters the data based on
+    predefined categories for 'AnimalType' and the dependent variable. This is the part of `load_data`
+    that does not depend on how the file is read, so it can also be applied to chunks of a large file.
+
+    Parameters:
+    data (pd.DataFrame): The raw DataFrame (or a chunk of it).
+    dep_var (str, optional): The name of the dependent variable column used for prediction. Defaults to 'OutcomeType'.
+
+    Returns:
+    pd.DataFrame: A cleaned and filtered pandas DataFrame.
+    """
     data.rename(
         columns={
             "Outcome Type": "OutcomeType",
@@ -164,6 +225,48 @@ def group_age(age) -> str:
         return '15+ years'
 
 
+def build_breed_group_map() -> dict:
+    """
+    Builds the reverse lookup from breed name to breed group.
+
+    Returns:
+    dict: Maps each breed in `DOG_BREED_GROUPS` and `CAT_BREED_GROUPS` to a (group, animal type) tuple.
+    """
+    reverse_breed_group_map = {}
+    for group, breeds in DOG_BREED_GROUPS.items():
+        for b in breeds:
+            reverse_breed_group_map[b] = (group, "Dog")
+    for group, breeds in CAT_BREED_GROUPS.items():
+        for b in breeds:
+            reverse_breed_group_map[b] = (group, "Cat")
+
+    return reverse_breed_group_map
+
+
+def standardize_breeds(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Standardizes the 'Breed' column and splits off the 'Mix' flag.
+
+    Parameters:
+    df (pd.DataFrame): A DataFrame with a 'Breed' column. It is modified in place.
+
+    Returns:
+    pd.DataFrame: `df` with the cleaned 'Breed' column (NaN for unknown breeds) and a float 'Mix' column (1.0 when the breed contained 'Mix').
+    """
+    # Replace certain values in the 'Breed' column for consistency
+    for pattern, repl in BREED_REPLACEMENTS:
+        df['Breed'] = df['Breed'].str.replace(pattern, repl, regex=True, flags=re.IGNORECASE).str.strip()
+
+    # split the column into two columns
+    df['Mix'] = df['Breed'].str.contains('Mix', case=False).astype(float)
+    df['Breed'] = df['Breed'].str.split(' Mix').str[0]
+    # replace rows containing 'Mix' with nan in "Breed" column
+    df['Breed'] = df['Breed'].str.replace(r'^Mix$', '', regex=True, flags=re.IGNORECASE).replace('', np.nan)
+
+    return df
+
+
+@instrumentation.instrument
 def process_breed_data(
     df: pd.DataFrame,
     AnimalID: str=r"AnimalID"
@@ -198,51 +301,15 @@ def process_breed_data(
     - The function handles mixed breeds by splitting them into individual components for processing before recombining them. This is particularly useful for accurate breed categorization.
     """
 
-    # For dog breeds
-    dog_breed_group_dict = {
-        "Herding": ["Australian Cattle Dog", "Australian Shepherd", "Bearded Collie", "Beauceron", "Belgian Malinois", "Belgian Sheepdog", "Belgian Tervuren", "Black", "Black Mouth Cur", "Blue Lacy", "Border Collie", "Cardigan Welsh Corgi", "Catahoula", "Collie Rough", "Collie Smooth", "English Shepherd", "Entlebucher", "German Shepherd", "Old English Sheepdog", "Pembroke Welsh Corgi", "Picardy Sheepdog", "Queensland Heeler", "Shetland Sheepdog", "Spanish Water Dog", "Swedish Vallhund"],
-        "Hound": ["Afghan Hound", "American Foxhound", "Basenji", "Basset Hound", "Beagle", "Bloodhound", "Bluetick Hound", "Borzoi", "Dachshund", "Dachshund Longhair", "Dachshund Wirehair", "English Coonhound", "English Foxhound", "Greyhound", "Harrier", "Ibizan Hound", "Irish Wolfhound", "Norwegian Elkhound", "Otterhound", "Pbgv", "Pharaoh Hound", "Plott Hound", "Podengo Pequeno", "Redbone Hound", "Rhod Ridgeback"],
-        "Non-Sporting": ["American Bulldog", "American Eskimo", "Bichon Frise", "Boston Terrier", "Bulldog", "Chinese Sharpei", "Chow Chow", "Dalmatian", "English Bulldog", "Finnish Spitz", "French Bulldog", "Jindo", "Keeshond", "Lhasa Apso", "Lowchen", "Mexican Hairless", "Miniature Poodle", "Schipperke", "Shiba Inu", "Standard Poodle", "Tibetan Spaniel", "Tibetan Terrier"],
-        "Sporting": ["Anatol Shepherd", "Boykin Span", "Brittany", "Chesa Bay Retr", "Cocker Spaniel", "Dutch Shepherd", "English Cocker Spaniel", "English Pointer", "English Setter", "English Springer Spaniel", "Field Spaniel", "Flat Coat Retriever", "German Shorthair Pointer", "German Wirehaired Pointer", "Golden Retriever", "Irish Setter", "Labrador Retriever", "Nova Scotia Duck Tolling Retriever", "Pointer", "Spinone Italiano", "Vizsla", "Weimaraner", "Welsh Springer Spaniel", "Wirehaired Pointing Griffon"],
-        "Terrier": ["Airedale Terrier", "American Pit Bull Terrier", "American Pit Terrier", "American Staffordshire Terrier", "Australian Terrier", "Bedlington Terr", "Border Terrier", "Bull Terrier", "Bull Terrier Miniature", "Cairn Terrier", "Feist", "Glen Of Imaal", "Irish Terrier", "Jack Russell Terrier", "Manchester Terrier", "Miniature Schnauzer", "Norfolk Terrier", "Norwich Terrier", "Parson Russell Terrier", "Patterdale Terr", "Rat Terrier", "Scottish Terrier", "Sealyham Terr", "Skye Terrier", "Smooth Fox Terrier"],
-        "Toy": ["Affenpinscher", "Bruss Griffon", "Cavalier Span", "Chihuahua Longhair", "Chihuahua Shorthair", "Chinese Crested", "Havanese", "Italian Greyhound", "Japanese Chin", "Maltese", "Miniature Pinscher", "Papillon", "Pekingese", "Pomeranian", "Pug", "Shih Tzu", "Silky Terrier", "Toy Fox Terrier", "Toy Poodle", "Yorkshire", "Yorkshire Terrier"],
-        "Working": ["Akita", "Alaskan Malamute", "Australian Kelpie", "Bernese Mountain Dog", "Boerboel", "Boxer", "Bullmastiff", "Canaan Dog", "Cane Corso", "Doberman Pinsch", "Dogue De Bordeaux", "German Pinscher", "Great Dane", "Great Pyrenees", "Greater Swiss Mountain Dog", "Kuvasz", "Leonberger", "Mastiff", "Neapolitan Mastiff", "Newfoundland", "Port Water Dog", "Rottweiler", "Samoyed", "Schnauzer Giant", "Siberian Husky"]
-    }
-    # For cat breeds
-    cat_breed_group_dict = {
-        "Domestic Longhair": ["Domestic Longhair"],
-        "Domestic Mediumhair": ["Domestic Medium Hair"],
-        "Domestic Shorthair": ["Domestic Shorthair", "British Shorthair", "American Shorthair"],
-        "Pixiebob": ["Pixiebob Shorthair"]
-    }
-
-    # Replace certain values in the 'Breed' column for consistency
-    replacements = [
-        (r'\s+', ' '),  # replace multiple spaces with a single space
-        (r'/unknown', r' Mix'),  # replace '/Unknown' with 'Mix'
-        (r'unknown', ''),  # replace 'Unknown' with ''
-        (r'Devon Rex', r'Rex'),  # replace "Devon Rex" with "Rex"
-        (r'Cornish Rex', r'Rex'),  # replace "Cornish Rex" with "Rex"
-        (r'Wirehair', ''),  # remove "Wirehair"
-        (r'Smooth Coat', ''),  # remove "Smooth Coat"
-        (r'Smooth', ''),  # remove "Smooth"
-        (r'Flat Coat', ''),   # remove "Flat Coat"
-        (r'Exotic Shorthair', r'American Shorthair/Persian')   # replace 'Exotic Shorthair' with 'American Shorthair/Persian'
-    ]
-    for pattern, repl in replacements:
-        df['Breed'] = df['Breed'].str.replace(pattern, repl, regex=True, flags=re.IGNORECASE).str.strip()
-
-    # split the column into two columns
-    df['Mix'] = df['Breed'].str.contains('Mix', case=False).astype(float)
-    df['Breed'] = df['Breed'].str.split(' Mix').str[0]
-    # replace rows containing 'Mix' with nan in "Breed" column
-    df['Breed'] = df['Breed'].str.replace(r'^Mix$', '', regex=True, flags=re.IGNORECASE).replace('', np.nan)
+    # Standardize the 'Breed' column and flag mixed breeds
+    df = standardize_breeds(df)
 
     # Seperate the 'Breed' column by '/' and create multiple rows for each breed
     breed_list = df['Breed'].str.split('/')
-    breed_list = breed_list.explode()
+    breed_list = row_guard.guarded_explode(breed_list, stage="process_breed_data.explode")
     # Create a seperate breed dataframe
-    breed = pd.merge(
+    breed = row_guard.guarded_merge(
+        stage="process_breed_data.breed",
         left=df[[AnimalID, "AnimalType", "Breed", "Mix"]],
         right=breed_list.to_frame(name='Breed_broken'),
         left_index=True,
@@ -252,15 +319,9 @@ def process_breed_data(
     breed = breed.drop_duplicates().reset_index(drop=True)
     breed_list = breed[[AnimalID, "Breed_broken"]]
 
-    # Create a combined reverse mapping dictionary
-    reverse_breed_group_map = {}
-    for group, breeds in dog_breed_group_dict.items():
-        for b in breeds:
-            reverse_breed_group_map[b] = (group, "Dog")
-    for group, breeds in cat_breed_group_dict.items():
-        for b in breeds:
-            reverse_breed_group_map[b] = (group, "Cat")
-    
+    # Combined reverse mapping dictionary
+    reverse_breed_group_map = build_breed_group_map()
+
     # Function to get the breed type
     def get_breed_type(breed_name, animal_type):
         if breed_name in reverse_breed_group_map:
@@ -282,7 +343,8 @@ def process_breed_data(
     ## Calculate frequency of each AnimalID in breed data
     breed_freq = breed_list[AnimalID].value_counts().reset_index(name='count')
     ## Merge the frequency counts back into the original dataframe
-    df = pd.merge(
+    df = row_guard.guarded_merge(
+        stage="process_breed_data.breed_count",
         left=df,
         right=breed_freq.rename(columns={"index": AnimalID}),
         left_on=AnimalID,
@@ -322,16 +384,9 @@ def replace_colors(row: pd.Series) -> str:
     
     Notes:
     - This function uses the pandas library.
-    - The `change_colors` mapping can be modified or extended as needed for additional transformations.
+    - The `COLOR_REPLACEMENTS` mapping can be modified or extended as needed for additional transformations.
     """
     
-    change_colors = pd.DataFrame(
-        {
-            "Color": ["Buff", "Pink", "Tan", "Silver", "Apricot", "Flame", "Gold", "Blue"],
-            "NewColor": ["Cream", "White", "Cream", "White", "Cream", "Orange", "Yellow", "Gray"]
-        }
-    )
-
     if row['AnimalType'] == "Dog" and 'Orange' in row['Color']:
         return row['Color'].replace('Orange', 'Red')
     elif row['AnimalType'] == "Cat" and 'Yellow' in row['Color']:
@@ -339,7 +394,7 @@ def replace_colors(row: pd.Series) -> str:
     elif row['AnimalType'] == "Cat" and 'Tricolor' in row['Color']:
         return row['Color'].replace('Tricolor', 'Calico')
     else:
-        for old, new in change_colors.set_index('Color')['NewColor'].to_dict().items():
+        for old, new in COLOR_REPLACEMENTS.items():
             if old in row['Color']:
                 return row['Color'].replace(old, new)
     return row['Color']
@@ -373,6 +428,34 @@ def extract_coat_pattern(
             return ""
 
 
+def standardize_coat_colors(df: pd.DataFrame) -> tuple:
+    """
+    Cleans the 'Color' column and separates coat colors from coat patterns.
+
+    Parameters:
+    df (pd.DataFrame): A DataFrame with 'Color' and 'AnimalType' columns. Its 'Color' column is cleaned in place.
+
+    Returns:
+    tuple: (df, coatcolor) where `coatcolor` is a copy of `df` whose 'Color' holds the standardized coat color without patterns and whose 'CoatPattern' holds the extracted pattern.
+    """
+    ## remove multiple spaces
+    df['Color'] = df['Color'].str.replace('  ', ' ').str.strip()
+
+    coatcolor = df.copy()
+
+    ## For coat colors
+    coatcolor['Color'] = coatcolor.apply(replace_colors, axis=1)
+
+    ## For coat patterns
+    coat_patterns = COAT_PATTERNS
+    coatcolor['CoatPattern'] = coatcolor['Color'].apply(lambda x: extract_coat_pattern(x, coat_patterns))
+    coatcolor['Color'] = coatcolor.apply(
+        lambda row: re.sub('|'.join(coat_patterns), '', row['Color'], flags=re.IGNORECASE).strip(), axis=1)
+
+    return df, coatcolor
+
+
+@instrumentation.instrument
 def process_coat_colors(
     df: pd.DataFrame,
     AnimalID: str=r"AnimalID"
@@ -408,21 +491,11 @@ def process_coat_colors(
     - It also uses regular expressions (via the `re` module) to manipulate text data.
     """
 
-    ## remove multiple spaces
-    df['Color'] = df['Color'].str.replace('  ', ' ').str.strip()
-
-    coatcolor = df.copy()
-
-    ## For coat colors
-    coatcolor['Color'] = coatcolor.apply(replace_colors, axis=1)
-
-    ## For coat patterns
-    coat_patterns = ["Brindle", "Merle", "Point", "Smoke", "Tabby", "Tick", "Tiger"]
-    coatcolor['CoatPattern'] = coatcolor['Color'].apply(lambda x: extract_coat_pattern(x, coat_patterns))
-    coatcolor['Color'] = coatcolor.apply(
-        lambda row: re.sub('|'.join(coat_patterns), '', row['Color'], flags=re.IGNORECASE).strip(), axis=1)
+    ## Standardize colors and split off coat patterns
+    df, coatcolor = standardize_coat_colors(df)
 
-    coat_color = pd.merge(
+    coat_color = row_guard.guarded_merge(
+        stage="process_coat_colors.coat_color",
         left=df[[AnimalID, 'Color']],
         right=coatcolor[[AnimalID, 'Color']].rename(columns={'Color': 'CoatColor'}),
         left_on=AnimalID,
@@ -435,9 +508,10 @@ def process_coat_colors(
 
     ## Seperate the 'Color' column by '/' and create multiple rows for each breed
     coatcolor_list = coat_color['CoatColor'].str.split('/')
-    coatcolor_list = coatcolor_list.explode()
+    coatcolor_list = row_guard.guarded_explode(coatcolor_list, stage="process_coat_colors.explode")
     ## The final coat color dataframe
-    coat_color = pd.merge(
+    coat_color = row_guard.guarded_merge(
+        stage="process_coat_colors.coat_color_list",
         left=coat_color[[AnimalID, "Color"]],
         right=coatcolor_list.to_frame(name='CoatColor'),
         left_index=True,
@@ -451,42 +525,22 @@ def process_coat_colors(
     return df, coat_color, coat_patterns
 
 
-def preprocess_data(
+def preprocess_age_sex(
     df: pd.DataFrame,
     AnimalID: str=r"AnimalID",
     dep_var: str=r"OutcomeType"
-) -> tuple:
+) -> pd.DataFrame:
     """
-    Preprocesses animal data to clean and organize key attributes.
-
-    This function performs several preprocessing steps on the input DataFrame to handle various aspects of animal data such as age, sex, breed, and coat color. The transformations include cleaning text fields, converting age representations into days, splitting columns for detailed categorization, and merging processed data back into a comprehensive DataFrame.
+    Runs the first steps of `preprocess_data`: cleans the dependent variable, sorts the rows, groups the ages and splits 'SexuponOutcome'.
 
     Parameters:
-    - df (pd.DataFrame): Input DataFrame containing the animal dataset with required columns.Expected columns include 'AgeuponOutcome', 'SexuponOutcome', 'AnimalType', and optionally 'OutcomeType'.
+    - df (pd.DataFrame): Raw outcome rows, as returned by `load_data`. It may be modified in place.
     - AnimalID (str, optional): The name of the column in `df` that uniquely identifies each animal. Defaults to "AnimalID".
-    - dep_var (str, optional): The name of the dependent variable column, which is the target for prediction. Defaults to 'OutcomeType'.
+    - dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
 
     Returns:
-    - tuple: A tuple containing multiple DataFrames representing different aspects of processed data.
-        1. df (pd.DataFrame): Merged DataFrame including cleaned and organized attributes.
-        2. animal_data (pd.DataFrame): Subset of the original data with key columns after initial cleaning.
-        3. breed (pd.DataFrame): Processed data related to the breeds of animals.
-        4. breed_mix (pd.DataFrame): Additional processed data for mixed/ pure breeds.
-        5. coat_color (pd.DataFrame): Data containing information about animals' coat colors.
-        6. coat_patterns (pd.DataFrame): Data detailing patterns found in animals' coats.
-
-    Processing Steps:
-    1. Age Preprocessing: Cleans the 'AgeuponOutcome' column, converts age to days, and groups ages into categories.
-    2. Sex Preprocessing: Cleans the 'SexuponOutcome' column by removing unwanted spaces and unknown values, then splits it into two columns for detailed categorization.
-    3. Breed Processing: Utilizes an external function `process_breed_data` to handle breed-specific data transformations.
-    4. Coat Processing: Uses another function `process_coat_colors` to manage coat color information and patterns.
-    5. Data Merging: Merges all processed components into a single comprehensive DataFrame.
-
-    Notes:
-    - This function assumes the input DataFrame has specific columns like 'AnimalID', 'Breed', and 'Color'. If your dataset differs, you may need to adjust column names accordingly.
-    - The function assumes that the helper functions `convert_to_days`, `group_age`, `process_breed_data`, and `process_coat_colors` are defined elsewhere in your codebase.
+    - pd.DataFrame: The rows sorted by AnimalID and DateTime, with the 'AgeuponOutcome' groups and the 'SexuponOutcome' and 'Sterilization' columns.
     """
-
     # Dependent Variable
     if dep_var in df.columns:
         ## Drop all missing values
@@ -513,73 +567,179 @@ def preprocess_data(
     )
 
     # Age of animals
-    df['AgeuponOutcome'] = df['AgeuponOutcome'].str.replace('  ', ' ')
-    ## Convert age to days
-    df['AgeuponOutcome'] = df['AgeuponOutcome'].apply(convert_to_days)
-    ## Group ages into categories
-    df['AgeuponOutcome'] = df['AgeuponOutcome'].apply(group_age)
+    with instrumentation.stage("data_processing.preprocess_data.age", rows_in=len(df)):
+        df['AgeuponOutcome'] = df['AgeuponOutcome'].str.replace('  ', ' ')
+        ## Convert age to days
+        df['AgeuponOutcome'] = df['AgeuponOutcome'].apply(convert_to_days)
+        ## Group ages into categories
+        df['AgeuponOutcome'] = df['AgeuponOutcome'].apply(group_age)
 
 
     # Sex of animals
-    ## remove multiple spaces
-    df['SexuponOutcome'] = df['SexuponOutcome'].str.replace('  ', ' ')
-    ## replace 'Unknown' with NaN
-    df['SexuponOutcome'] = df['SexuponOutcome'].str.replace(r'unknown', '', regex=True, flags=re.IGNORECASE).str.strip().replace('', np.nan)
-    ## split the column into two columns
-    df['Sterilization'] = df['SexuponOutcome'].str.split(' ').str[0]
-    df['SexuponOutcome'] = df['SexuponOutcome'].str.split(' ').str[1]
-    ## combine "Spayed" and "Neutered" into "Sterilized"
-    df['Sterilization'] = df['Sterilization'].replace({'Spayed': 'Sterilized', 'Neutered': 'Sterilized'})
+    with instrumentation.stage("data_processing.preprocess_data.sex", rows_in=len(df)):
+        ## remove multiple spaces
+        df['SexuponOutcome'] = df['SexuponOutcome'].str.replace('  ', ' ')
+        ## replace 'Unknown' with NaN
+        df['SexuponOutcome'] = df['SexuponOutcome'].str.replace(r'unknown', '', regex=True, flags=re.IGNORECASE).str.strip().replace('', np.nan)
+        ## split the column into two columns
+        df['Sterilization'] = df['SexuponOutcome'].str.split(' ').str[0]
+        df['SexuponOutcome'] = df['SexuponOutcome'].str.split(' ').str[1]
+        ## combine "Spayed" and "Neutered" into "Sterilized"
+        df['Sterilization'] = df['Sterilization'].replace({'Spayed': 'Sterilized', 'Neutered': 'Sterilized'})
 
-
-    # Breed of animals
-    df, breed, breed_mix = process_breed_data(df, AnimalID=AnimalID)
-
-
-    # Coat of animals
-    df, coat_color, coat_patterns = process_coat_colors(df, AnimalID=AnimalID)
+    return df
 
 
+def select_animal_data(
+    df: pd.DataFrame,
+    AnimalID: str=r"AnimalID",
+    dep_var: str=r"OutcomeType"
+) -> pd.DataFrame:
+    """
+    Selects the distinct outcome rows (the animal_data frame of `preprocess_data`) from the output of `preprocess_age_sex`.
+    """
     if dep_var in df.columns:
         animal_data = df[[AnimalID, dep_var, 'Name', 'DateTime', 'AnimalType', 'AgeuponOutcome', 'SexuponOutcome', 'Sterilization']].drop_duplicates().reset_index(drop=True)
     else:
         animal_data = df[[AnimalID, 'Name', 'DateTime', 'AnimalType', 'AgeuponOutcome', 'SexuponOutcome', 'Sterilization']].drop_duplicates().reset_index(drop=True)
 
+    return animal_data
+
+
+def merge_processed(
+    animal_data: pd.DataFrame,
+    breed: pd.DataFrame,
+    breed_mix: pd.DataFrame,
+    coat_color: pd.DataFrame,
+    coat_patterns: pd.DataFrame,
+    AnimalID: str=r"AnimalID"
+) -> pd.DataFrame:
+    """
+    Merges animal_data with its breed, breed mix, coat color and coat pattern rows (the merged frame of `preprocess_data`).
+
+    Every outcome row is repeated once per combination of the animal's breed and coat rows.
+
+    Parameters:
+    - animal_data (pd.DataFrame): Output of `select_animal_data`.
+    - breed, breed_mix (pd.DataFrame): Outputs of `process_breed_data`.
+    - coat_color, coat_patterns (pd.DataFrame): Outputs of `process_coat_colors`.
+    - AnimalID (str, optional): The name of the column that uniquely identifies each animal. Defaults to "AnimalID".
+
+    Returns:
+    - pd.DataFrame: The merged frame.
+    """
     # Merge all the dataframes
-    df = pd.merge(  # merge animal data with the breed and color related information
-        left=animal_data,
-        right=pd.merge(
-            left=pd.merge(  # merge breed and breed mix
-                left=breed.drop(columns='Breed'),
-                right=breed_mix.drop(columns='Breed'),
+    with instrumentation.stage("data_processing.preprocess_data.merge", rows_in=len(animal_data)) as record:
+        df = row_guard.guarded_merge(  # merge animal data with the breed and color related information
+            stage="preprocess_data.merge_all",
+            left=animal_data,
+            right=row_guard.guarded_merge(
+                stage="preprocess_data.merge_breed_coat",
+                left=row_guard.guarded_merge(  # merge breed and breed mix
+                    stage="preprocess_data.merge_breed",
+                    left=breed.drop(columns='Breed'),
+                    right=breed_mix.drop(columns='Breed'),
+                    left_on=AnimalID,
+                    right_on=AnimalID,
+                    how='left'
+                ),
+                right=row_guard.guarded_merge(  # merge coat color and coat patterns
+                    stage="preprocess_data.merge_coat",
+                    left=coat_color.drop(columns='Color'),
+                    right=coat_patterns.drop(columns='Color'),
+                    left_on=AnimalID,
+                    right_on=AnimalID,
+                    how='left'
+                ),
                 left_on=AnimalID,
                 right_on=AnimalID,
-                how='left'
-            ),
-            right=pd.merge(  # merge coat color and coat patterns
-                left=coat_color.drop(columns='Color'),
-                right=coat_patterns.drop(columns='Color'),
-                left_on=AnimalID,
-                right_on=AnimalID,
-                how='left'
+                how='outer'
             ),
             left_on=AnimalID,
             right_on=AnimalID,
-            how='outer'
-        ),
-        left_on=AnimalID,
-        right_on=AnimalID,
-        how='left'
-    )
+            how='left'
+        )
+        record["rows_out"] = len(df)
+
+    return df
+
+
+@instrumentation.instrument
+def preprocess_data(
+    df: pd.DataFrame,
+    AnimalID: str=r"AnimalID",
+    dep_var: str=r"OutcomeType",
+    engine: str="pandas"
+) -> tuple:
+    """
+    Preprocesses animal data to clean and organize key attributes.
+
+    This function performs several preprocessing steps on the input DataFrame to handle various aspects of animal data such as age, sex, breed, and coat color. The transformations include cleaning text fields, converting age representations into days, splitting columns for detailed categorization, and merging processed data back into a comprehensive DataFrame.
+
+    Parameters:
+    - df (pd.DataFrame): Input DataFrame containing the animal dataset with required columns.Expected columns include 'AgeuponOutcome', 'SexuponOutcome', 'AnimalType', and optionally 'OutcomeType'.
+    - AnimalID (str, optional): The name of the column in `df` that uniquely identifies each animal. Defaults to "AnimalID".
+    - dep_var (str, optional): The name of the dependent variable column, which is the target for prediction. Defaults to 'OutcomeType'.
+    - engine (str, optional): "pandas" or "duckdb". With "duckdb" the text cleaning still runs in pandas, but the breed and coat joins, the breed count, the deduplications and the final merge run as SQL in an embedded DuckDB database that spills to disk (see `duckdb_engine.preprocess_joins`). Defaults to "pandas".
+
+    Returns:
+    - tuple: A tuple containing multiple DataFrames representing different aspects of processed data.
+        1. df (pd.DataFrame): Merged DataFrame including cleaned and organized attributes.
+        2. animal_data (pd.DataFrame): Subset of the original data with key columns after initial cleaning.
+        3. breed (pd.DataFrame): Processed data related to the breeds of animals.
+        4. breed_mix (pd.DataFrame): Additional processed data for mixed/ pure breeds.
+        5. coat_color (pd.DataFrame): Data containing information about animals' coat colors.
+        6. coat_patterns (pd.DataFrame): Data detailing patterns found in animals' coats.
+
+    Processing Steps:
+    1. Age Preprocessing: Cleans the 'AgeuponOutcome' column, converts age to days, and groups ages into categories.
+    2. Sex Preprocessing: Cleans the 'SexuponOutcome' column by removing unwanted spaces and unknown values, then splits it into two columns for detailed categorization.
+    3. Breed Processing: Utilizes an external function `process_breed_data` to handle breed-specific data transformations.
+    4. Coat Processing: Uses another function `process_coat_colors` to manage coat color information and patterns.
+    5. Data Merging: Merges all processed components into a single comprehensive DataFrame.
+
+    Notes:
+    - This function assumes the input DataFrame has specific columns like 'AnimalID', 'Breed', and 'Color'. If your dataset differs, you may need to adjust column names accordingly.
+    - The function assumes that the helper functions `convert_to_days`, `group_age`, `process_breed_data`, and `process_coat_colors` are defined elsewhere in your codebase.
+    """
+
+    # Dependent variable, sort order, age and sex
+    df = preprocess_age_sex(df, AnimalID=AnimalID, dep_var=dep_var)
+
+
+    if engine == "duckdb":
+        # Imported here so that duckdb is only needed when the engine is used
+        import duckdb_engine
+        df = standardize_breeds(df)
+        breed_list = row_guard.guarded_explode(df['Breed'].str.split('/'), stage="process_breed_data.explode")
+        df, coatcolor = standardize_coat_colors(df)
+        return duckdb_engine.preprocess_joins(df, breed_list, coatcolor, AnimalID=AnimalID, dep_var=dep_var)
+    elif engine != "pandas":
+        raise ValueError("engine must be 'pandas' or 'duckdb', got {!r}".format(engine))
+
+    # Breed of animals
+    df, breed, breed_mix = process_breed_data(df, AnimalID=AnimalID)
+
+
+    # Coat of animals
+    df, coat_color, coat_patterns = process_coat_colors(df, AnimalID=AnimalID)
+
+
+    animal_data = select_animal_data(df, AnimalID=AnimalID, dep_var=dep_var)
+
+    # Merge all the dataframes
+    df = merge_processed(animal_data, breed, breed_mix, coat_color, coat_patterns, AnimalID=AnimalID)
 
 
     return (df, animal_data, breed, breed_mix, coat_color, coat_patterns)
 
 
+@instrumentation.instrument
 def process_data(
     raw_data_path: str,
     AnimalID: str="AnimalID",
-    dep_var:str ="OutcomeType"
+    dep_var:str ="OutcomeType",
+    backend: str="pandas"
 ) -> pd.DataFrame:
     """
     Processes data from a specified file path by loading, preprocessing, and encoding categorical variables in sequence to prepare it for analysis or modeling.
@@ -592,16 +752,27 @@ def process_data(
     - data_file (str): The name of the CSV file to load, excluding the `.csv` extension. It assumes that the actual file has a `.csv` extension appended.
     - AnimalID (str, optional): The name of the column in the DataFrame used as an identifier for individual animals. Defaults to "AnimalID".
     - dep_var (str, optional): The name of the dependent variable column, which is the target for prediction. Defaults to 'OutcomeType'.
+    - backend (str, optional): "pandas", "polars" or "duckdb". The Polars backend (`polars_backend.process_data`) runs the same transformations as one lazy, multi-threaded query; "duckdb" runs `preprocess_data` with `engine="duckdb"`. All return the same pandas DataFrames. Defaults to "pandas".
 
     Returns:
     pandas.DataFrame: A processed DataFrame with loaded data that has been preprocessed.
 
+    Raises:
+    - ValueError: If `backend` is not one of the supported backends.
+
     Example usage:
     processed_df = process_data("path/to/your/data.csv", AnimalID="UniqueID")
     """
 
+    if backend == "polars":
+        # Imported here so that polars is only needed when the backend is used
+        import polars_backend
+        return polars_backend.process_data(raw_data_path=raw_data_path, AnimalID=AnimalID, dep_var=dep_var)
+    elif backend not in ("pandas", "duckdb"):
+        raise ValueError("backend must be 'pandas', 'polars' or 'duckdb', got {!r}".format(backend))
+
     # Load data from the specified file path
     df = load_data(raw_data_path=raw_data_path, dep_var=dep_var)
     
     # Return preprocessed dataFrames
-    return preprocess_data(df=df, AnimalID=AnimalID, dep_var=dep_var)
+    return preprocess_data(df=df, AnimalID=AnimalID, dep_var=dep_var, engine=backend)
@@ -0,0 +1,341 @@
+import os
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import data_processing
+import instrumentation
+import utils
+
+
+# Text values of the 'Mix' flag before breed counts are applied. pandas keeps them as floats next to the 'Mix' and
+# 'Pure breed' labels; SQL columns hold one type, so they are carried as text and turned back into floats when
+# the results are handed back as pandas.
+_MIX_FLOATS = {"0.0": 0.0, "1.0": 1.0}
+
+# Row-order column added to every registered input
+_ROW = "_row"
+
+# Spill settings used by `connect` when none are passed, e.g. when `data_processing.preprocess_data` opens the connection
+_temp_directory = os.environ.get("SHELTER_DUCKDB_TEMP_DIR")
+_memory_limit = os.environ.get("SHELTER_DUCKDB_MEMORY_LIMIT")
+
+
+def connect(
+    temp_directory: str = None,
+    memory_limit: str = None,
+    threads: int = None
+) -> duckdb.DuckDBPyConnection:
+    """
+    Opens an in-process, in-memory DuckDB connection set up for the preprocessing joins.
+
+    No server is involved. When a query needs more than `memory_limit`, DuckDB spills intermediate results to
+    `temp_directory` instead of failing.
+
+    Parameters:
+    temp_directory (str, optional): Directory for spill files. Defaults to the SHELTER_DUCKDB_TEMP_DIR environment variable, or DuckDB's default (`.tmp`).
+    memory_limit (str, optional): Memory limit such as "4GB". Defaults to the SHELTER_DUCKDB_MEMORY_LIMIT environment variable, or DuckDB's default (80% of RAM).
+    threads (int, optional): Number of worker threads. Defaults to DuckDB's default (all cores).
+
+    Returns:
+    duckdb.DuckDBPyConnection: The connection.
+    """
+    temp_directory = temp_directory or _temp_directory
+    memory_limit = memory_limit or _memory_limit
+    con = duckdb.connect(database=":memory:")
+    if temp_directory is not None:
+        os.makedirs(temp_directory, exist_ok=True)
+        con.execute("SET temp_directory = '{}'".format(temp_directory.replace("'", "''")))
+    if memory_limit is not None:
+        con.execute("SET memory_limit = '{}'".format(memory_limit.replace("'", "''")))
+    if threads is not None:
+        con.execute("SET threads = {:d}".format(threads))
+
+    return con
+
+
+def _quote(name: str) -> str:
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def _columns(names: list, prefix: str = None) -> str:
+    return ", ".join((prefix + "." if prefix else "") + _quote(name) for name in names)
+
+
+def register(
+    con: duckdb.DuckDBPyConnection,
+    name: str,
+    source
+) -> list:
+    """
+    Registers a DataFrame, Arrow table or Parquet cache as a view with a `_row` column holding the row order.
+
+    DataFrames are handed over as Arrow tables (object columns that mix strings with other values, such as the
+    float/str 'Mix' column, become strings). A Parquet cache is a file, a directory or a glob; a directory such as
+    an output of `out_of_core.preprocess_data_out_of_core` is read in file name order.
+
+    Parameters:
+    con (duckdb.DuckDBPyConnection): The connection.
+    name (str): Name of the view.
+    source (pd.DataFrame, pa.Table or str): The data, or the path of the Parquet cache.
+
+    Returns:
+    list: The column names of the view, without `_row`.
+    """
+    if isinstance(source, str):
+        path = os.path.join(source, "*.parquet") if os.path.isdir(source) else source
+        con.execute(
+            "CREATE OR REPLACE TEMP VIEW {name} AS SELECT * EXCLUDE (filename, file_row_number), "
+            "row_number() OVER (ORDER BY filename, file_row_number) - 1 AS {row} "
+            "FROM read_parquet('{path}', filename = true, file_row_number = true)".format(
+                name=_quote(name), row=_ROW, path=path.replace("'", "''")
+            )
+        )
+    else:
+        if isinstance(source, pd.DataFrame):
+            source = pa.Table.from_pandas(utils.to_arrow_compatible(source), preserve_index=False)
+        source = source.append_column(_ROW, pa.array(np.arange(source.num_rows, dtype=np.int64)))
+        con.register(name, source)
+
+    return [column for column in con.execute("SELECT * FROM {} LIMIT 0".format(_quote(name))).to_arrow_table().column_names if column != _ROW]
+
+
+def _dedup(
+    con: duckdb.DuckDBPyConnection,
+    name: str,
+    source: str,
+    columns: list
+) -> None:
+    # `drop_duplicates()` equivalent: keep the first occurrence of each distinct row (NULLs compare equal in
+    # GROUP BY, as NaN does in pandas) and renumber the survivors in their original order
+    con.execute(
+        "CREATE OR REPLACE TEMP TABLE {name} AS "
+        "SELECT {columns}, row_number() OVER (ORDER BY min({row})) - 1 AS {row} "
+        "FROM {source} GROUP BY {columns}".format(
+            name=_quote(name), columns=_columns(columns), row=_ROW, source=source
+        )
+    )
+
+
+def _fetch(
+    con: duckdb.DuckDBPyConnection,
+    query: str
+) -> pd.DataFrame:
+    # Results come back as Arrow and are converted to the column types `data_processing` produces: NaN for
+    # missing text values and float 'Mix' flags
+    table = con.execute(query).to_arrow_table()
+    df = table.to_pandas()
+    for name, column in zip(table.column_names, table.columns):
+        if df[name].dtype != object or not (column.null_count or name == "Mix"):
+            continue
+        values = df[name].to_numpy()
+        if column.null_count:
+            values[column.is_null().to_numpy(zero_copy_only=False)] = np.nan
+        if name == "Mix":
+            for text, value in _MIX_FLOATS.items():
+                values[values == text] = value
+        df[name] = values
+
+    return df
+
+
+def _merge_tree(
+    con: duckdb.DuckDBPyConnection,
+    animal_columns: list,
+    AnimalID: str,
+    tables: dict
+) -> pd.DataFrame:
+    # The merge tree at the end of `data_processing.preprocess_data` as one query. The row numbers of the inputs
+    # reproduce pandas' output order: animal rows in order, and per animal the breed/coat combinations in the
+    # order of the nested left joins.
+    on = "{{left}}.{id} IS NOT DISTINCT FROM {{right}}.{id}".format(id=_quote(AnimalID))
+    query = """
+        WITH breed_all AS (
+            SELECT b.{id}, b."Breed_broken", b."BreedType", m."Mix", b.{row} AS _breed_row, m.{row} AS _breed_mix_row
+            FROM {breed} b LEFT JOIN {breed_mix} m ON {on_breed}
+        ),
+        coat_all AS (
+            SELECT c.{id}, c."CoatColor", p."CoatPattern", c.{row} AS _coat_row, p.{row} AS _pattern_row
+            FROM {coat_color} c LEFT JOIN {coat_patterns} p ON {on_coat}
+        ),
+        breed_coat AS (
+            SELECT coalesce(b.{id}, c.{id}) AS {id}, b."Breed_broken", b."BreedType", b."Mix", c."CoatColor", c."CoatPattern",
+                b._breed_row, b._breed_mix_row, c._coat_row, c._pattern_row
+            FROM breed_all b FULL OUTER JOIN coat_all c ON {on_breed_coat}
+        )
+        SELECT {animal_columns}, bc."Breed_broken", bc."BreedType", bc."Mix", bc."CoatColor", bc."CoatPattern"
+        FROM {animal_data} a LEFT JOIN breed_coat bc ON {on_animal}
+        ORDER BY a.{row}, bc._breed_row NULLS LAST, bc._breed_mix_row NULLS LAST, bc._coat_row NULLS LAST, bc._pattern_row NULLS LAST
+    """.format(
+        id=_quote(AnimalID),
+        row=_ROW,
+        animal_columns=_columns(animal_columns, "a"),
+        animal_data=tables["animal_data"],
+        breed=tables["breed"],
+        breed_mix=tables["breed_mix"],
+        coat_color=tables["coat_color"],
+        coat_patterns=tables["coat_patterns"],
+        on_breed=on.format(left="b", right="m"),
+        on_coat=on.format(left="c", right="p"),
+        on_breed_coat=on.format(left="b", right="c"),
+        on_animal=on.format(left="a", right="bc")
+    )
+
+    return _fetch(con, query)
+
+
+@instrumentation.instrument
+def merge_processed_frames(
+    animal_data,
+    breed,
+    breed_mix,
+    coat_color,
+    coat_patterns,
+    AnimalID: str = r"AnimalID",
+    con: duckdb.DuckDBPyConnection = None
+) -> pd.DataFrame:
+    """
+    Runs the final merge tree of `data_processing.preprocess_data` in DuckDB.
+
+    The inputs can be DataFrames or Parquet caches, e.g. the directories written by
+    `out_of_core.preprocess_data_out_of_core`, which are scanned directly without loading them into pandas first.
+
+    Parameters:
+    animal_data, breed, breed_mix, coat_color, coat_patterns (pd.DataFrame or str): The frames returned by `data_processing.preprocess_data`, or the paths of their Parquet caches.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    con (duckdb.DuckDBPyConnection, optional): Connection to use. Defaults to a new `connect()`, closed on return.
+
+    Returns:
+    pd.DataFrame: The merged frame, as the first frame returned by `data_processing.preprocess_data`.
+
+    Example usage:
+    paths = out_of_core.preprocess_data_out_of_core("/path/to/data.csv", "/path/to/processed")
+    processed = merge_processed_frames(*[paths[name] for name in out_of_core.OUTPUT_NAMES[1:]])
+    """
+    own_connection = con is None
+    con = connect() if own_connection else con
+    try:
+        sources = {"breed": breed, "breed_mix": breed_mix, "coat_color": coat_color, "coat_patterns": coat_patterns}
+        animal_columns = register(con, "animal_data", animal_data)
+        for name, source in sources.items():
+            register(con, name, source)
+
+        return _merge_tree(con, animal_columns, AnimalID, dict({name: name for name in sources}, animal_data="animal_data"))
+    finally:
+        # Closing drops the views and any spill files of a connection opened here
+        if own_connection:
+            con.close()
+
+
+@instrumentation.instrument
+def preprocess_joins(
+    df: pd.DataFrame,
+    breed_list: pd.Series,
+    coatcolor: pd.DataFrame,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType",
+    con: duckdb.DuckDBPyConnection = None
+) -> tuple:
+    """
+    Runs the joins, the breed count and the deduplication steps of `data_processing.preprocess_data` in DuckDB.
+
+    The row-wise text cleaning stays in pandas; this takes its results and builds the breed, breed mix, coat color,
+    coat pattern and animal tables as temporary DuckDB tables (spilled to disk under the connection's memory limit),
+    then runs the final merge tree. Results come back through Arrow.
+
+    Parameters:
+    df (pd.DataFrame): The sorted animal data after the age, sex, breed (`data_processing.standardize_breeds`) and color (`data_processing.standardize_coat_colors`) cleaning.
+    breed_list (pd.Series): `df['Breed'].str.split('/')` exploded, indexed by the row of `df` each breed comes from.
+    coatcolor (pd.DataFrame): The coat colors and patterns returned by `data_processing.standardize_coat_colors`.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+    con (duckdb.DuckDBPyConnection, optional): Connection to use. Defaults to a new `connect()`, closed on return.
+
+    Returns:
+    tuple: The same six DataFrames as `data_processing.preprocess_data`.
+    """
+    if con is not None:
+        return _preprocess_joins(con, df, breed_list, coatcolor, AnimalID, dep_var)
+    # Closing drops the temporary tables and any spill files of the connection
+    with connect() as con:
+        return _preprocess_joins(con, df, breed_list, coatcolor, AnimalID, dep_var)
+
+
+def _preprocess_joins(
+    con: duckdb.DuckDBPyConnection,
+    df: pd.DataFrame,
+    breed_list: pd.Series,
+    coatcolor: pd.DataFrame,
+    AnimalID: str,
+    dep_var: str
+) -> tuple:
+    animal_columns = [column for column in [AnimalID, dep_var, 'Name', 'DateTime', 'AnimalType', 'AgeuponOutcome', 'SexuponOutcome', 'Sterilization'] if column in df.columns]
+
+    register(con, "animal", df[animal_columns + [column for column in ["Breed", "Mix", "Color"] if column not in animal_columns]])
+    register(con, "breed_list", pd.DataFrame({"source_row": breed_list.index.to_numpy(dtype=np.int64), "Breed_broken": breed_list.to_numpy()}))
+    register(con, "coatcolor", pd.DataFrame({AnimalID: coatcolor[AnimalID], "Color": coatcolor["Color"], "CoatPattern": coatcolor["CoatPattern"]}))
+    group_map = data_processing.build_breed_group_map()
+    register(con, "breed_groups", pd.DataFrame({"Breed_broken": list(group_map), "BreedGroup": [group for group, _ in group_map.values()]}))
+
+    id_column = _quote(AnimalID)
+    on = "{{left}}.{id} IS NOT DISTINCT FROM {{right}}.{id}".format(id=id_column)
+
+    # Breeds: one row per breed of each animal, then the breed type lookup
+    _dedup(con, "breed_exploded", """(
+        SELECT a.{id}, a."AnimalType", a."Breed", a."Mix", l."Breed_broken", l.{row}
+        FROM breed_list l JOIN animal a ON l.source_row = a.{row}
+    )""".format(id=id_column, row=_ROW), [AnimalID, "AnimalType", "Breed", "Mix", "Breed_broken"])
+    _dedup(con, "breed_typed", """(
+        SELECT b.{id}, b."Breed", b."Mix", b."Breed_broken",
+            nullif(CASE WHEN g."BreedGroup" IS NOT NULL THEN g."BreedGroup"
+                WHEN b."AnimalType" = 'Dog' THEN 'Unknown'
+                ELSE b."Breed_broken" END, 'Unknown') AS "BreedType",
+            b.{row}
+        FROM breed_exploded b LEFT JOIN breed_groups g ON b."Breed_broken" = g."Breed_broken"
+    )""".format(id=id_column, row=_ROW), [AnimalID, "Breed", "Mix", "Breed_broken", "BreedType"])
+
+    # Breed mix: animals with more than one breed are mixed, animals without a breed flag are pure breeds
+    _dedup(con, "breed_mix", """(
+        SELECT a.{id}, a."Breed",
+            CASE WHEN c.breed_count > 1 THEN 'Mix' WHEN a."Mix" IS NULL THEN 'Pure breed' ELSE CAST(a."Mix" AS VARCHAR) END AS "Mix",
+            a.{row}
+        FROM animal a LEFT JOIN (SELECT {id}, count(*) AS breed_count FROM breed_exploded GROUP BY {id}) c ON {on}
+    )""".format(id=id_column, row=_ROW, on=on.format(left="a", right="c")), [AnimalID, "Breed", "Mix"])
+
+    # Coat colors: every color of an animal against every standardized color of the same animal, split on '/'
+    _dedup(con, "coat_pairs", """(
+        SELECT a.{id}, a."Color", c."Color" AS "CoatColor", row_number() OVER (ORDER BY a.{row}, c.{row} NULLS LAST) AS {row}
+        FROM animal a LEFT JOIN coatcolor c ON {on}
+    )""".format(id=id_column, row=_ROW, on=on.format(left="a", right="c")), [AnimalID, "Color", "CoatColor"])
+    _dedup(con, "coat_exploded", """(
+        SELECT {id}, "Color", "CoatColor", row_number() OVER (ORDER BY {row}, part) AS {row}
+        FROM (
+            SELECT {id}, "Color", unnest(parts) AS "CoatColor", unnest(generate_series(1, len(parts))) AS part, {row}
+            FROM (
+                SELECT {id}, "Color", {row},
+                    coalesce(string_split(replace(trim(replace(replace("CoatColor", ' /', '/'), '/ ', '/')), ' ', '/'), '/'), [NULL]::VARCHAR[]) AS parts
+                FROM coat_pairs
+            )
+        )
+    )""".format(id=id_column, row=_ROW), [AnimalID, "Color", "CoatColor"])
+    con.execute("""CREATE OR REPLACE TEMP TABLE coat_color AS
+        SELECT {id}, "Color", CASE WHEN "CoatColor" IN ('Unknown', '') THEN NULL ELSE "CoatColor" END AS "CoatColor", {row}
+        FROM coat_exploded""".format(id=id_column, row=_ROW))
+    _dedup(con, "coat_patterns", "coatcolor", [AnimalID, "Color", "CoatPattern"])
+
+    _dedup(con, "animal_data", "animal", animal_columns)
+
+    tables = {name: name for name in ["animal_data", "breed_mix", "coat_color", "coat_patterns"]}
+    tables["breed"] = "breed_typed"
+    processed = _merge_tree(con, animal_columns, AnimalID, tables)
+
+    return (
+        processed,
+        _fetch(con, "SELECT {} FROM animal_data ORDER BY {}".format(_columns(animal_columns), _ROW)),
+        _fetch(con, "SELECT {} FROM breed_typed ORDER BY {}".format(_columns([AnimalID, "Breed", "Breed_broken", "BreedType"]), _ROW)),
+        _fetch(con, "SELECT {} FROM breed_mix ORDER BY {}".format(_columns([AnimalID, "Breed", "Mix"]), _ROW)),
+        _fetch(con, "SELECT {} FROM coat_color ORDER BY {}".format(_columns([AnimalID, "Color", "CoatColor"]), _ROW)),
+        _fetch(con, "SELECT {} FROM coat_patterns ORDER BY {}".format(_columns([AnimalID, "Color", "CoatPattern"]), _ROW))
+    )
@@ -0,0 +1,267 @@
+import io
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+import instrumentation
+import utils
+
+
+# Supported export formats and their file extensions
+FORMATS = {"parquet": ".parquet", "csv": ".csv", "hyper": ".hyper", "excel": ".xlsx"}
+# Rows per worksheet in Excel, including the header row
+EXCEL_MAX_ROWS = 1_048_576
+
+# pyarrow sets up its pandas integration on the first conversion, which is not thread safe: a frame converted by
+# a writer thread during the set-up is read as a plain sequence (indexed by label). `_to_arrow` runs the set-up
+# once, under a lock, before the first real conversion.
+_ARROW_PANDAS_LOCK = threading.Lock()
+_arrow_pandas_ready = False
+
+
+def _to_arrow(df: pd.DataFrame) -> pa.Table:
+    global _arrow_pandas_ready
+    if not _arrow_pandas_ready:
+        with _ARROW_PANDAS_LOCK:
+            if not _arrow_pandas_ready:
+                pa.Table.from_pandas(pd.DataFrame())
+                _arrow_pandas_ready = True
+
+    return pa.Table.from_pandas(utils.to_arrow_compatible(df), preserve_index=False)
+
+
+def write_parquet(
+    df: pd.DataFrame,
+    path: str,
+    compression: str = "snappy"
+) -> str:
+    """
+    Writes a DataFrame as a Parquet file that Tableau (2022.1+) can read directly.
+
+    Object columns that mix strings with other values are written as strings (see `utils.to_arrow_compatible`).
+
+    Parameters:
+    df (pd.DataFrame): The frame to write.
+    path (str): Destination file.
+    compression (str, optional): Parquet compression codec. Defaults to "snappy".
+
+    Returns:
+    str: `path`.
+    """
+    pq.write_table(_to_arrow(df), path, compression=compression)
+
+    return path
+
+
+def _csv_bytes(table: pa.Table, include_header: bool) -> bytes:
+    sink = io.BytesIO()
+    pa_csv.write_csv(table, sink, write_options=pa_csv.WriteOptions(include_header=include_header))
+
+    return sink.getvalue()
+
+
+def write_csv(
+    df: pd.DataFrame,
+    path: str,
+    chunksize: int = 100_000,
+    n_workers: int = None
+) -> str:
+    """
+    Writes a DataFrame as CSV, formatting chunks of rows in parallel.
+
+    Chunks are formatted by Arrow's CSV writer, which releases the GIL, in a thread pool and appended to the file in
+    order, at most `n_workers` chunks at a time. Missing values are written as empty fields.
+
+    Parameters:
+    df (pd.DataFrame): The frame to write.
+    path (str): Destination file.
+    chunksize (int, optional): Rows per chunk. Defaults to 100,000.
+    n_workers (int, optional): Number of threads. Defaults to `os.cpu_count()`.
+
+    Returns:
+    str: `path`.
+    """
+    n_workers = n_workers or os.cpu_count()
+    table = _to_arrow(df)
+    offsets = list(range(0, max(table.num_rows, 1), chunksize))
+
+    with open(path, "wb") as sink, ThreadPoolExecutor(max_workers=n_workers) as executor:
+        for start in range(0, len(offsets), n_workers):
+            window = offsets[start:start + n_workers]
+            for chunk in executor.map(lambda offset: _csv_bytes(table.slice(offset, chunksize), offset == 0), window):
+                sink.write(chunk)
+
+    return path
+
+
+def write_hyper(
+    df: pd.DataFrame,
+    path: str,
+    table_name: str = "Extract"
+) -> str:
+    """
+    Writes a DataFrame as a Tableau Hyper extract.
+
+    Requires the optional `tableauhyperapi` package. The frame is staged as a temporary Parquet file and loaded by
+    Hyper itself (`CREATE TABLE ... AS SELECT * FROM external(...)`), so no rows pass through Python.
+
+    Parameters:
+    df (pd.DataFrame): The frame to write.
+    path (str): Destination file. An existing file is replaced.
+    table_name (str, optional): Name of the table, created in the "Extract" schema. Defaults to "Extract".
+
+    Returns:
+    str: `path`.
+
+    Raises:
+    - ImportError: If `tableauhyperapi` is not installed.
+    """
+    from tableauhyperapi import Connection, CreateMode, HyperProcess, TableName, Telemetry, escape_string_literal
+
+    with tempfile.TemporaryDirectory() as staging_dir:
+        staged = write_parquet(df, os.path.join(staging_dir, "extract.parquet"))
+        # Keep hyperd's log files out of the working directory
+        with HyperProcess(telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, parameters={"log_dir": staging_dir}) as hyper:
+            with Connection(endpoint=hyper.endpoint, database=path, create_mode=CreateMode.CREATE_AND_REPLACE) as connection:
+                connection.catalog.create_schema_if_not_exists("Extract")
+                connection.execute_command("CREATE TABLE {} AS (SELECT * FROM external({}))".format(
+                    TableName("Extract", table_name), escape_string_literal(staged)
+                ))
+
+    return path
+
+
+def write_excel(
+    sheets: dict,
+    path: str
+) -> str:
+    """
+    Writes one or more DataFrames as worksheets of an Excel workbook with xlsxwriter in `constant_memory` mode.
+
+    Rows are streamed to disk one at a time, so memory stays flat regardless of the number of rows. Requires the
+    optional `xlsxwriter` package. Prefer Parquet, CSV or Hyper for large outputs.
+
+    Parameters:
+    sheets (dict): DataFrames keyed by worksheet name.
+    path (str): Destination file.
+
+    Returns:
+    str: `path`.
+
+    Raises:
+    - ValueError: If a frame does not fit on one worksheet (`EXCEL_MAX_ROWS` rows including the header).
+    - ImportError: If `xlsxwriter` is not installed.
+    """
+    for sheet_name, df in sheets.items():
+        if len(df) + 1 > EXCEL_MAX_ROWS:
+            raise ValueError(
+                "{!r} has {:,} rows, more than the {:,} an Excel worksheet can hold; export it as parquet, csv or hyper instead".format(
+                    sheet_name, len(df), EXCEL_MAX_ROWS - 1
+                )
+            )
+
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    try:
+        for sheet_name, df in sheets.items():
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, [str(column) for column in df.columns])
+            # Missing values become blank cells
+            values = df.astype(object).where(df.notna(), None)
+            for row_number, row in enumerate(values.itertuples(index=False, name=None), start=1):
+                worksheet.write_row(row_number, 0, row)
+    finally:
+        workbook.close()
+
+    return path
+
+
+@instrumentation.instrument
+def export_frames(
+    frames: dict,
+    output_dir: str,
+    fmt: str = "parquet",
+    **kwargs
+) -> dict:
+    """
+    Writes each frame to `<output_dir>/<name><extension>` in the given format.
+
+    Parameters:
+    frames (dict): DataFrames keyed by output name, e.g. {"animal_data": animal_data, "breed": breed}.
+    output_dir (str): Destination directory. It is created if needed.
+    fmt (str, optional): One of "parquet", "csv", "hyper" or "excel". Defaults to "parquet".
+    **kwargs: Keyword arguments forwarded to the writer (`write_parquet`, `write_csv` or `write_hyper`).
+
+    Returns:
+    dict: The written file path of each frame, keyed by name.
+
+    Raises:
+    - ValueError: If `fmt` is not supported, or a frame is too large for an Excel worksheet.
+
+    Example usage:
+    paths = export_frames({"breed": breed, "breed_mix": breed_mix}, "/path/to/export", fmt="csv")
+    """
+    if fmt not in FORMATS:
+        raise ValueError("fmt must be one of {}, got {!r}".format(", ".join(FORMATS), fmt))
+    os.makedirs(output_dir, exist_ok=True)
+
+    paths = {}
+    for name, df in frames.items():
+        path = os.path.join(output_dir, name + FORMATS[fmt])
+        if fmt == "parquet":
+            paths[name] = write_parquet(df, path, **kwargs)
+        elif fmt == "csv":
+            paths[name] = write_csv(df, path, **kwargs)
+        elif fmt == "hyper":
+            paths[name] = write_hyper(df, path, **kwargs)
+        else:
+            paths[name] = write_excel({name: df}, path)
+
+    return paths
+
+
+def benchmark_formats(
+    frames: dict,
+    output_dir: str,
+    formats: list = tuple(FORMATS)
+) -> pd.DataFrame:
+    """
+    Measures export time and file size per format.
+
+    Formats whose optional dependency is missing, or that cannot hold the frames (Excel above its row limit), are
+    reported as skipped rather than failing the benchmark.
+
+    Parameters:
+    frames (dict): DataFrames keyed by output name.
+    output_dir (str): Scratch directory; each format is written to `<output_dir>/<format>`.
+    formats (list, optional): Formats to measure. Defaults to all of `FORMATS`.
+
+    Returns:
+    pd.DataFrame: One row per format with the total rows, wall time in seconds, total size in MB and, for skipped formats, the reason.
+
+    Example usage:
+    report = benchmark_formats({"animal_data": animal_data, "breed": breed}, "/tmp/export_benchmark")
+    """
+    rows = sum(len(df) for df in frames.values())
+    results = []
+    for fmt in formats:
+        start = time.perf_counter()
+        try:
+            paths = export_frames(frames, os.path.join(output_dir, fmt), fmt=fmt)
+        except (ImportError, ValueError) as error:
+            results.append({"format": fmt, "rows": rows, "seconds": np.nan, "size_mb": np.nan, "skipped": str(error)})
+            continue
+        seconds = time.perf_counter() - start
+        size = sum(os.path.getsize(path) for path in paths.values())
+        results.append({"format": fmt, "rows": rows, "seconds": seconds, "size_mb": size / 1024 ** 2, "skipped": None})
+
+    return pd.DataFrame(results)
@@ -1,6 +1,36 @@
 import sys
+import numpy as np
 import pandas as pd
 
+import instrumentation
+import trends
+import utils
+
+
+# Numeric codes of the outcomes, as mapped by `encode_categorical_variables`
+OUTCOME_CODES = {
+    'Adoption': 0,
+    'Return_to_owner': 1,
+    'Transfer': 2,
+    'Died': 3,
+    'Euthanasia': 4
+}
+# Categorical columns of the merged `preprocess_data` frame, as used by the native categorical models
+CATEGORICAL_COLUMNS = [
+    "AnimalType",
+    "SexuponOutcome",
+    "AgeuponOutcome",
+    "Sterilization",
+    "BreedType",
+    "Mix",
+    "CoatColor",
+    "CoatPattern"
+]
+# Upper bounds of the name popularity buckets, in animals with the name: 1, 2-10, 11-100, 101-1000 and more
+NAME_POPULARITY_BINS = (1, 10, 100, 1000)
+
+
+@instrumentation.instrument
 def encode_categorical_variables(
         df: pd.DataFrame
     ) -> pd.DataFrame:
@@ -34,18 +64,9 @@ def encode_categorical_variables(
 
     data = df.copy()
     
-    # Mapping specific categorical values to numeric codes
-    outcome_type_mapping = {
-        'Adoption': 0,
-        'Return_to_owner': 1,
-        'Transfer': 2,
-        'Died': 3,
-        'Euthanasia': 4
-    }
-    
     # Check if 'OutcomeType' column exists in the DataFrame before proceeding
     if "OutcomeType" in data.columns:
-        data['OutcomeType'] = data['OutcomeType'].map(outcome_type_mapping)
+        data['OutcomeType'] = data['OutcomeType'].map(OUTCOME_CODES)
     else:
         pass
     
@@ -86,6 +107,269 @@ def encode_categorical_variables(
     return data
 
 
+@instrumentation.instrument
+def categorical_features(
+    df: pd.DataFrame,
+    AnimalID: str=r"AnimalID",
+    dep_var: str=r"OutcomeType",
+    categories: dict=None
+) -> pd.DataFrame:
+    """
+    Selects the categorical columns as pandas categoricals, for models that split on categories natively.
+
+    Unlike `encode_categorical_variables`, no dummy columns are created: each column keeps one category code per
+    row, so the ~8 columns replace the ~70 dummies and no column names need cleaning. Values that are not text
+    (e.g. the float flags in 'Mix') are converted to text first.
+
+    Parameters:
+    df (pandas.DataFrame): The merged DataFrame returned by `data_processing.preprocess_data`.
+    AnimalID (str, optional): The name of the column used to uniquely identify animals in the dataset. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column; mapped to `OUTCOME_CODES` if present. Defaults to 'OutcomeType'.
+    categories (dict, optional): The categories of each column, as returned by `category_levels` for the training frame. Scoring data must use the training categories so that the codes match; unseen values become missing. Defaults to None (the categories found in `df`).
+
+    Returns:
+    pandas.DataFrame: `AnimalID`, `dep_var` (if present) and the `CATEGORICAL_COLUMNS` found in `df`, as 'category' columns.
+
+    Example usage:
+        train_df = categorical_features(processed_df)
+        score_df = categorical_features(new_processed_df, categories=category_levels(train_df))
+    """
+
+    data = df[[column for column in [AnimalID, dep_var] if column in df.columns]].copy()
+    if dep_var in data.columns:
+        data[dep_var] = data[dep_var].map(OUTCOME_CODES)
+
+    for column in [column for column in CATEGORICAL_COLUMNS if column in df.columns]:
+        values = df[column].astype(object)
+        values = values.where(values.isna(), values.astype(str))
+        data[column] = pd.Categorical(values, categories=None if categories is None else categories[column])
+
+
+    return data
+
+
+def category_levels(df: pd.DataFrame) -> dict:
+    """
+    Returns the categories of the categorical columns of a frame returned by `categorical_features`.
+
+    Parameters:
+    df (pandas.DataFrame): A frame returned by `categorical_features`.
+
+    Returns:
+    dict: The categories (pandas.Index) of each 'category' column.
+    """
+
+    return {column: df[column].cat.categories for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)}
+
+
+@instrumentation.instrument
+def add_sequence_features(
+    df: pd.DataFrame,
+    AnimalID: str=r"AnimalID",
+    dep_var: str=r"OutcomeType",
+    datetime_column: str=r"DateTime",
+    history: pd.DataFrame=None
+) -> pd.DataFrame:
+    """
+    Adds features describing each outcome's place in the animal's outcome history.
+
+    An animal can pass through the shelter several times, e.g. returned to its owner and later adopted. Each visit
+    is one distinct (AnimalID, DateTime) pair; the merged frame repeats it once per breed and coat row. The features
+    are computed once per visit in a single vectorized pass and joined back onto every row of the visit.
+
+    Scoring data has no outcome column, so its previous outcomes come from `history`: the labelled outcomes seen so
+    far (e.g. the training frame). The visits of `history` are ordered together with those of `df`, so a new visit
+    of a known animal gets its visit number, days since and outcome of its latest earlier visit.
+
+    Parameters:
+    df (pandas.DataFrame): The merged DataFrame returned by `data_processing.preprocess_data`, with `AnimalID`, `datetime_column` and, optionally, `dep_var`.
+    AnimalID (str, optional): The name of the column used to uniquely identify animals in the dataset. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+    datetime_column (str, optional): The name of the outcome timestamp column. Defaults to 'DateTime'.
+    history (pandas.DataFrame, optional): Earlier outcomes with `AnimalID`, `datetime_column` and `dep_var`, e.g. the merged training frame. Visits of `df` that are also in `history` take the outcome of `history`. Defaults to None.
+
+    Returns:
+    pandas.DataFrame: A copy of `df` with the added columns:
+    - VisitNumber: 1 for the animal's first outcome, 2 for the second, and so on.
+    - DaysSincePrevious: Days since the animal's previous outcome; -1 on the first visit.
+    - PreviousOutcome_<outcome>: Indicators of the previous outcome (all 0 on the first visit, or when the previous outcome is unknown), one per `OUTCOME_CODES` key.
+    - OutcomeMonth, OutcomeWeekday, OutcomeHour: Calendar features of the outcome (Monday is 0); -1 where the timestamp is missing.
+
+    Process Overview:
+    1. Parses `datetime_column` once (see `trends.parse_datetime`). The visits are ordered by the parsed timestamp,
+       not by the 'DateTime' text, which does not sort chronologically.
+    2. Numbers the visits of each animal with `groupby().cumcount()` and takes the previous timestamp and outcome
+       with `groupby().shift()`.
+    3. Joins the visit features back onto `df` with a hash join on (AnimalID, DateTime).
+
+    Example usage:
+        sequence_df = add_sequence_features(processed_df)
+        scoring_df = add_sequence_features(new_processed_df, history=processed_df)
+        
+    Assumptions:
+    - Timestamps that cannot be parsed are treated as the latest visit of the animal.
+    """
+
+    keys = [AnimalID, datetime_column]
+    visits = df[keys + ([dep_var] if dep_var in df.columns else [])].drop_duplicates(subset=keys)
+    if history is not None:
+        # The history comes first, so that its outcome is kept for visits that are in both frames
+        visits = pd.concat([history[keys + [dep_var]], visits], ignore_index=True).drop_duplicates(subset=keys)
+    timestamps = trends.parse_datetime(visits[datetime_column])
+    # Stable sort by time only: groupby().shift/cumcount follow the row order within each animal
+    order = np.argsort(timestamps.to_numpy(dtype="datetime64[ns]", na_value=np.datetime64("NaT")), kind="stable")
+    visits = visits.iloc[order]
+    timestamps = timestamps.iloc[order]
+    by_animal = visits.groupby(AnimalID, sort=False)
+
+    features = visits[keys].copy()
+    features["VisitNumber"] = by_animal.cumcount() + 1
+    features["DaysSincePrevious"] = (timestamps - timestamps.groupby(visits[AnimalID], sort=False).shift()).dt.days.fillna(-1).astype(int)
+    previous = by_animal[dep_var].shift() if dep_var in visits.columns else pd.Series(np.nan, index=visits.index)
+    for outcome in OUTCOME_CODES:
+        features["PreviousOutcome_" + outcome] = (previous == outcome).astype(int)
+    features["OutcomeMonth"] = timestamps.dt.month.fillna(-1).astype(int)
+    features["OutcomeWeekday"] = timestamps.dt.dayofweek.fillna(-1).astype(int)
+    features["OutcomeHour"] = timestamps.dt.hour.fillna(-1).astype(int)
+
+    data = df.merge(features, on=keys, how="left")
+    data.index = df.index
+
+
+    return data
+
+
+def clean_names(names: pd.Series) -> pd.Series:
+    """
+    Normalizes animal names for counting and lookup.
+
+    Strips whitespace and the leading '*' the shelter puts on names it gave the animal, and lower-cases the rest.
+    Missing and empty names become NaN.
+
+    Parameters:
+    names (pandas.Series): The 'Name' column.
+
+    Returns:
+    pandas.Series: The cleaned names.
+    """
+
+    cleaned = names.astype(object).str.strip().str.lstrip("*").str.strip().str.lower()
+
+
+    return cleaned.replace("", np.nan)
+
+
+@instrumentation.instrument
+def fit_name_frequencies(
+    df: pd.DataFrame,
+    AnimalID: str=r"AnimalID",
+    name_column: str=r"Name"
+) -> pd.DataFrame:
+    """
+    Builds the name frequency table used by `add_name_features`.
+
+    Names are counted once per animal, so repeat visits and the breed/coat rows of the merged frame do not inflate
+    them. Fit the table on the training data and persist it with `save_name_frequencies`, so that scoring new
+    animals looks names up instead of recounting the history.
+
+    Parameters:
+    df (pandas.DataFrame): Training rows with `AnimalID` and `name_column`, e.g. the merged DataFrame returned by `data_processing.preprocess_data`.
+    AnimalID (str, optional): The name of the column used to uniquely identify animals in the dataset. Defaults to "AnimalID".
+    name_column (str, optional): The name of the column holding the animal names. Defaults to 'Name'.
+
+    Returns:
+    pandas.DataFrame: Indexed by cleaned name (see `clean_names`), with the number of animals ('count') and the popularity bucket ('bucket', see `NAME_POPULARITY_BINS`).
+
+    Example usage:
+        name_frequencies = fit_name_frequencies(processed_df)
+        save_name_frequencies(name_frequencies, "/path/to/name_frequencies.joblib")
+    """
+
+    names = df[[AnimalID, name_column]].drop_duplicates()
+    counts = clean_names(names[name_column]).value_counts()
+    buckets = np.searchsorted(NAME_POPULARITY_BINS, counts.to_numpy(), side="left") + 1
+
+
+    return pd.DataFrame({"count": counts.to_numpy(), "bucket": buckets.astype("int8")}, index=counts.index.rename(name_column))
+
+
+def save_name_frequencies(name_frequencies: pd.DataFrame, path: str) -> str:
+    """
+    Saves a name frequency table with joblib, next to the model it was fitted with.
+
+    Parameters:
+    name_frequencies (pandas.DataFrame): The table returned by `fit_name_frequencies`.
+    path (str): Destination file.
+
+    Returns:
+    str: `path`.
+    """
+
+    import joblib
+
+    joblib.dump(name_frequencies, path)
+
+
+    return path
+
+
+def load_name_frequencies(path: str) -> pd.DataFrame:
+    """
+    Loads a name frequency table saved by `save_name_frequencies`.
+
+    Parameters:
+    path (str): The saved file.
+
+    Returns:
+    pandas.DataFrame: The name frequency table.
+    """
+
+    import joblib
+
+    return joblib.load(path)
+
+
+@instrumentation.instrument
+def add_name_features(
+    df: pd.DataFrame,
+    name_frequencies: pd.DataFrame,
+    name_column: str=r"Name"
+) -> pd.DataFrame:
+    """
+    Adds features derived from the animal's name.
+
+    Parameters:
+    df (pandas.DataFrame): The input DataFrame with `name_column`.
+    name_frequencies (pandas.DataFrame): The table returned by `fit_name_frequencies` (or `load_name_frequencies`).
+    name_column (str, optional): The name of the column holding the animal names. Defaults to 'Name'.
+
+    Returns:
+    pandas.DataFrame: A copy of `df` with the added columns:
+    - HasName: 1 if the animal has a name.
+    - NameGivenByShelter: 1 if the name is marked with a leading '*', i.e. was given by the shelter.
+    - NameLength: Number of characters of the cleaned name; 0 without a name.
+    - NamePopularity: The name's bucket in `name_frequencies`; 0 without a name and 1 (as rare as possible) for names not in the table.
+
+    Example usage:
+        named_df = add_name_features(processed_df, load_name_frequencies("/path/to/name_frequencies.joblib"))
+    """
+
+    data = df.copy()
+    names = clean_names(data[name_column])
+    has_name = names.notna()
+
+    data["HasName"] = has_name.astype(int)
+    data["NameGivenByShelter"] = data[name_column].astype(object).str.strip().str.startswith("*").fillna(False).astype(int)
+    data["NameLength"] = names.str.len().fillna(0).astype(int)
+    # Hash lookup of each name in the precomputed table
+    popularity = pd.Series(name_frequencies["bucket"].reindex(names).to_numpy(), index=data.index)
+    data["NamePopularity"] = popularity.fillna(1).where(has_name, 0).astype(int)
+
+
+    return data
+
+
+@instrumentation.instrument
 def select_features(
     df: pd.DataFrame,
     AnimalID: str=r"AnimalID",
@@ -129,10 +413,107 @@ def select_features(
     return df[existing_columns]
 
 
+@instrumentation.instrument
+def compact_rows(
+    df: pd.DataFrame,
+    AnimalID: str=r"AnimalID",
+    weight_column: str=r"Weight"
+) -> pd.DataFrame:
+    """
+    Collapses rows with the same features and label into one row weighted by the number of rows it replaces.
+
+    After `engineer_features` most rows repeat one of a few thousand combinations of the encoded columns. Training on
+    the distinct rows with their counts as `sample_weight` fits the same models (the weighted loss is the same sum)
+    on a fraction of the rows. The model builders in `models` pick the weights up from `weight_column`.
+
+    Parameters:
+    df (pandas.DataFrame): The engineered DataFrame, e.g. returned by `engineer_features`.
+    AnimalID (str, optional): The name of the column used to uniquely identify animals; it is dropped, as it differs between otherwise identical rows. Defaults to "AnimalID".
+    weight_column (str, optional): The name of the added count column. Defaults to 'Weight'. Existing weights in this column are summed.
+
+    Returns:
+    pandas.DataFrame: The first row of each distinct (features, label) combination, without `AnimalID`, with the number of rows (or summed weights) it stands for in `weight_column`.
+
+    Process Overview:
+    1. Hashes each row of the remaining columns to 64 bits with `pd.util.hash_pandas_object`.
+    2. Numbers the distinct hashes with `pd.factorize` (a hash table, linear in the number of rows) and counts them with `np.bincount`.
+    3. Keeps the first row of each hash.
+
+    Example usage:
+        compact_df = compact_rows(engineered_df)
+        models.random_forest_model(compact_df)
+    """
+
+    columns = [column for column in df.columns if column not in [AnimalID, weight_column]]
+    codes, _ = pd.factorize(pd.util.hash_pandas_object(df[columns], index=False))
+    weights = df[weight_column].to_numpy() if weight_column in df.columns else None
+
+    data = df.loc[utils.first_occurrences(codes), columns].reset_index(drop=True)
+    data[weight_column] = np.bincount(codes, weights=weights)
+    if weights is None:
+        data[weight_column] = data[weight_column].astype(int)
+
+
+    return data
+
+
+@instrumentation.instrument
+def compact_split_rows(
+    df: pd.DataFrame,
+    seed: int=0,
+    test_size: float=0.2,
+    AnimalID: str=r"AnimalID",
+    weight_column: str=r"Weight",
+    split_column: str=r"Validation"
+) -> pd.DataFrame:
+    """
+    Splits the rows into training and validation rows, then compacts each side with `compact_rows`.
+
+    Compacting before splitting would draw the split over distinct rows: an identical row could never be on both
+    sides, and the share of the weight in each side would depend on where the heavy rows land. Splitting the
+    uncompacted rows first keeps the split, and the validation metrics, the same as for uncompacted training.
+
+    Parameters:
+    df (pandas.DataFrame): The engineered DataFrame, e.g. returned by `engineer_features`.
+    seed (int, optional): Random state of the split. Defaults to 0.
+    test_size (float, optional): Share of the rows in the validation side. Defaults to 0.2.
+    AnimalID (str, optional): The name of the column used to uniquely identify animals; it is dropped, as in `compact_rows`. Defaults to "AnimalID".
+    weight_column (str, optional): The name of the added count column. Defaults to 'Weight'.
+    split_column (str, optional): The name of the added column that is 1 on validation rows and 0 on training rows. Defaults to 'Validation'.
+
+    Returns:
+    pandas.DataFrame: The compacted training rows followed by the compacted validation rows. The model builders in `models` use `split_column` instead of drawing their own split.
+
+    Process Overview:
+    1. Draws the row split with `train_test_split(test_size=test_size, random_state=seed)`, i.e. the split the
+       builders draw on an uncompacted frame with the same seed.
+    2. Calls `compact_rows` on each side and concatenates them, marking the validation rows in `split_column`.
+
+    Example usage:
+        compact_df = compact_split_rows(engineered_df, seed=42)
+        models.random_forest_model(compact_df, seed=42)
+    """
+
+    from sklearn.model_selection import train_test_split
+
+    train_rows, validation_rows = train_test_split(np.arange(len(df)), test_size=test_size, random_state=seed)
+    sides = [
+        compact_rows(df.iloc[rows], AnimalID=AnimalID, weight_column=weight_column).assign(**{split_column: flag})
+        for rows, flag in [(train_rows, 0), (validation_rows, 1)]
+    ]
+
+
+    return pd.concat(sides, ignore_index=True)
+
+
+@instrumentation.instrument
 def engineer_features(
     df: pd.DataFrame,
     AnimalID: str=r"AnimalID",
-    dep_var: str=r"OutcomeType"
+    dep_var: str=r"OutcomeType",
+    sequence_features: bool=False,
+    name_frequencies: pd.DataFrame=None,
+    history: pd.DataFrame=None
 ) -> pd.DataFrame:
     """
     Engineers and selects features from a DataFrame for machine learning model preparation.
@@ -145,14 +526,19 @@ def engineer_features(
     df (pandas.DataFrame): The input DataFrame containing raw data that requires feature transformation.
     AnimalID (str, optional): The column name used to identify individual animals in the dataset. Defaults to "AnimalID".
     dep_var (str, optional): The name of the dependent variable column, which is the target for prediction. Defaults to 'OutcomeType'.
+    sequence_features (bool, optional): Whether to add the repeat-visit and calendar features of `add_sequence_features`. Requires the 'DateTime' column. Defaults to False.
+    name_frequencies (pandas.DataFrame, optional): A table returned by `fit_name_frequencies` (or `load_name_frequencies`). If given, the name features of `add_name_features` are added. Defaults to None.
+    history (pandas.DataFrame, optional): Labelled earlier outcomes passed to `add_sequence_features`, needed for the previous outcomes of scoring data. Defaults to None.
 
     Returns:
     pandas.DataFrame: A DataFrame with engineered and selected features, ready for model training or analysis.
 
     Process Overview:
-    1. Calls `encode_categorical_variables` to transform categorical columns into numerical representations,
+    1. If `sequence_features` is set, calls `add_sequence_features` on the raw frame, while the outcome and
+       'DateTime' columns are still available as text. If `name_frequencies` is given, calls `add_name_features`.
+    2. Calls `encode_categorical_variables` to transform categorical columns into numerical representations,
        including creating dummy variables where applicable.
-    2. Invokes `select_features` to filter the dataset down to only those columns that are relevant for 
+    3. Invokes `select_features` to filter the dataset down to only those columns that are relevant for 
        machine learning models, based on predefined criteria or feature selection logic.
 
     Example usage:
@@ -163,6 +549,12 @@ def engineer_features(
       which perform necessary subtasks within this function.
     """
 
+    # Add the repeat-visit features before the outcome is encoded
+    if sequence_features:
+        df = add_sequence_features(df, AnimalID=AnimalID, dep_var=dep_var, history=history)
+    if name_frequencies is not None:
+        df = add_name_features(df, name_frequencies)
+
     # Encode categorical variables in the DataFrame
     df_encoded = encode_categorical_variables(df)
 
@@ -0,0 +1,307 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+import utils
+
+
+# Version of the on-disk layout, stored in the manifest
+FORMAT_VERSION = 2
+MANIFEST = "manifest.json"
+# Rows converted to the store dtype at a time while writing
+WRITE_BLOCK_ROWS = 100_000
+# Arrays of a store, besides the features, and the manifest entry naming their column
+ROLE_ARRAYS = ("labels", "ids", "weights", "validation")
+# Modules whose code produces the engineered frame, see `feature_code_version`
+FEATURE_MODULES = ("data_processing", "row_guard", "feature_engineering", "trends", "utils")
+
+
+def _replace(path: str, write) -> None:
+    # Write to a temporary file and rename it over `path`, so readers never see a partial file. The temporary
+    # file has a unique name, so writers in other processes or threads do not write to it.
+    handle, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".tmp-", dir=os.path.dirname(path))
+    os.close(handle)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _read_manifest(store_dir: str) -> dict:
+    with open(os.path.join(store_dir, MANIFEST)) as file:
+        return json.load(file)
+
+
+def file_fingerprint(path: str) -> dict:
+    """
+    Identifies a source file by its absolute path, modification time and size, e.g. for `write_feature_store(source=...)`.
+    """
+    stat = os.stat(path)
+
+    return {"path": os.path.abspath(path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def feature_code_version() -> str:
+    """
+    Returns a hash of the source of the modules that preprocess and engineer the features (`FEATURE_MODULES`).
+    """
+    return utils.source_version(*FEATURE_MODULES)
+
+
+@instrumentation.instrument
+def write_feature_store(
+    df: pd.DataFrame,
+    store_dir: str,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType",
+    weight_column: str = r"Weight",
+    split_column: str = r"Validation",
+    dtype: str = "float32",
+    source: dict = None,
+    code_version: str = None
+) -> dict:
+    """
+    Writes an engineered frame as a feature store: memory-mappable `.npy` arrays and a JSON manifest.
+
+    The store holds `features.npy` (rows x feature columns, C order, `dtype`), and, when the columns are present,
+    `labels.npy` (`dep_var`), `ids.npy` (`AnimalID`, fixed-width text), `weights.npy` (`weight_column`, see
+    `feature_engineering.compact_rows`) and `validation.npy` (`split_column`, see
+    `feature_engineering.compact_split_rows`). The feature matrix is filled in blocks of `WRITE_BLOCK_ROWS` rows, so
+    writing needs no second dense copy of `df`.
+
+    Each write goes to a new data directory inside `store_dir`, and is published by atomically replacing the
+    manifest, which names that directory. Readers therefore see either the previous store or the new one, never a
+    mix. The previous data directory is kept for readers that read its manifest just before the switch, and the
+    one before it is removed (processes that already mapped it keep their pages). Only directories that a manifest
+    published are removed, so the directory of a concurrent writer that has not published yet is left alone.
+
+    Parameters:
+    df (pd.DataFrame): Engineered rows, e.g. from `feature_engineering.engineer_features`. All columns other than the id, label, weight and split columns must be numeric.
+    store_dir (str): Directory of the store.
+    AnimalID (str, optional): The name of the animal identifier column. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the (encoded) target column. Defaults to 'OutcomeType'.
+    weight_column (str, optional): The name of the row weight column. Defaults to 'Weight'.
+    split_column (str, optional): The name of the column marking validation rows. Defaults to 'Validation'.
+    dtype (str, optional): The dtype of the feature matrix. float32 halves the size and holds the engineered dummies and counts exactly. Defaults to "float32".
+    source (dict, optional): Fingerprint of the data the frame was built from, e.g. `file_fingerprint(raw_data_path)`; see `store_is_current`. Defaults to None.
+    code_version (str, optional): Version of the code that built the frame, e.g. `feature_code_version()`; see `store_is_current`. Defaults to None.
+
+    Returns:
+    dict: The manifest.
+
+    Example usage:
+    write_feature_store(engineered_df, "/path/to/feature_store", source=file_fingerprint("/path/to/data.csv"), code_version=feature_code_version())
+    store = open_feature_store("/path/to/feature_store")
+    """
+    columns = [column for column in df.columns if column not in [AnimalID, dep_var, weight_column, split_column]]
+    features = df[columns]
+    non_numeric = [column for column, column_dtype in features.dtypes.items() if not pd.api.types.is_numeric_dtype(column_dtype)]
+    if non_numeric:
+        raise ValueError("Feature columns must be numeric, got {}".format(non_numeric))
+
+    os.makedirs(store_dir, exist_ok=True)
+    data_dir = tempfile.mkdtemp(prefix="data-", dir=store_dir)
+
+    matrix = np.lib.format.open_memmap(os.path.join(data_dir, "features.npy"), mode="w+", dtype=dtype, shape=(len(features), len(columns)))
+    for start in range(0, len(features), WRITE_BLOCK_ROWS):
+        matrix[start:start + WRITE_BLOCK_ROWS] = features.iloc[start:start + WRITE_BLOCK_ROWS].to_numpy(dtype=dtype)
+    matrix.flush()
+    del matrix
+
+    arrays = {}
+    if dep_var in df.columns:
+        labels = df[dep_var]
+        arrays["labels"] = labels.to_numpy(dtype=float if labels.isna().any() else np.int64)
+    if AnimalID in df.columns:
+        arrays["ids"] = df[AnimalID].to_numpy(dtype=str)
+    if weight_column in df.columns:
+        arrays["weights"] = df[weight_column].to_numpy(dtype=float)
+    if split_column in df.columns:
+        arrays["validation"] = df[split_column].to_numpy() == 1
+    for name, values in arrays.items():
+        np.save(os.path.join(data_dir, name + ".npy"), values)
+
+    # The store being replaced, read just before the switch
+    current = _read_manifest(store_dir) if store_exists(store_dir) else {}
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "data_dir": os.path.basename(data_dir),
+        "previous_data_dir": current.get("data_dir"),
+        "rows": len(df),
+        "columns": columns,
+        "frame_columns": list(df.columns),
+        "dtype": np.dtype(dtype).name,
+        "AnimalID": AnimalID if "ids" in arrays else None,
+        "dep_var": dep_var if "labels" in arrays else None,
+        "weight_column": weight_column if "weights" in arrays else None,
+        "split_column": split_column if "validation" in arrays else None,
+        "arrays": sorted(["features"] + list(arrays)),
+        "source": source,
+        "code_version": code_version
+    }
+
+    def write_manifest(tmp_path):
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+
+    _replace(os.path.join(store_dir, MANIFEST), write_manifest)
+
+    retired = current.get("previous_data_dir")
+    if retired and retired not in (manifest["data_dir"], manifest["previous_data_dir"]):
+        shutil.rmtree(os.path.join(store_dir, retired), ignore_errors=True)
+
+    return manifest
+
+
+def store_exists(store_dir: str) -> bool:
+    """
+    Checks whether `store_dir` holds a complete feature store (its manifest is only written once all arrays are).
+    """
+    return os.path.exists(os.path.join(store_dir, MANIFEST))
+
+
+def store_is_current(store_dir: str, source: dict = None, code_version: str = None) -> bool:
+    """
+    Checks whether `store_dir` holds a complete store of the current layout, built from `source` by `code_version`.
+
+    Parameters:
+    store_dir (str): Directory of the store.
+    source (dict, optional): The fingerprint the store must have been written with, e.g. `file_fingerprint(raw_data_path)`. Defaults to None.
+    code_version (str, optional): The code version the store must have been written with, e.g. `feature_code_version()`. Defaults to None.
+
+    Returns:
+    bool: False if the store is missing, has another layout, or was built from other data or code; rebuild it then.
+
+    Example usage:
+    source, code_version = file_fingerprint(raw_data_path), feature_code_version()
+    if not store_is_current(store_dir, source, code_version):
+        write_feature_store(engineered_df, store_dir, source=source, code_version=code_version)
+    """
+    if not store_exists(store_dir):
+        return False
+    manifest = _read_manifest(store_dir)
+
+    return manifest.get("format_version") == FORMAT_VERSION and manifest.get("source") == source and manifest.get("code_version") == code_version
+
+
+class FeatureStore:
+    """
+    Read-only view of a feature store written by `write_feature_store`.
+
+    The arrays are memory-mapped, so opening a store reads no data. Processes that open the same store share
+    its pages through the OS page cache instead of each holding a private copy, and only the rows and columns
+    that are used are read from disk. The model builders in `models` take a store in place of a frame (see `split`).
+
+    Attributes:
+    X (np.memmap): The feature matrix, rows x `columns`.
+    y (np.memmap or None): The labels.
+    ids (np.memmap or None): The AnimalID of each row.
+    weights (np.memmap or None): The row weights.
+    validation (np.memmap or None): True on the validation rows.
+    columns (list): The feature column names.
+    manifest (dict): The manifest of the store.
+    """
+
+    def __init__(self, store_dir: str, mmap_mode: str = "r"):
+        self.manifest = _read_manifest(store_dir)
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError("Unsupported feature store format {!r} in {}".format(self.manifest.get("format_version"), store_dir))
+
+        data_dir = os.path.join(store_dir, self.manifest["data_dir"])
+        arrays = {
+            name: np.load(os.path.join(data_dir, name + ".npy"), mmap_mode=mmap_mode)
+            for name in self.manifest["arrays"]
+        }
+        self.store_dir = store_dir
+        self.columns = self.manifest["columns"]
+        self.X = arrays["features"]
+        self.y = arrays.get("labels")
+        self.ids = arrays.get("ids")
+        self.weights = arrays.get("weights")
+        self.validation = arrays.get("validation")
+        if self.X.shape != (self.manifest["rows"], len(self.columns)) or any(len(values) != self.manifest["rows"] for values in arrays.values()):
+            raise ValueError("Feature store {} does not match its manifest".format(store_dir))
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    def features(self, columns: list = None) -> pd.DataFrame:
+        """
+        Returns the features as a DataFrame backed by the memory map (no copy when all columns are selected).
+
+        Parameters:
+        columns (list, optional): Only these feature columns (this copies them). Defaults to None (all columns).
+
+        Returns:
+        pd.DataFrame: The features.
+        """
+        if columns is None:
+            return pd.DataFrame(self.X, columns=self.columns, copy=False)
+
+        return pd.DataFrame(self.X[:, [self.columns.index(column) for column in columns]], columns=columns)
+
+    def split(self) -> list:
+        """
+        Returns the training and validation sets of a store written from `feature_engineering.compact_split_rows`.
+
+        `compact_split_rows` puts the validation rows after the training rows, so the sets are slices of the
+        memory map and no rows are copied; otherwise the rows are selected (and copied) with the `validation` mask.
+
+        Returns:
+        list: X_train, X_val (DataFrames), y_train, y_val, w_train, w_val (Series), as `models._train_validation_split` returns them; the weights are None if the store has none.
+
+        Raises:
+        ValueError: If the store has no labels or no validation rows.
+        """
+        if self.y is None or self.validation is None:
+            raise ValueError("Feature store {} has no labels or no validation rows; write it from compact_split_rows".format(self.store_dir))
+
+        n_train = len(self) - int(self.validation.sum())
+        if not self.validation[:n_train].any():
+            rows = [slice(0, n_train), slice(n_train, len(self))]
+        else:
+            rows = [np.flatnonzero(~self.validation), np.flatnonzero(self.validation)]
+        X = [pd.DataFrame(self.X[selection], columns=self.columns, copy=False) for selection in rows]
+        y = [pd.Series(self.y[selection], name=self.manifest["dep_var"]) for selection in rows]
+        weights = [None, None] if self.weights is None else [pd.Series(self.weights[selection], name=self.manifest["weight_column"]) for selection in rows]
+
+        return [X[0], X[1], y[0], y[1], weights[0], weights[1]]
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Returns the store as the engineered frame it was written from.
+
+        This copies the features into memory; use `split`, `features` or `X`, `y` and `weights` to avoid it.
+        """
+        df = self.features().copy()
+        if self.ids is not None:
+            df.insert(0, self.manifest["AnimalID"], self.ids)
+        if self.y is not None:
+            df[self.manifest["dep_var"]] = self.y
+        if self.weights is not None:
+            df[self.manifest["weight_column"]] = self.weights
+        if self.validation is not None:
+            df[self.manifest["split_column"]] = self.validation.astype(int)
+
+        return df[self.manifest["frame_columns"]]
+
+
+def open_feature_store(store_dir: str, mmap_mode: str = "r") -> FeatureStore:
+    """
+    Opens a feature store written by `write_feature_store`.
+
+    Parameters:
+    store_dir (str): Directory of the store.
+    mmap_mode (str, optional): `np.load` memory map mode; "r" is read-only and shared, "c" is copy-on-write. Defaults to "r".
+
+    Returns:
+    FeatureStore: The memory-mapped store.
+    """
+    return FeatureStore(store_dir, mmap_mode=mmap_mode)
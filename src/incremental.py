@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+
+import feature_engineering
+import instrumentation
+
+
+# Learners supported by `IncrementalLearner`
+KINDS = ("sgd", "xgboost")
+# Weight of the newest day in the running accuracy that drift is measured against
+DRIFT_SMOOTHING = 0.1
+
+
+class IncrementalLearner:
+    """
+    Keeps a model up to date with daily batches of engineered rows instead of retraining it on the full history.
+
+    - "sgd": a multinomial logistic regression (`SGDClassifier(loss='log_loss')`) behind a `StandardScaler`. The
+      model is updated with `partial_fit` on the new rows only. The scaler is fitted by `fit` and frozen until the
+      next full fit, so the coefficients keep the scaling they were learned on.
+    - "xgboost": a gradient boosted model that adds `rounds_per_update` trees fitted to the new rows, continuing
+      from the current booster (`xgb.train(..., xgb_model=booster)`).
+
+    Each day is scored before the model learns from it. If that accuracy falls more than `drift_threshold` below
+    the running accuracy of the previous days, or `refit_every` updates have passed since the last full fit, the
+    model is refitted from scratch on `history` instead (when given).
+
+    Parameters:
+    kind (str, optional): "sgd" or "xgboost". Defaults to "sgd".
+    refit_every (int, optional): Number of updates after which the model is refitted on the full history. Defaults to 30.
+    drift_threshold (float, optional): Accuracy drop, versus the running accuracy, that triggers a refit. Defaults to 0.1.
+    rounds_per_update (int, optional): Trees added per update with "xgboost". Defaults to 10.
+    rounds (int, optional): Trees of a full "xgboost" fit. Defaults to 100.
+    seed (int, optional): Random state. Defaults to 0.
+    AnimalID (str, optional): The name of the animal identifier column, dropped from the features. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the (encoded) target column. Defaults to 'OutcomeType'.
+    weight_column (str, optional): The name of the row weight column (see `feature_engineering.compact_rows`), used as sample weights when present. Defaults to 'Weight'.
+
+    Example usage:
+    learner = IncrementalLearner("xgboost").fit(engineered_history)
+    for day_df in daily_batches:
+        action = learner.update(day_df, history=engineered_history_up_to_day)
+    """
+
+    def __init__(
+        self,
+        kind: str = "sgd",
+        refit_every: int = 30,
+        drift_threshold: float = 0.1,
+        rounds_per_update: int = 10,
+        rounds: int = 100,
+        seed: int = 0,
+        AnimalID: str = r"AnimalID",
+        dep_var: str = r"OutcomeType",
+        weight_column: str = r"Weight"
+    ):
+        if kind not in KINDS:
+            raise ValueError("kind must be one of {}, got {!r}".format(", ".join(KINDS), kind))
+        self.kind = kind
+        self.refit_every = refit_every
+        self.drift_threshold = drift_threshold
+        self.rounds_per_update = rounds_per_update
+        self.rounds = rounds
+        self.seed = seed
+        self.AnimalID = AnimalID
+        self.dep_var = dep_var
+        self.weight_column = weight_column
+        self.classes_ = np.array(sorted(feature_engineering.OUTCOME_CODES.values()))
+        self.feature_names = None
+        self.updates_since_fit = 0
+        self.running_accuracy = None
+        self.history = []
+
+    def _split(self, df: pd.DataFrame) -> tuple:
+        df = df.dropna(subset=[self.dep_var])
+        if self.feature_names is None:
+            self.feature_names = [column for column in df.columns if column not in [self.AnimalID, self.dep_var, self.weight_column]]
+        # New dummy columns are dropped and missing ones are 0, so every batch has the columns of the full fit
+        X = df.reindex(columns=self.feature_names, fill_value=0).to_numpy(dtype=float)
+        y = df[self.dep_var].to_numpy(dtype=int)
+        weights = df[self.weight_column].to_numpy(dtype=float) if self.weight_column in df.columns else None
+
+        return X, y, weights
+
+    def _learn(self, X: np.ndarray, y: np.ndarray, weights: np.ndarray, rounds: int, booster=None) -> None:
+        if self.kind == "sgd":
+            self.model.partial_fit(self.scaler.transform(X), y, classes=self.classes_, sample_weight=weights)
+        else:
+            import xgboost as xgb
+
+            params = {"objective": "multi:softprob", "num_class": len(self.classes_), "tree_method": "hist", "eval_metric": "mlogloss", "seed": self.seed}
+            self.model = xgb.train(params, xgb.DMatrix(X, label=y, weight=weights), num_boost_round=rounds, xgb_model=booster)
+
+    @instrumentation.instrument
+    def fit(self, df: pd.DataFrame) -> "IncrementalLearner":
+        """
+        Fits the model from scratch.
+
+        Parameters:
+        df (pd.DataFrame): Engineered rows, e.g. from `feature_engineering.engineer_features` (optionally `compact_rows`). The feature columns are fixed here.
+
+        Returns:
+        IncrementalLearner: self.
+        """
+        self.feature_names = None
+        X, y, weights = self._split(df)
+        if self.kind == "sgd":
+            from sklearn.linear_model import SGDClassifier
+            from sklearn.preprocessing import StandardScaler
+
+            self.scaler = StandardScaler().fit(X, sample_weight=weights)
+            self.model = SGDClassifier(loss="log_loss", random_state=self.seed)
+        self._learn(X, y, weights, rounds=self.rounds)
+        self.updates_since_fit = 0
+        self.running_accuracy = None
+
+        return self
+
+    @instrumentation.instrument
+    def update(self, new_df: pd.DataFrame, history: pd.DataFrame = None) -> str:
+        """
+        Learns from a new batch of rows, refitting on `history` when it is due or drift is detected.
+
+        Parameters:
+        new_df (pd.DataFrame): The new engineered rows only, with the columns used in `fit`.
+        history (pd.DataFrame, optional): All engineered rows including `new_df`, used for a refit. Without it, the model is always updated incrementally. Defaults to None.
+
+        Returns:
+        str: "update", "refit" (scheduled) or "drift_refit". Also appended to `self.history` with the day's accuracy.
+        """
+        X, y, weights = self._split(new_df)
+        if len(y) == 0:
+            return "update"
+
+        # Score the day before learning from it
+        accuracy = np.average(self.predict_codes(X) == y, weights=weights)
+        drift = self.running_accuracy is not None and accuracy < self.running_accuracy - self.drift_threshold
+        self.running_accuracy = accuracy if self.running_accuracy is None else (1 - DRIFT_SMOOTHING) * self.running_accuracy + DRIFT_SMOOTHING * accuracy
+
+        if history is not None and (drift or self.updates_since_fit + 1 >= self.refit_every):
+            action = "drift_refit" if drift else "refit"
+            running_accuracy = None if drift else self.running_accuracy
+            self.fit(history)
+            self.running_accuracy = running_accuracy
+        else:
+            action = "update"
+            self._learn(X, y, weights, rounds=self.rounds_per_update, booster=self.model if self.kind == "xgboost" else None)
+            self.updates_since_fit += 1
+        self.history.append({"action": action, "rows": len(y), "accuracy": accuracy})
+
+        return action
+
+    def predict_proba_codes(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predicts outcome probabilities from a feature matrix with the columns of `fit`.
+
+        Parameters:
+        X (np.ndarray): Features in the order of `self.feature_names`.
+
+        Returns:
+        np.ndarray: One row of probabilities per row of `X`, one column per outcome code in `self.classes_`.
+        """
+        if self.kind == "sgd":
+            return self.model.predict_proba(self.scaler.transform(X))
+
+        import xgboost as xgb
+
+        return self.model.predict(xgb.DMatrix(X))
+
+    def predict_codes(self, X: np.ndarray) -> np.ndarray:
+        return self.classes_[self.predict_proba_codes(X).argmax(axis=1)]
+
+    def predict_proba(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Predicts outcome probabilities for engineered rows.
+
+        Parameters:
+        df (pd.DataFrame): Engineered rows; columns not seen in `fit` are ignored and missing ones are 0.
+
+        Returns:
+        np.ndarray: One row of probabilities per row of `df`, one column per outcome code in `self.classes_`.
+        """
+        return self.predict_proba_codes(df.reindex(columns=self.feature_names, fill_value=0).to_numpy(dtype=float))
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Predicts outcome codes (see `feature_engineering.OUTCOME_CODES`) for engineered rows.
+        """
+        return self.classes_[self.predict_proba(df).argmax(axis=1)]
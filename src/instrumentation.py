@@ -0,0 +1,260 @@
+import collections
+import functools
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+import utils
+
+
+logger = logging.getLogger(__name__)
+
+# Most recent stage records kept; older ones are dropped so that a long-running process does not grow without limit
+MAX_RECORDS = 10_000
+
+# Instrumentation is off unless switched on explicitly or through the environment (see the end of this module), so
+# that decorated pipeline functions only pay for a single boolean check per call.
+_enabled = False
+_records = collections.deque(maxlen=MAX_RECORDS)
+# Per thread: running peak of traced memory for each open stage, innermost last
+_local = threading.local()
+# Records of the stages open in each thread. `tracemalloc` peaks are process wide, so the memory of a stage that
+# overlaps a stage of another thread cannot be told apart and is not recorded.
+_open_stages = {}
+_open_stages_lock = threading.Lock()
+# True while `tracemalloc` runs because `enable` started it (and not the caller, e.g. pytest's tracemalloc option)
+_started_tracing = False
+
+
+def enable(trace_memory: bool = True) -> None:
+    """
+    Switch stage instrumentation on.
+
+    Parameters:
+    trace_memory (bool, optional): Start `tracemalloc` so that peak memory deltas are recorded. Defaults to True.
+    """
+    global _enabled, _started_tracing
+    _enabled = True
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+
+
+def disable() -> None:
+    """
+    Switch stage instrumentation off and stop `tracemalloc` if `enable` started it.
+    """
+    global _enabled, _started_tracing
+    _enabled = False
+    if _started_tracing and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _started_tracing = False
+
+
+def is_enabled() -> bool:
+    """
+    Returns True when stage instrumentation is switched on.
+    """
+    return _enabled
+
+
+def reset() -> None:
+    """
+    Clears all records collected so far. Only the last `MAX_RECORDS` records are kept in any case.
+    """
+    _records.clear()
+
+
+def get_records() -> list:
+    """
+    Returns a copy of the stage records collected so far, one dictionary per stage call.
+    """
+    return list(_records)
+
+
+def count_rows(obj) -> int:
+    """
+    Counts the rows held by a DataFrame/Series, or by all DataFrames/Series in a tuple or list.
+
+    Parameters:
+    obj: The object to inspect.
+
+    Returns:
+    int or None: The total number of rows, or None if `obj` holds no pandas objects.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return len(obj)
+    if isinstance(obj, (tuple, list)):
+        counts = [count_rows(item) for item in obj]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def _peak_stack() -> list:
+    if not hasattr(_local, "peak_stack"):
+        _local.peak_stack = []
+    return _local.peak_stack
+
+
+def _open_stage(record: dict) -> None:
+    thread = threading.get_ident()
+    with _open_stages_lock:
+        others = [other for ident, stack in _open_stages.items() if ident != thread for other in stack]
+        if others:
+            record["overlapped"] = True
+            for other in others:
+                other["overlapped"] = True
+        _open_stages.setdefault(thread, []).append(record)
+
+
+def _close_stage() -> None:
+    thread = threading.get_ident()
+    with _open_stages_lock:
+        stack = _open_stages[thread]
+        stack.pop()
+        if not stack:
+            del _open_stages[thread]
+
+
+def _first_frame(args, kwargs):
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return value
+    return None
+
+
+@contextmanager
+def stage(name: str, rows_in: int = None):
+    """
+    Context manager recording wall time, CPU time and peak traced memory of a block of code.
+
+    The yielded dictionary is the record itself, so the block can fill in `rows_out` once it is known.
+    Nothing is recorded when instrumentation is disabled. CPU time is that of the calling thread. Stages may run
+    on several threads at once (e.g. in the pipeline DAG), but `tracemalloc` only tracks the peak of the whole
+    process: a stage that overlaps a stage of another thread is recorded with `overlapped` set and without
+    `peak_memory_mb`.
+
+    Parameters:
+    name (str): The name of the stage, e.g. "data_processing.process_breed_data".
+    rows_in (int, optional): Number of input rows. Defaults to None.
+
+    Example usage:
+    with instrumentation.stage("preprocess_data.merge", rows_in=len(df)) as record:
+        df = pd.merge(...)
+        record["rows_out"] = len(df)
+    """
+    if not _enabled:
+        yield {}
+        return
+
+    record = {"stage": name, "rows_in": rows_in, "rows_out": None, "overlapped": False}
+    _open_stage(record)
+    peak_stack = _peak_stack()
+    tracing = tracemalloc.is_tracing()
+    start_memory = 0
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if peak_stack:
+            peak_stack[-1] = max(peak_stack[-1], peak)
+        tracemalloc.reset_peak()
+        peak_stack.append(current)
+        start_memory = current
+    start_time = time.time()
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    try:
+        yield record
+    finally:
+        record["wall_seconds"] = time.perf_counter() - start_wall
+        record["cpu_seconds"] = time.thread_time() - start_cpu
+        peak_memory_mb = None
+        if tracing and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            stage_peak = max(peak_stack.pop(), peak)
+            if peak_stack:
+                peak_stack[-1] = max(peak_stack[-1], stage_peak)
+            peak_memory_mb = (stage_peak - start_memory) / 1024 ** 2
+        _close_stage()
+        record["peak_memory_mb"] = None if record["overlapped"] else peak_memory_mb
+        _records.append(record)
+        logger.info(
+            "stage=%s elapsed=%s cpu=%.3fs peak_mem=%s rows_in=%s rows_out=%s",
+            name,
+            utils.calculate_elapsed_time(start_time),
+            record["cpu_seconds"],
+            "n/a" if record["peak_memory_mb"] is None else "{:.1f}MB".format(record["peak_memory_mb"]),
+            rows_in,
+            record["rows_out"]
+        )
+
+
+def instrument(func=None, *, name: str = None):
+    """
+    Decorator recording a `stage` for every call of the decorated function.
+
+    Input rows are taken from the first DataFrame/Series argument and output rows from the return value
+    (summed across DataFrames when a tuple is returned). When instrumentation is disabled the wrapper
+    calls straight through.
+
+    Parameters:
+    func (callable): The function to wrap.
+    name (str, optional): The stage name. Defaults to "<module>.<function name>".
+
+    Example usage:
+    @instrument
+    def process_breed_data(df, AnimalID="AnimalID"):
+        ...
+    """
+    if func is None:
+        return functools.partial(instrument, name=name)
+
+    stage_name = name or "{}.{}".format(func.__module__, func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        rows_in = count_rows(_first_frame(args, kwargs))
+        with stage(stage_name, rows_in=rows_in) as record:
+            result = func(*args, **kwargs)
+            record["rows_out"] = count_rows(result)
+        return result
+
+    return wrapper
+
+
+def summary() -> pd.DataFrame:
+    """
+    Summarises the collected records per stage.
+
+    Returns:
+    pd.DataFrame: One row per stage with the number of calls, total and mean wall time, total CPU time,
+    the largest peak memory delta (of the calls that did not overlap another thread's stage) and the last seen
+    input/output row counts, sorted by total wall time.
+    """
+    columns = ["stage", "calls", "wall_seconds", "mean_wall_seconds", "cpu_seconds", "peak_memory_mb", "rows_in", "rows_out"]
+    if not _records:
+        return pd.DataFrame(columns=columns)
+
+    records = pd.DataFrame(list(_records))
+    report = records.groupby("stage", sort=False).agg(
+        calls=("wall_seconds", "size"),
+        wall_seconds=("wall_seconds", "sum"),
+        mean_wall_seconds=("wall_seconds", "mean"),
+        cpu_seconds=("cpu_seconds", "sum"),
+        peak_memory_mb=("peak_memory_mb", "max"),
+        rows_in=("rows_in", "last"),
+        rows_out=("rows_out", "last")
+    ).reset_index()
+
+    return report.sort_values(by="wall_seconds", ascending=False, ignore_index=True)[columns]
+
+
+if os.environ.get("SHELTER_INSTRUMENT", "").lower() in ("1", "true", "yes"):
+    enable()
@@ -1,7 +1,95 @@
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
-import joblib
-from src.data_processing import preprocess_data
-from src.feature_engineering import create_features
+
+import utils
+from data_processing import preprocess_data
+from feature_engineering import engineer_features
+
+
+class PredictionCache:
+    """Bounded LRU cache of predicted probabilities for one loaded model.
+
+    Scoring batches repeat a small set of distinct encoded feature vectors.
+    Each batch is factorized on a 64-bit row hash, `predict_proba` only runs
+    on the distinct vectors that are not cached yet, and the results are
+    scattered back to every row. Cached vectors are reused by later batches,
+    so re-scoring the same population is mostly lookups.
+
+    Create one cache per loaded model: the cache does not know when a model
+    changes.
+
+    Args:
+        model (object): Trained classifier with `predict_proba` and `classes_`
+        max_size (int, optional): Maximum number of cached vectors; the least
+            recently used are evicted first. Defaults to 100,000.
+    """
+
+    def __init__(self, model, max_size=100_000):
+        self.model = model
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._probabilities = OrderedDict()
+
+    def __len__(self):
+        return len(self._probabilities)
+
+    def predict_proba(self, X):
+        """Predict class probabilities, calling the model only on uncached distinct rows.
+
+        Args:
+            X (pd.DataFrame): Features, with the columns the model was trained on
+
+        Returns:
+            numpy.ndarray: One row of class probabilities per row of `X`
+
+        Raises:
+            ValueError: If the columns of `X` are not the model's
+                `feature_names_in_`, in order. The row hashes do not cover
+                the column names, so a cache hit would not catch it.
+        """
+        names = getattr(self.model, "feature_names_in_", None)
+        if names is not None and list(X.columns) != list(names):
+            raise ValueError("The columns of X do not match the model's feature_names_in_; align them with model_features")
+
+        codes, unique_hashes = pd.factorize(pd.util.hash_pandas_object(X, index=False).to_numpy())
+        first_rows = np.flatnonzero(utils.first_occurrences(codes))
+
+        probabilities = np.empty((len(unique_hashes), len(self.model.classes_)))
+        missing = []
+        for code, row_hash in enumerate(unique_hashes.tolist()):
+            cached = self._probabilities.get(row_hash)
+            if cached is None:
+                missing.append(code)
+            else:
+                self._probabilities.move_to_end(row_hash)
+                probabilities[code] = cached
+        self.hits += len(unique_hashes) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            probabilities[missing] = self.model.predict_proba(X.iloc[first_rows[missing]])
+            for code in missing:
+                # A copy: a row view would keep the whole batch array alive
+                self._probabilities[unique_hashes[code]] = probabilities[code].copy()
+            while len(self._probabilities) > self.max_size:
+                self._probabilities.popitem(last=False)
+
+        return probabilities[codes]
+
+    def predict(self, X):
+        """Predict classes, see `predict_proba`.
+
+        Args:
+            X (pd.DataFrame): Features, with the columns the model was trained on
+
+        Returns:
+            numpy.ndarray: The predicted class of each row of `X`
+        """
+        return self.model.classes_[self.predict_proba(X).argmax(axis=1)]
+
 
 def load_model(model_path):
     """Load the trained model from the specified path.
@@ -12,21 +100,55 @@ def load_model(model_path):
     Returns:
         object: Loaded machine learning model
     """
+    # joblib is only imported when a model is loaded, it adds ~0.2s to the import of this module
+    import joblib
+
     model = joblib.load(model_path)
     return model
 
-def predict_outcomes(model, input_data):
+def model_features(model, engineered_df):
+    """Align engineered features with the columns a model was trained on.
+
+    Dummy columns that the batch does not have are added as 0 and extra ones
+    are dropped. Names are cleaned with `utils.clean_feature_name` if the model
+    was trained on cleaned names (as `models.xg_boost` does).
+
+    Args:
+        model (object): Trained model with `feature_names_in_`
+        engineered_df (pd.DataFrame): Output of `engineer_features`
+
+    Returns:
+        pd.DataFrame: The features in the model's column order
+    """
+    names = list(model.feature_names_in_)
+    if not set(names) <= set(engineered_df.columns):
+        engineered_df = engineered_df.rename(columns=utils.clean_feature_name)
+    return engineered_df.reindex(columns=names, fill_value=0)
+
+def predict_outcomes(model, input_data, cache=None, sequence_features=False, history=None):
     """Make predictions on the input data using the trained model.
 
     Args:
         model (object): Trained machine learning model
         input_data (pd.DataFrame): Raw input data for prediction
+        cache (PredictionCache, optional): Cache of `model` to reuse across
+            batches. Defaults to None (every row is predicted by the model).
+        sequence_features (bool, optional): Whether `model` was trained with
+            `engineer_features(..., sequence_features=True)`. Defaults to False.
+        history (pd.DataFrame, optional): Labelled earlier outcomes, merged as
+            `preprocess_data` returns them (e.g. the training frame), for the
+            previous-outcome features. Defaults to None.
 
     Returns:
-        numpy.ndarray: Model predictions
+        numpy.ndarray: Model predictions, one per row of the merged frame
+            returned by `preprocess_data`
     """
-    processed_data = preprocess_data(input_data)
-    features = create_features(processed_data)
+    # preprocess_data modifies its input; 'Breed_broken' is dropped as in model_training.py
+    processed_data = preprocess_data(input_data.copy())[0].drop(columns=["Breed_broken"])
+    engineered = engineer_features(processed_data, sequence_features=sequence_features, history=history)
+    features = model_features(model, engineered)
+    if cache is not None:
+        return cache.predict(features)
     predictions = model.predict(features)
     return predictions
 
@@ -34,13 +156,14 @@ if __name__ == "__main__":
     # Load the trained model
     model_path = 'path/to/your/trained_model.pkl'  # Update with the actual model path
     model = load_model(model_path)
+    cache = PredictionCache(model)
 
     # Load new data for prediction
     new_data_path = 'path/to/your/new_data.csv'  # Update with the actual new data path
     new_data = pd.read_csv(new_data_path)
 
     # Predict outcomes
-    predictions = predict_outcomes(model, new_data)
+    predictions = predict_outcomes(model, new_data, cache=cache)
 
     # Output predictions
-    print(predictions)
\ No newline at end of file
+    print(predictions)
@@ -3,40 +3,65 @@ import sys
 
 home_dir = r"/Users/wrngnfreeman/Github/Shelter-Animal-Outcomes"
 data_file = r"Austin_Animal_Center_Outcomes_20250318"
+raw_data_path = home_dir + r"/data/" + data_file + r".csv"
 AnimalID=r"AnimalID"
 dep_var=r"OutcomeType"
 seed=42
+feature_store_dir = home_dir + r"/data/feature_store"
 
 # import required modules
 sys.path.append(home_dir + r"/src")
-import data_processing, feature_engineering, models, utils
-
-# Load and process training data
-processed_df = data_processing.process_data(
-    home_dir=home_dir,
-    data_file=data_file,
-    AnimalID=AnimalID,
-    dep_var=dep_var
-)
-# Engineer features
-engineered_df = feature_engineering.engineer_features(
-    df=processed_df.drop(columns=["Breed_broken"]),
-    AnimalID=AnimalID,
-    dep_var=dep_var
-)
+import data_processing, feature_engineering, feature_store, models, utils
+
+# Process and engineer the training data once; later runs, notebooks and tuning jobs open the feature store.
+# It is rebuilt when the data file or the preprocessing and feature code changed since it was written.
+source = feature_store.file_fingerprint(raw_data_path)
+# The seed of the train/validation split is part of what the stored rows depend on
+code_version = "{}:seed={}".format(feature_store.feature_code_version(), seed)
+if not feature_store.store_is_current(feature_store_dir, source=source, code_version=code_version):
+    # Load and process training data
+    processed_df = data_processing.process_data(
+        raw_data_path=raw_data_path,
+        AnimalID=AnimalID,
+        dep_var=dep_var
+    )
+    # Engineer features
+    engineered_df = feature_engineering.engineer_features(
+        df=processed_df.drop(columns=["Breed_broken"]),
+        AnimalID=AnimalID,
+        dep_var=dep_var
+    )
+    # Split the rows into training and validation rows, then collapse identical rows on each side into distinct
+    # rows weighted by their count; the builders use the weights as sample_weight and keep the split
+    engineered_df = feature_engineering.compact_split_rows(
+        df=engineered_df,
+        seed=seed,
+        AnimalID=AnimalID
+    )
+    feature_store.write_feature_store(
+        df=engineered_df,
+        store_dir=feature_store_dir,
+        AnimalID=AnimalID,
+        dep_var=dep_var,
+        source=source,
+        code_version=code_version
+    )
+# Memory-mapped: concurrent training jobs share the pages instead of each holding a copy. The builders take the
+# store itself and train on slices of the memory map.
+store = feature_store.open_feature_store(feature_store_dir)
 
 
 # Model development
 ## Multinomial Logistic Regression model
 models.logistic_regression_model(
-    df=engineered_df,
+    df=store,
     AnimalID=r"AnimalID",
     dep_var=r"OutcomeType",
     seed=seed
 )
 ## Random Forest model
 models.random_forest_model(
-    df=engineered_df,
+    df=store,
     AnimalID=r"AnimalID",
     dep_var=r"OutcomeType",
     seed=seed
@@ -44,7 +69,7 @@ models.random_forest_model(
 ## XGBoost
 models.xg_boost(
     home_dir=home_dir,
-    df=engineered_df,
+    df=store,
     AnimalID=r"AnimalID",
     dep_var=r"OutcomeType",
     seed=seed
@@ -56,7 +81,6 @@ models.xg_boost(
 
 
 # Artificial Nural Network (ANN) model
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import accuracy_score, classification_report
 
@@ -64,20 +88,12 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 
-X = engineered_df.drop(columns=[AnimalID, dep_var])
-y = engineered_df[dep_var]
-
-# Split the data into training and validation sets
-X_train, X_test, y_train, y_test = train_test_split(
-    X,
-    y,
-    test_size=0.2,
-    random_state=seed
-)
+# The training and validation sets, as split before the rows were compacted
+X_train, X_test, y_train, y_test, w_train, w_test = store.split()
 
 # Standardize the features
 scaler = StandardScaler()
-X_train = scaler.fit_transform(X_train)
+X_train = scaler.fit_transform(X_train, sample_weight=w_train)
 X_test = scaler.transform(X_test)
 
 # Convert data to PyTorch tensors
@@ -85,6 +101,8 @@ X_train = torch.tensor(X_train, dtype=torch.float32)
 y_train = torch.tensor(y_train.to_numpy(), dtype=torch.long)
 X_test = torch.tensor(X_test, dtype=torch.float32)
 y_test = torch.tensor(y_test.to_numpy(), dtype=torch.long)
+w_train = torch.tensor(w_train.to_numpy(), dtype=torch.float32)
+w_test = torch.tensor(w_test.to_numpy(), dtype=torch.float32)
 
 # Define the neural network architecture
 class SimpleNN(nn.Module):
@@ -101,11 +119,12 @@ class SimpleNN(nn.Module):
         return out
 
 # Initialize the model, loss function, and optimizer
-input_size = 70
+input_size = X_train.shape[1]
 hidden_size = 128
 output_size = 5
 model = SimpleNN(input_size, hidden_size, output_size)
-criterion = nn.CrossEntropyLoss()
+# Per-row losses, weighted by the number of rows each distinct row stands for
+criterion = nn.CrossEntropyLoss(reduction="none")
 optimizer = optim.SGD(model.parameters(), lr=0.01)
 
 # Training loop
@@ -114,7 +133,7 @@ for epoch in range(num_epochs):
     model.train()
     optimizer.zero_grad()
     outputs = model(X_train)
-    loss = criterion(outputs, y_train)
+    loss = (criterion(outputs, y_train) * w_train).sum() / w_train.sum()
     loss.backward()
     optimizer.step()
 
@@ -126,7 +145,7 @@ model.eval()
 with torch.no_grad():
     predictions = model(X_test)
     _, predicted_classes = torch.max(predictions, 1)
-    accuracy = (predicted_classes == y_test).sum().item() / len(y_test)
+    accuracy = (w_test * (predicted_classes == y_test)).sum().item() / w_test.sum().item()
 
 # Classification Report
 print("Classification Report\n{}".format(
@@ -139,7 +158,8 @@ print("Classification Report\n{}".format(
             'Transfer',
             'Died',
             'Euthanasia'
-        ]
+        ],
+        sample_weight=w_test
     )
 ))
 print("ANN Model Accuracy: {}".format(accuracy))
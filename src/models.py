@@ -1,30 +1,105 @@
+import copy
+import importlib
+import os
 import sys
+import tempfile
+import time
 import numpy as np
 import pandas as pd
-import joblib
 
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, classification_report
+import feature_store
+import instrumentation
 
-from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import RandomForestClassifier
-from xgboost import XGBClassifier
+# scikit-learn, xgboost, scipy and joblib take seconds to import, so each builder imports what it uses. The names
+# that used to be imported here are still available as attributes of this module (see `__getattr__`).
+_LAZY_ATTRIBUTES = {
+    "joblib": ("joblib", None),
+    "sparse": ("scipy.sparse", None),
+    "train_test_split": ("sklearn.model_selection", "train_test_split"),
+    "accuracy_score": ("sklearn.metrics", "accuracy_score"),
+    "classification_report": ("sklearn.metrics", "classification_report"),
+    "log_loss": ("sklearn.metrics", "log_loss"),
+    "LogisticRegression": ("sklearn.linear_model", "LogisticRegression"),
+    "HistGradientBoostingClassifier": ("sklearn.ensemble", "HistGradientBoostingClassifier"),
+    "RandomForestClassifier": ("sklearn.ensemble", "RandomForestClassifier"),
+    "XGBClassifier": ("xgboost", "XGBClassifier")
+}
 
 
+# Default regularization strengths of the logistic regression path, from strongest to weakest
+DEFAULT_CS = np.logspace(-4, 4, 20)
+
+
+def __getattr__(name):
+    # Imports the heavy dependencies of `_LAZY_ATTRIBUTES` on first access, e.g. `models.joblib.load(path)`
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    module_name, attribute = _LAZY_ATTRIBUTES[name]
+    value = importlib.import_module(module_name)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+
+    return value
+
+
+def _train_validation_split(
+    df: pd.DataFrame,
+    AnimalID: str,
+    dep_var: str,
+    weight_column: str,
+    seed: int,
+    split_column: str = r"Validation"
+) -> list:
+    """
+    Split a training frame 80/20 into features, target and, if `weight_column` is present, row weights.
+
+    A frame from `feature_engineering.compact_split_rows` was split before it was compacted; its `split_column`
+    marks the validation rows and no new split is drawn. A `feature_store.FeatureStore` of such a frame is split
+    with `FeatureStore.split`, over its memory map.
+
+    Returns:
+    -------
+    list - X_train, X_val, y_train, y_val, w_train, w_val; the weights are None without `weight_column`.
+    """
+    if isinstance(df, feature_store.FeatureStore):
+        return df.split()
+
+    from sklearn.model_selection import train_test_split
+    X = df.drop(columns=[column for column in [AnimalID, dep_var, weight_column, split_column] if column in df.columns])
+    y = df[dep_var]
+
+    if split_column in df.columns:
+        validation = df[split_column].to_numpy() == 1
+        weights = df[weight_column] if weight_column in df.columns else None
+        return [X[~validation], X[validation], y[~validation], y[validation]] + (
+            [None, None] if weights is None else [weights[~validation], weights[validation]]
+        )
+    if weight_column not in df.columns:
+        return train_test_split(X, y, test_size=0.2, random_state=seed) + [None, None]
+
+    return train_test_split(X, y, df[weight_column], test_size=0.2, random_state=seed)
+
+
+@instrumentation.instrument
 def logistic_regression_model(
     df: pd.DataFrame,
     AnimalID: str = r"AnimalID",
     dep_var: str = r"OutcomeType",
     seed: int = 0,
-    export_model_path: str = False
-) -> LogisticRegression:
+    export_model_path: str = False,
+    weight_column: str = r"Weight",
+    Cs: list = None,
+    n_jobs: int = 1
+) -> "LogisticRegression":
     """
     Train a Logistic Regression model for multi-class classification.
 
     Parameters:
     ----------
-    df : pd.DataFrame
-        Input DataFrame containing features and target variable.
+    df : pd.DataFrame or feature_store.FeatureStore
+        Input DataFrame containing features and target variable, or a feature store written from
+        `feature_engineering.compact_split_rows`, which is used without copying it into a DataFrame.
     AnimalID : str, optional
         Name of the column containing animal identifiers. Default: "AnimalID".
     dep_var : str, optional
@@ -33,6 +108,15 @@ def logistic_regression_model(
         Random state for reproducibility. Default: 0.
     export_model_path : str, optional
         File path to save the trained model using joblib. Default: False (no export).
+    weight_column : str, optional
+        Name of the column holding row weights, e.g. the counts added by `feature_engineering.compact_rows`.
+        Used as `sample_weight` when present. Default: "Weight".
+    Cs : list, optional
+        Inverse regularization strengths to try, e.g. `DEFAULT_CS`. If given, the regularization path is computed
+        (see `regularization_path`, with saga on CSR input, or lbfgs for weighted rows) and the C with the lowest
+        validation log loss is kept. Default: None (a single fit with C=1).
+    n_jobs : int, optional
+        Number of threads the path is split over. Default: 1.
 
     Returns:
     -------
@@ -40,23 +124,30 @@ def logistic_regression_model(
 
     Notes:
     -----
-    - Drops the `AnimalID` and `dep_var` columns to create features (X).
+    - Drops the `AnimalID`, `dep_var` and `weight_column` columns to create features (X).
     - Splits data into 80% training and 20% validation.
     - Outputs classification report and accuracy score.
+    - Rows are weighted by `weight_column`, if present, in the fit and in the validation metrics.
+    - The validation rows are those marked in a 'Validation' column, if present (see `feature_engineering.compact_split_rows`).
+    - With `Cs`, outputs the fit time, iterations and validation scores of each C.
     - Model is saved if `export_model_path` is provided.
     """
-    X = df.drop(columns=[AnimalID, dep_var])
-    y = df[dep_var]
-
-    X_train, X_val, y_train, y_val = train_test_split(
-        X,
-        y,
-        test_size=0.2,
-        random_state=seed
-    )
-
-    lrlm = LogisticRegression(max_iter=1000, random_state=seed)
-    lrlm.fit(X_train, y_train)
+    import joblib
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score, classification_report
+    X_train, X_val, y_train, y_val, w_train, w_val = _train_validation_split(df, AnimalID, dep_var, weight_column, seed)
+
+    if Cs is None:
+        lrlm = LogisticRegression(max_iter=1000, random_state=seed)
+        lrlm.fit(X_train, y_train, sample_weight=w_train)
+    else:
+        # saga's step size shrinks with the largest sample weight, so weighted (compacted) rows use lbfgs
+        lrlm, path = regularization_path(
+            X_train, y_train, X_val, y_val, Cs=Cs, w_train=w_train, w_val=w_val, seed=seed, n_jobs=n_jobs,
+            solver="saga" if w_train is None else "lbfgs"
+        )
+        print("Regularization Path\n{}".format(path.to_string(index=False)))
+        print("Best C: {}".format(lrlm.C))
 
     y_pred = lrlm.predict(X_val)
     print("Classification Report\n{}".format(
@@ -69,10 +160,11 @@ def logistic_regression_model(
                 'Transfer',
                 'Died',
                 'Euthanasia'
-            ]
+            ],
+            sample_weight=w_val
         )
     ))
-    print("Logistic Regression Model Accuracy: {}".format(accuracy_score(y_val, y_pred)))
+    print("Logistic Regression Model Accuracy: {}".format(accuracy_score(y_val, y_pred, sample_weight=w_val)))
 
     if export_model_path:
         joblib.dump(lrlm, export_model_path)
@@ -80,20 +172,121 @@ def logistic_regression_model(
     return lrlm
 
 
+def _path_segment(X_train, y_train, X_val, y_val, Cs, w_train, w_val, seed, max_iter, solver) -> list:
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score, log_loss
+    # Fits the Cs in order, each starting from the coefficients of the previous one
+    model = LogisticRegression(solver=solver, warm_start=True, max_iter=max_iter, random_state=seed)
+    results = []
+    for C in Cs:
+        model.set_params(C=C)
+        start = time.perf_counter()
+        model.fit(X_train, y_train, sample_weight=w_train)
+        fit_seconds = time.perf_counter() - start
+
+        probabilities = model.predict_proba(X_val)
+        results.append(({
+            "C": C,
+            "fit_seconds": fit_seconds,
+            "n_iter": int(model.n_iter_.max()),
+            "val_log_loss": log_loss(y_val, probabilities, sample_weight=w_val, labels=model.classes_),
+            "val_accuracy": accuracy_score(y_val, model.classes_[probabilities.argmax(axis=1)], sample_weight=w_val)
+        }, copy.deepcopy(model)))
+
+    return results
+
+
+def regularization_path(
+    X_train: pd.DataFrame,
+    y_train: pd.Series,
+    X_val: pd.DataFrame,
+    y_val: pd.Series,
+    Cs: list = DEFAULT_CS,
+    w_train: pd.Series = None,
+    w_val: pd.Series = None,
+    seed: int = 0,
+    n_jobs: int = 1,
+    max_iter: int = 1000,
+    solver: str = "saga"
+) -> tuple:
+    """
+    Fit multinomial logistic regressions along a path of regularization strengths and pick the best on the validation split.
+
+    Parameters:
+    ----------
+    X_train, y_train, X_val, y_val : pd.DataFrame, pd.Series
+        The training and validation split, e.g. from the split in `logistic_regression_model`.
+    Cs : list, optional
+        Inverse regularization strengths. Default: `DEFAULT_CS` (20 values from 1e-4 to 1e4).
+    w_train, w_val : pd.Series, optional
+        Row weights of the training and validation rows. Default: None.
+    seed : int, optional
+        Random state for reproducibility. Default: 0.
+    n_jobs : int, optional
+        Number of threads. The path is cut into `n_jobs` contiguous segments that are fitted concurrently, each
+        with its own warm starts (the saga solver releases the GIL). Default: 1.
+    max_iter : int, optional
+        Maximum number of epochs per C. Default: 1000.
+    solver : str, optional
+        "saga", or another solver that supports warm starts, e.g. "lbfgs" for rows with large weights (see
+        `feature_engineering.compact_rows`): saga's step size shrinks with the largest sample weight. Default: "saga".
+
+    Returns:
+    -------
+    tuple - (LogisticRegression, pd.DataFrame): the model with the lowest weighted validation log loss, and one row
+    per C with its fit time in seconds, solver epochs, validation log loss and validation accuracy.
+
+    Notes:
+    -----
+    - The features are converted to a CSR matrix once and fitted with the `saga` solver, which works on the sparse
+      rows directly; the dummy columns are mostly zeros.
+    - The Cs are fitted from strongest to weakest regularization with `warm_start=True`, so each fit starts from the
+      previous solution and needs few epochs; a path costs about as much as a few cold fits.
+    - saga converges fastest on features of similar scale, such as the 0/1 dummies of `engineer_features`.
+
+    Example usage:
+    -------------
+    model, path = regularization_path(X_train, y_train, X_val, y_val, Cs=np.logspace(-3, 3, 20))
+    """
+    import joblib
+    from scipy import sparse
+    Cs = np.sort(np.asarray(Cs, dtype=float))
+    X_train_csr = sparse.csr_matrix(X_train.to_numpy(dtype=np.float64))
+    X_val_csr = sparse.csr_matrix(X_val.to_numpy(dtype=np.float64))
+    w_train = None if w_train is None else np.asarray(w_train, dtype=np.float64)
+
+    segments = [segment for segment in np.array_split(Cs, max(1, min(n_jobs, len(Cs)))) if len(segment)]
+    results = joblib.Parallel(n_jobs=len(segments), prefer="threads")(
+        joblib.delayed(_path_segment)(X_train_csr, y_train, X_val_csr, y_val, segment, w_train, w_val, seed, max_iter, solver)
+        for segment in segments
+    )
+    results = [result for segment in results for result in segment]
+
+    path = pd.DataFrame([row for row, _ in results])
+    best_model = results[int(path["val_log_loss"].idxmin())][1]
+    # Fitted on a CSR matrix, so record the column names for predicting from DataFrames
+    best_model.feature_names_in_ = np.asarray(X_train.columns, dtype=object)
+
+    return best_model, path
+
+
+@instrumentation.instrument
 def random_forest_model(
     df: pd.DataFrame,
     AnimalID: str = r"AnimalID",
     dep_var: str = r"OutcomeType",
     seed: int = 0,
-    export_model_path: str = False
-) -> RandomForestClassifier:
+    export_model_path: str = False,
+    weight_column: str = r"Weight"
+) -> "RandomForestClassifier":
     """
     Train a Random Forest Classifier for multi-class classification.
 
     Parameters:
     ----------
-    df : pd.DataFrame
-        Input DataFrame containing features and target variable.
+    df : pd.DataFrame or feature_store.FeatureStore
+        Input DataFrame containing features and target variable, or a feature store written from
+        `feature_engineering.compact_split_rows`, which is used without copying it into a DataFrame.
     AnimalID : str, optional
         Name of the column containing animal identifiers. Default: "AnimalID".
     dep_var : str, optional
@@ -102,6 +295,9 @@ def random_forest_model(
         Random state for reproducibility. Default: 0.
     export_model_path : str, optional
         File path to save the trained model using joblib. Default: False (no export).
+    weight_column : str, optional
+        Name of the column holding row weights, e.g. the counts added by `feature_engineering.compact_rows`.
+        Used as `sample_weight` when present. Default: "Weight".
 
     Returns:
     -------
@@ -109,18 +305,20 @@ def random_forest_model(
 
     Notes:
     -----
-    - Drops the `AnimalID` and `dep_var` columns to create features (X).
+    - Drops the `AnimalID`, `dep_var` and `weight_column` columns to create features (X).
     - Splits data into 80% training and 20% validation.
     - Outputs classification report, accuracy score, and feature importances.
+    - Rows are weighted by `weight_column`, if present, in the fit and in the validation metrics.
+    - The validation rows are those marked in a 'Validation' column, if present (see `feature_engineering.compact_split_rows`).
     - Model is saved if `export_model_path` is provided.
     """
-    X = df.drop(columns=[AnimalID, dep_var])
-    y = df[dep_var]
-
-    X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=seed)
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, classification_report
+    X_train, X_val, y_train, y_val, w_train, w_val = _train_validation_split(df, AnimalID, dep_var, weight_column, seed)
 
     rf_model = RandomForestClassifier(random_state=seed)
-    rf_model.fit(X_train, y_train)
+    rf_model.fit(X_train, y_train, sample_weight=w_train)
 
     y_pred = rf_model.predict(X_val)
     print("Classification Report\n{}".format(
@@ -133,17 +331,18 @@ def random_forest_model(
                 'Transfer',
                 'Died',
                 'Euthanasia'
-            ]
+            ],
+            sample_weight=w_val
         )
     ))
-    print("Random Forest Model Accuracy: {}".format(accuracy_score(y_val, y_pred)))
+    print("Random Forest Model Accuracy: {}".format(accuracy_score(y_val, y_pred, sample_weight=w_val)))
 
     feature_importances = rf_model.feature_importances_
-    feature_names = X.columns
+    feature_names = X_train.columns
     feature_importance_df = pd.DataFrame({"feature": feature_names, "importance": feature_importances})
     feature_importance_df = feature_importance_df.sort_values(by="importance", ascending=False)
     print("\nFeature Importances")
-    display(feature_importance_df)
+    print(feature_importance_df)
 
     if export_model_path:
         joblib.dump(rf_model, export_model_path)
@@ -151,13 +350,15 @@ def random_forest_model(
     return rf_model
 
 
+@instrumentation.instrument
 def xg_boost(
     home_dir: str,
     df: pd.DataFrame,
     AnimalID: str = r"AnimalID",
     dep_var: str = r"OutcomeType",
     seed: int = 0,
-    export_model_path: str = None
+    export_model_path: str = None,
+    weight_column: str = r"Weight"
 ):
     """
     Train an XGBoost Classifier for multi-class classification.
@@ -166,8 +367,9 @@ def xg_boost(
     ----------
     home_dir : str
         Path to the project directory (for importing utils).
-    df : pd.DataFrame
-        Input DataFrame containing features and target variable.
+    df : pd.DataFrame or feature_store.FeatureStore
+        Input DataFrame containing features and target variable, or a feature store written from
+        `feature_engineering.compact_split_rows`, which is used without copying it into a DataFrame.
     AnimalID : str, optional
         Name of the column containing animal identifiers. Default: "AnimalID".
     dep_var : str, optional
@@ -176,6 +378,9 @@ def xg_boost(
         Random state for reproducibility. Default: 0.
     export_model_path : str, optional
         File path to save the trained model using joblib. Default: None (no export).
+    weight_column : str, optional
+        Name of the column holding row weights, e.g. the counts added by `feature_engineering.compact_rows`.
+        Used as `sample_weight` when present. Default: "Weight".
 
     Returns:
     -------
@@ -184,27 +389,29 @@ def xg_boost(
     Notes:
     -----
     - Cleans feature names using `utils.clean_feature_name`.
-    - Drops the `AnimalID` and `dep_var` columns to create features (X).
+    - Drops the `AnimalID`, `dep_var` and `weight_column` columns to create features (X).
     - Splits data into 80% training and 20% validation.
     - Outputs classification report and accuracy score.
+    - Rows are weighted by `weight_column`, if present, in the fit and in the validation metrics.
+    - The validation rows are those marked in a 'Validation' column, if present (see `feature_engineering.compact_split_rows`).
     - Model is saved if `export_model_path` is provided.
     """
+    import joblib
+    from sklearn.metrics import accuracy_score, classification_report
+    from xgboost import XGBClassifier
     sys.path.append(home_dir + r"/src")
     import utils
 
-    cleaned_feature_names = [utils.clean_feature_name(name) for name in df.columns.values.tolist()]
-    df.columns = cleaned_feature_names
-
-    X = df.drop(columns=[AnimalID, dep_var])
-    y = np.array(df[dep_var])
-
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=seed)
+    X_train, X_test, y_train, y_test, w_train, w_test = _train_validation_split(df, AnimalID, dep_var, weight_column, seed)
+    cleaned_feature_names = [utils.clean_feature_name(name) for name in X_train.columns.values.tolist()]
+    X_train.columns = cleaned_feature_names
+    X_test.columns = cleaned_feature_names
 
     xgb_model = XGBClassifier(use_label_encoder=False, eval_metric='mlogloss', seed=seed)
-    xgb_model.fit(X_train, y_train)
+    xgb_model.fit(X_train, y_train, sample_weight=w_train)
 
     predicted_classes = xgb_model.predict(X_test)
-    accuracy = accuracy_score(y_test, predicted_classes)
+    accuracy = accuracy_score(y_test, predicted_classes, sample_weight=w_test)
 
     print("Classification Report\n{}".format(
         classification_report(
@@ -216,7 +423,8 @@ def xg_boost(
                 'Transfer',
                 'Died',
                 'Euthanasia'
-            ]
+            ],
+            sample_weight=w_test
         )
     ))
     print("XGBoost Model Accuracy: {}".format(accuracy))
@@ -225,3 +433,276 @@ def xg_boost(
         joblib.dump(xgb_model, export_model_path)
 
     return xgb_model
+
+
+@instrumentation.instrument
+def xg_boost_categorical(
+    df: pd.DataFrame,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType",
+    seed: int = 0,
+    export_model_path: str = None,
+    weight_column: str = r"Weight"
+) -> "XGBClassifier":
+    """
+    Train an XGBoost Classifier on native categorical columns instead of one-hot dummies.
+
+    Parameters:
+    ----------
+    df : pd.DataFrame
+        Output of `feature_engineering.categorical_features`: the target and 'category' feature columns.
+    AnimalID : str, optional
+        Name of the column containing animal identifiers. Default: "AnimalID".
+    dep_var : str, optional
+        Name of the column containing the target variable (outcome type). Default: "OutcomeType".
+    seed : int, optional
+        Random state for reproducibility. Default: 0.
+    export_model_path : str, optional
+        File path to save the trained model using joblib. Default: None (no export).
+    weight_column : str, optional
+        Name of the column holding row weights, e.g. the counts added by `feature_engineering.compact_rows`.
+        Used as `sample_weight` when present. Default: "Weight".
+
+    Returns:
+    -------
+    XGBClassifier - A trained XGBoost model.
+
+    Notes:
+    -----
+    - Uses `tree_method='hist'` with `enable_categorical=True`, so XGBoost splits on the category codes directly
+      and the column names need no cleaning.
+    - Drops the `AnimalID`, `dep_var` and `weight_column` columns to create features (X).
+    - Splits data into 80% training and 20% validation.
+    - Outputs classification report and accuracy score.
+    - Rows are weighted by `weight_column`, if present, in the fit and in the validation metrics.
+    - The validation rows are those marked in a 'Validation' column, if present (see `feature_engineering.compact_split_rows`).
+    - Model is saved if `export_model_path` is provided.
+    - Score new data with the training categories: `categorical_features(new_df, categories=category_levels(df))`.
+    """
+    import joblib
+    from sklearn.metrics import accuracy_score, classification_report
+    from xgboost import XGBClassifier
+    X_train, X_test, y_train, y_test, w_train, w_test = _train_validation_split(df, AnimalID, dep_var, weight_column, seed)
+
+    xgb_model = XGBClassifier(tree_method="hist", enable_categorical=True, eval_metric='mlogloss', seed=seed)
+    xgb_model.fit(X_train, y_train, sample_weight=w_train)
+
+    predicted_classes = xgb_model.predict(X_test)
+    accuracy = accuracy_score(y_test, predicted_classes, sample_weight=w_test)
+
+    print("Classification Report\n{}".format(
+        classification_report(
+            y_test,
+            predicted_classes,
+            target_names=[
+                'Adoption',
+                'Return_to_owner',
+                'Transfer',
+                'Died',
+                'Euthanasia'
+            ],
+            sample_weight=w_test
+        )
+    ))
+    print("XGBoost (categorical) Model Accuracy: {}".format(accuracy))
+
+    if export_model_path:
+        joblib.dump(xgb_model, export_model_path)
+
+    return xgb_model
+
+
+def category_codes(X: pd.DataFrame) -> pd.DataFrame:
+    """
+    Replaces the 'category' columns of a feature frame with their codes, as floats with NaN for missing values.
+
+    This is the input `HistGradientBoostingClassifier` expects for categorical features. Other columns are kept as they are.
+
+    Parameters:
+    ----------
+    X : pd.DataFrame
+        Features, e.g. from `feature_engineering.categorical_features` without the identifier and target.
+
+    Returns:
+    -------
+    pd.DataFrame - The features with category codes.
+    """
+    codes = X.copy()
+    for column in codes.columns:
+        if isinstance(codes[column].dtype, pd.CategoricalDtype):
+            codes[column] = codes[column].cat.codes.astype("float64").replace(-1, np.nan)
+
+    return codes
+
+
+def _hist_gradient_boosting(X: pd.DataFrame, seed: int) -> "HistGradientBoostingClassifier":
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    # The 'category' columns of X are passed as categorical features; early stopping holds out 10% of the training rows
+    return HistGradientBoostingClassifier(
+        categorical_features=[isinstance(dtype, pd.CategoricalDtype) for dtype in X.dtypes],
+        early_stopping=True,
+        validation_fraction=0.1,
+        random_state=seed
+    )
+
+
+@instrumentation.instrument
+def hist_gradient_boosting_model(
+    df: pd.DataFrame,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType",
+    seed: int = 0,
+    export_model_path: str = False,
+    weight_column: str = r"Weight"
+) -> "HistGradientBoostingClassifier":
+    """
+    Train a Histogram Gradient Boosting Classifier on native categorical columns.
+
+    Parameters:
+    ----------
+    df : pd.DataFrame
+        Output of `feature_engineering.categorical_features`: the target and 'category' feature columns. Numeric
+        feature columns (e.g. from `add_sequence_features`) may be added and are used as they are.
+    AnimalID : str, optional
+        Name of the column containing animal identifiers. Default: "AnimalID".
+    dep_var : str, optional
+        Name of the column containing the target variable (outcome type). Default: "OutcomeType".
+    seed : int, optional
+        Random state for reproducibility. Default: 0.
+    export_model_path : str, optional
+        File path to save the trained model using joblib. Default: False (no export).
+    weight_column : str, optional
+        Name of the column holding row weights, e.g. the counts added by `feature_engineering.compact_rows`.
+        Used as `sample_weight` when present. Default: "Weight".
+
+    Returns:
+    -------
+    HistGradientBoostingClassifier - A trained histogram gradient boosting model.
+
+    Notes:
+    -----
+    - Drops the `AnimalID`, `dep_var` and `weight_column` columns to create features (X); 'category' columns are passed as their
+      codes (see `category_codes`) and declared as `categorical_features`.
+    - Splits data into 80% training and 20% validation.
+    - Stops adding trees once the score on 10% of the training rows stops improving.
+    - Outputs classification report and accuracy score.
+    - Rows are weighted by `weight_column`, if present, in the fit and in the validation metrics.
+    - The validation rows are those marked in a 'Validation' column, if present (see `feature_engineering.compact_split_rows`).
+    - Model is saved if `export_model_path` is provided.
+    - Predict with `model.predict(category_codes(X))`, X coded with the training categories.
+    """
+    import joblib
+    from sklearn.metrics import accuracy_score, classification_report
+    X_train, X_val, y_train, y_val, w_train, w_val = _train_validation_split(df, AnimalID, dep_var, weight_column, seed)
+
+    hgb_model = _hist_gradient_boosting(X_train, seed)
+    X_train, X_val = category_codes(X_train), category_codes(X_val)
+    hgb_model.fit(X_train, y_train, sample_weight=w_train)
+
+    y_pred = hgb_model.predict(X_val)
+    print("Classification Report\n{}".format(
+        classification_report(
+            y_val,
+            y_pred,
+            target_names=[
+                'Adoption',
+                'Return_to_owner',
+                'Transfer',
+                'Died',
+                'Euthanasia'
+            ],
+            sample_weight=w_val
+        )
+    ))
+    print("Histogram Gradient Boosting Model Accuracy: {} ({} iterations)".format(accuracy_score(y_val, y_pred, sample_weight=w_val), hgb_model.n_iter_))
+
+    if export_model_path:
+        joblib.dump(hgb_model, export_model_path)
+
+    return hgb_model
+
+
+def _measure(model, X_train, y_train, X_val, y_val) -> dict:
+    import joblib
+    from sklearn.metrics import accuracy_score
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = model.predict(X_val)
+    predict_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        path = os.path.join(scratch_dir, "model.joblib")
+        joblib.dump(model, path)
+        size = os.path.getsize(path)
+
+    return {
+        "fit_seconds": fit_seconds,
+        "predict_seconds": predict_seconds,
+        "artifact_mb": size / 1024 ** 2,
+        "accuracy": accuracy_score(y_val, y_pred)
+    }
+
+
+def benchmark_hist_gradient_boosting(
+    engineered_df: pd.DataFrame,
+    categorical_df: pd.DataFrame,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType",
+    seed: int = 0
+) -> pd.DataFrame:
+    """
+    Compares `hist_gradient_boosting_model` with `random_forest_model` on the same train/validation split.
+
+    Parameters:
+    ----------
+    engineered_df : pd.DataFrame
+        One-hot features from `feature_engineering.engineer_features`, as used by `random_forest_model`.
+    categorical_df : pd.DataFrame
+        Categorical features from `feature_engineering.categorical_features`, built from the same rows in the same order.
+    AnimalID : str, optional
+        Name of the column containing animal identifiers. Default: "AnimalID".
+    dep_var : str, optional
+        Name of the column containing the target variable (outcome type). Default: "OutcomeType".
+    seed : int, optional
+        Random state for the split and the models. Default: 0.
+
+    Returns:
+    -------
+    pd.DataFrame - One row per model with the fit and predict wall time in seconds, the joblib artifact size in MB
+    and the validation accuracy.
+
+    Raises:
+    ------
+    ValueError - If the two frames do not hold the same rows.
+
+    Example usage:
+    -------------
+    report = benchmark_hist_gradient_boosting(engineered_df, feature_engineering.categorical_features(processed_df))
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    if not np.array_equal(engineered_df[dep_var].to_numpy(dtype=float), categorical_df[dep_var].to_numpy(dtype=float), equal_nan=True):
+        raise ValueError("engineered_df and categorical_df must hold the same rows in the same order")
+
+    # Split row positions once so that both models see the same rows
+    train_rows, val_rows = train_test_split(np.arange(len(engineered_df)), test_size=0.2, random_state=seed)
+    y = engineered_df[dep_var]
+    X_rf = engineered_df.drop(columns=[AnimalID, dep_var])
+    X_hgb = categorical_df.drop(columns=[AnimalID, dep_var])
+    X_hgb_codes = category_codes(X_hgb)
+
+    results = [
+        dict(model="random_forest", **_measure(
+            RandomForestClassifier(random_state=seed),
+            X_rf.iloc[train_rows], y.iloc[train_rows], X_rf.iloc[val_rows], y.iloc[val_rows]
+        )),
+        dict(model="hist_gradient_boosting", **_measure(
+            _hist_gradient_boosting(X_hgb, seed),
+            X_hgb_codes.iloc[train_rows], y.iloc[train_rows], X_hgb_codes.iloc[val_rows], y.iloc[val_rows]
+        ))
+    ]
+
+    return pd.DataFrame(results)
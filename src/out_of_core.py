@@ -0,0 +1,199 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+import data_processing
+import instrumentation
+import utils
+
+
+# Names of the frames returned by `data_processing.preprocess_data`, in order
+OUTPUT_NAMES = ["processed", "animal_data", "breed", "breed_mix", "coat_color", "coat_patterns"]
+
+
+def partition_ids(
+    ids: pd.Series,
+    n_partitions: int
+) -> np.ndarray:
+    """
+    Assigns each row to a partition by hashing its AnimalID.
+
+    All rows of one animal land in the same partition, and the assignment is stable across runs and
+    processes because it uses `pd.util.hash_pandas_object` rather than Python's salted `hash`.
+
+    Parameters:
+    ids (pd.Series): The AnimalID column.
+    n_partitions (int): The number of partitions.
+
+    Returns:
+    np.ndarray: The partition number (0 to n_partitions - 1) of each row.
+    """
+    return (pd.util.hash_pandas_object(ids, index=False).to_numpy() % np.uint64(n_partitions)).astype(np.int64)
+
+
+@instrumentation.instrument
+def partition_raw_data(
+    raw_data_path: str,
+    partition_dir: str,
+    n_partitions: int = 16,
+    chunksize: int = 250_000,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType"
+) -> list:
+    """
+    Streams a raw outcomes CSV in chunks and hash-partitions the cleaned rows by AnimalID into Parquet files.
+
+    Only one chunk of the CSV is held in memory at a time. Each chunk is cleaned with
+    `data_processing.clean_raw_data` and split by `partition_ids`; the rows of partition p are written to
+    `<partition_dir>/partition=<p>/chunk-<n>.parquet`.
+
+    Parameters:
+    raw_data_path (str): The full path to the CSV file to be loaded.
+    partition_dir (str): Directory the partitions are written to. Existing contents are replaced.
+    n_partitions (int, optional): The number of partitions. Defaults to 16.
+    chunksize (int, optional): The number of CSV rows read at a time. Defaults to 250,000.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+
+    Returns:
+    list: The directories of the non-empty partitions, in partition order.
+    """
+    if os.path.exists(partition_dir):
+        shutil.rmtree(partition_dir)
+
+    # Read every column as text so that all chunks (and therefore all Parquet files) share one schema
+    for chunk_number, chunk in enumerate(pd.read_csv(raw_data_path, chunksize=chunksize, dtype=str)):
+        chunk = data_processing.clean_raw_data(chunk, dep_var=dep_var)
+        for partition, rows in chunk.groupby(partition_ids(chunk[AnimalID], n_partitions)):
+            path = os.path.join(partition_dir, "partition={:05d}".format(partition))
+            os.makedirs(path, exist_ok=True)
+            rows.to_parquet(os.path.join(path, "chunk-{:05d}.parquet".format(chunk_number)), index=False)
+
+    return sorted(
+        os.path.join(partition_dir, name) for name in os.listdir(partition_dir)
+    ) if os.path.exists(partition_dir) else []
+
+
+@instrumentation.instrument
+def preprocess_partition(
+    partition_path: str,
+    output_dir: str,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType"
+) -> dict:
+    """
+    Runs `data_processing.preprocess_data` on one partition and writes its six outputs as Parquet.
+
+    Duplicates are removed again after reading because `clean_raw_data` only sees one CSV chunk at a time;
+    duplicate rows share an AnimalID, so they always end up in the same partition.
+
+    Parameters:
+    partition_path (str): Directory holding the Parquet files of one partition.
+    output_dir (str): Root directory of the partitioned output.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+
+    Returns:
+    dict: The number of rows written per output name.
+    """
+    partition_name = os.path.basename(os.path.normpath(partition_path)).replace("partition=", "part-")
+    df = read_partitioned_output(partition_path)
+    df = df.drop_duplicates().reset_index(drop=True)
+
+    outputs = data_processing.preprocess_data(df=df, AnimalID=AnimalID, dep_var=dep_var)
+
+    rows_written = {}
+    for name, frame in zip(OUTPUT_NAMES, outputs):
+        path = os.path.join(output_dir, name)
+        os.makedirs(path, exist_ok=True)
+        utils.to_arrow_compatible(frame).to_parquet(os.path.join(path, partition_name + ".parquet"), index=False)
+        rows_written[name] = len(frame)
+
+    return rows_written
+
+
+def preprocess_data_out_of_core(
+    raw_data_path: str,
+    output_dir: str,
+    n_partitions: int = 16,
+    chunksize: int = 250_000,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType",
+    keep_partitions: bool = False
+) -> dict:
+    """
+    Out-of-core version of `data_processing.process_data` with bounded memory.
+
+    Everything `preprocess_data` does per animal (age, sex, breed count, coat split, merge on AnimalID) is local
+    to one AnimalID, so the input is hash-partitioned by AnimalID on disk and each partition is preprocessed
+    independently. Peak memory is that of one CSV chunk or one partition, whichever is larger; raise
+    `n_partitions` for datasets that are much larger than RAM.
+
+    The result is written as partitioned Parquet, one directory per output frame:
+    `<output_dir>/<name>/part-<p>.parquet` for each name in `OUTPUT_NAMES`. Within each part rows are sorted by
+    AnimalID and DateTime as in `preprocess_data`; across parts they are grouped by partition. Object columns
+    that mix strings with other values (the float/str 'Mix' column) are stored as strings.
+
+    Parameters:
+    raw_data_path (str): The full path to the CSV file to be loaded.
+    output_dir (str): Directory the partitioned output is written to. Existing outputs are replaced.
+    n_partitions (int, optional): The number of AnimalID hash partitions. Defaults to 16.
+    chunksize (int, optional): The number of CSV rows read at a time. Defaults to 250,000.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+    keep_partitions (bool, optional): Keep the intermediate raw partitions under `<output_dir>/_partitions`. Defaults to False.
+
+    Returns:
+    dict: The output directory of each frame, keyed by name.
+
+    Example usage:
+    paths = preprocess_data_out_of_core("/path/to/data.csv", "/path/to/processed", n_partitions=64)
+    breed = read_partitioned_output(paths["breed"])
+    """
+    partition_dir = os.path.join(output_dir, "_partitions")
+    for name in OUTPUT_NAMES:
+        if os.path.exists(os.path.join(output_dir, name)):
+            shutil.rmtree(os.path.join(output_dir, name))
+
+    partitions = partition_raw_data(
+        raw_data_path=raw_data_path,
+        partition_dir=partition_dir,
+        n_partitions=n_partitions,
+        chunksize=chunksize,
+        AnimalID=AnimalID,
+        dep_var=dep_var
+    )
+    for partition_path in partitions:
+        preprocess_partition(partition_path, output_dir, AnimalID=AnimalID, dep_var=dep_var)
+
+    if not keep_partitions:
+        shutil.rmtree(partition_dir, ignore_errors=True)
+
+    return {name: os.path.join(output_dir, name) for name in OUTPUT_NAMES}
+
+
+def read_partitioned_output(
+    path: str,
+    columns: list = None
+) -> pd.DataFrame:
+    """
+    Reads one partitioned output frame written by `preprocess_data_out_of_core`.
+
+    The files are read one by one rather than as a single dataset, because a column that is entirely missing in
+    one part is stored with a null type there and would not unify with the other parts.
+
+    Parameters:
+    path (str): The directory of the output frame, e.g. `<output_dir>/breed`.
+    columns (list, optional): Only read these columns. Defaults to None (all columns).
+
+    Returns:
+    pd.DataFrame: The concatenated parts, in partition order.
+    """
+    files = sorted(name for name in os.listdir(path) if name.endswith(".parquet"))
+
+    return pd.concat(
+        [pd.read_parquet(os.path.join(path, name), columns=columns) for name in files],
+        ignore_index=True
+    )
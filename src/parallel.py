@@ -0,0 +1,166 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+import data_processing
+import instrumentation
+import out_of_core
+import utils
+
+
+def write_ipc(
+    df: pd.DataFrame,
+    path: str
+) -> str:
+    """
+    Writes a DataFrame to an Arrow IPC file.
+
+    Object columns that mix strings with other values are written as strings (see `utils.to_arrow_compatible`).
+
+    Parameters:
+    df (pd.DataFrame): The frame to write.
+    path (str): Destination file.
+
+    Returns:
+    str: `path`.
+    """
+    table = pa.Table.from_pandas(utils.to_arrow_compatible(df), preserve_index=False)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    return path
+
+
+def read_ipc(path: str) -> pd.DataFrame:
+    """
+    Reads an Arrow IPC file written by `write_ipc` through a memory map.
+
+    Parameters:
+    path (str): The file to read.
+
+    Returns:
+    pd.DataFrame: The frame stored in the file.
+    """
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def _preprocess_shard(
+    shard_path: str,
+    AnimalID: str,
+    dep_var: str
+) -> list:
+    # Runs in a worker process: read the shard, preprocess it and hand the six outputs back as IPC files
+    outputs = data_processing.preprocess_data(df=read_ipc(shard_path), AnimalID=AnimalID, dep_var=dep_var)
+    base = os.path.splitext(shard_path)[0]
+
+    return [write_ipc(frame, "{}.{}.arrow".format(base, name)) for name, frame in zip(out_of_core.OUTPUT_NAMES, outputs)]
+
+
+@instrumentation.instrument
+def preprocess_data_parallel(
+    df: pd.DataFrame,
+    n_workers: int = None,
+    n_shards: int = None,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType",
+    tmp_dir: str = None
+) -> tuple:
+    """
+    Multi-core version of `data_processing.preprocess_data` over AnimalID hash shards.
+
+    Age, sex, breed, coat and the final merge are all independent per AnimalID, so the loaded frame is split into
+    shards by `out_of_core.partition_ids` and each shard is preprocessed in a `ProcessPoolExecutor` worker. Shards
+    and results are exchanged as memory-mapped Arrow IPC files in a temporary directory rather than pickled
+    DataFrames. The six returned frames are concatenated per output and re-sorted by AnimalID (stable), which
+    restores the row order `preprocess_data` produces.
+
+    Parameters:
+    df (pd.DataFrame): The loaded frame, as returned by `data_processing.load_data`.
+    n_workers (int, optional): Number of worker processes. Defaults to `os.cpu_count()`.
+    n_shards (int, optional): Number of AnimalID shards. Defaults to `n_workers`.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+    tmp_dir (str, optional): Directory for the shard files. Defaults to the system temporary directory.
+
+    Returns:
+    tuple: The same six DataFrames as `data_processing.preprocess_data`. Object columns that mix strings with other
+    values (the float/str 'Mix' column) come back as strings, as in the Parquet output of `out_of_core`.
+
+    Example usage:
+    df = data_processing.load_data("/path/to/data.csv")
+    processed_df, animal_data, breed, breed_mix, coat_color, coat_patterns = preprocess_data_parallel(df, n_workers=8)
+    """
+    n_workers = n_workers or os.cpu_count()
+    n_shards = n_shards or n_workers
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as work_dir:
+        shard_ids = out_of_core.partition_ids(df[AnimalID], n_shards)
+        shard_paths = [
+            write_ipc(shard, os.path.join(work_dir, "shard-{:05d}.arrow".format(shard_number)))
+            for shard_number, shard in df.groupby(shard_ids)
+        ]
+
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(
+                _preprocess_shard,
+                shard_paths,
+                [AnimalID] * len(shard_paths),
+                [dep_var] * len(shard_paths)
+            ))
+
+        outputs = []
+        for position in range(len(out_of_core.OUTPUT_NAMES)):
+            frame = pd.concat([read_ipc(paths[position]) for paths in results], ignore_index=True)
+            frame = frame.sort_values(by=AnimalID, kind="mergesort", ignore_index=True)
+            outputs.append(frame)
+
+    return tuple(outputs)
+
+
+def benchmark_scaling(
+    df: pd.DataFrame,
+    worker_counts: list = (1, 2, 4, 8, 16, 32),
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType"
+) -> pd.DataFrame:
+    """
+    Measures the scaling efficiency of `preprocess_data_parallel` against the sequential `preprocess_data`.
+
+    Parameters:
+    df (pd.DataFrame): The loaded frame, as returned by `data_processing.load_data`.
+    worker_counts (list, optional): Worker counts to measure. Defaults to (1, 2, 4, 8, 16, 32).
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+
+    Returns:
+    pd.DataFrame: One row per worker count with the wall time in seconds, the speedup over the sequential run and
+    the parallel efficiency (speedup / workers). `oversubscribed` flags worker counts above `os.cpu_count()`.
+
+    Example usage:
+    report = benchmark_scaling(data_processing.load_data("/path/to/data.csv"))
+    """
+    start = time.perf_counter()
+    data_processing.preprocess_data(df=df.copy(), AnimalID=AnimalID, dep_var=dep_var)
+    sequential_seconds = time.perf_counter() - start
+
+    rows = [{"workers": 0, "seconds": sequential_seconds, "speedup": 1.0, "efficiency": 1.0, "oversubscribed": False}]
+    for workers in worker_counts:
+        start = time.perf_counter()
+        preprocess_data_parallel(df, n_workers=workers, AnimalID=AnimalID, dep_var=dep_var)
+        seconds = time.perf_counter() - start
+        rows.append({
+            "workers": workers,
+            "seconds": seconds,
+            "speedup": sequential_seconds / seconds,
+            "efficiency": sequential_seconds / seconds / workers,
+            "oversubscribed": workers > os.cpu_count()
+        })
+
+    # workers == 0 is the sequential baseline
+    return pd.DataFrame(rows)
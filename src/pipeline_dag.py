@@ -0,0 +1,442 @@
+import functools
+import hashlib
+import inspect
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import joblib
+import pandas as pd
+
+import data_processing
+import utils
+
+
+# Pools a stage can run on
+EXECUTORS = ("thread", "process")
+# Models trained by `shelter_pipeline`, by stage name suffix
+MODEL_BUILDERS = {
+    "logistic_regression": "logistic_regression_model",
+    "random_forest": "random_forest_model",
+    "xg_boost": "xg_boost"
+}
+
+
+class Stage:
+    """
+    One node of a `PipelineDAG`: a function from named input values to named output values.
+
+    Parameters:
+    name (str): Unique stage name.
+    func (callable): Called with the input values as positional arguments. With several outputs it returns a tuple in the order of `outputs`. Stages on the "process" pool need a picklable (module-level) function.
+    inputs (list): Names of the values the stage reads: outputs of other stages or values passed to `PipelineDAG.run`.
+    outputs (list): Names of the values the stage produces.
+    executor (str, optional): "thread" or "process". Defaults to "thread".
+    cache (bool, optional): Store the outputs in the run's `cache_dir` and skip the stage while they are up to date. Defaults to True.
+    modules (tuple, optional): Names of the modules whose code the stage runs, e.g. ("data_processing",). Their source is part of the cache key (see `version`). Defaults to ().
+    """
+
+    def __init__(self, name, func, inputs, outputs, executor="thread", cache=True, modules=()):
+        if executor not in EXECUTORS:
+            raise ValueError("executor must be one of {}, got {!r}".format(", ".join(EXECUTORS), executor))
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.executor = executor
+        self.cache = cache
+        self.modules = tuple(modules)
+
+    def version(self) -> str:
+        # Changes when the code of the stage function, its bound arguments or the source of `modules` change. The
+        # source of the stage function alone misses edits of the functions it calls.
+        func, bound = self.func, ()
+        if isinstance(func, functools.partial):
+            func, bound = func.func, (func.args, func.keywords)
+        try:
+            code = inspect.getsource(func)
+        except (OSError, TypeError):
+            code = "{}.{}".format(getattr(func, "__module__", ""), getattr(func, "__qualname__", repr(func)))
+
+        return joblib.hash((code, bound, utils.source_version(*self.modules)))
+
+
+def _fingerprint(value) -> str:
+    # Files are versioned by modification time and size instead of their content
+    if isinstance(value, str) and os.path.isfile(value):
+        stat = os.stat(value)
+        return joblib.hash(("file", os.path.abspath(value), stat.st_mtime_ns, stat.st_size))
+
+    return joblib.hash(value)
+
+
+def _call(func, args):
+    # Runs a stage, on any pool, and times it where it runs (perf_counter is system-wide, so process pool workers
+    # report start times comparable with the parent's)
+    start = time.perf_counter()
+    result = func(*args)
+
+    return result, start, time.perf_counter() - start
+
+
+def _load(path):
+    start = time.perf_counter()
+    result = joblib.load(path)
+
+    return result, start, time.perf_counter() - start
+
+
+class PipelineDAG:
+    """
+    Runs stages declared with explicit inputs and outputs, concurrently where they do not depend on each other.
+
+    `run` starts every stage as soon as the stages producing its inputs have finished, on a thread pool or (for
+    stages declared with executor="process") a process pool. With a `cache_dir`, the outputs of each stage are
+    stored under a key built from the stage's code, its bound arguments, the source of the modules it declares and
+    the keys of its inputs (files passed as input values are keyed by modification time and size). A stage whose
+    key is already stored is skipped, and its outputs are only loaded if a stage that does run, or a requested
+    target, needs them.
+
+    After a run, `report` holds the timing of every stage and `critical_path` the chain of dependent stages with
+    the longest total time, which bounds the wall time however many workers are used.
+
+    Example usage:
+    dag = PipelineDAG()
+    dag.add_stage("load", data_processing.load_data, inputs=["raw_data_path"], outputs=["raw"])
+    ...
+    values = dag.run({"raw_data_path": "/path/to/data.csv"}, cache_dir="/path/to/cache", max_workers=4)
+    print(dag.report)
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.report = None
+        self.critical_path = []
+        self.wall_seconds = None
+
+    def add_stage(self, name, func, inputs=(), outputs=None, executor="thread", cache=True, modules=()) -> Stage:
+        """
+        Declares a stage (see `Stage`); `outputs` defaults to [name].
+
+        Raises:
+        - ValueError: If the stage name or one of its outputs is already declared.
+        """
+        stage = Stage(name, func, inputs, [name] if outputs is None else outputs, executor=executor, cache=cache, modules=modules)
+        declared = {output for other in self.stages.values() for output in other.outputs}
+        if name in self.stages or declared & set(stage.outputs):
+            raise ValueError("Stage {!r} or one of its outputs {} is already declared".format(name, stage.outputs))
+        self.stages[name] = stage
+
+        return stage
+
+    def producers(self) -> dict:
+        """Returns the stage producing each declared output."""
+        return {output: stage for stage in self.stages.values() for output in stage.outputs}
+
+    def order(self, values: dict = None) -> list:
+        """
+        Returns the stages in dependency order.
+
+        Raises:
+        - ValueError: If an input is neither produced by a stage nor in `values`, or if the stages form a cycle.
+        """
+        producers = self.producers()
+        values = values or {}
+        for stage in self.stages.values():
+            missing = [name for name in stage.inputs if name not in producers and name not in values]
+            if missing:
+                raise ValueError("Stage {!r} reads {} which no stage produces and no value was given for".format(stage.name, missing))
+
+        order, done, visiting = [], set(), set()
+
+        def visit(stage):
+            if stage.name in done:
+                return
+            if stage.name in visiting:
+                raise ValueError("The stages form a cycle through {!r}".format(stage.name))
+            visiting.add(stage.name)
+            for name in stage.inputs:
+                if name in producers:
+                    visit(producers[name])
+            visiting.discard(stage.name)
+            done.add(stage.name)
+            order.append(stage)
+
+        for stage in self.stages.values():
+            visit(stage)
+
+        return order
+
+    def keys(self, values: dict) -> dict:
+        """Returns the cache key of every stage for the given input values."""
+        producers = self.producers()
+        keys = {}
+        for stage in self.order(values):
+            inputs = [
+                (name, keys[producers[name].name] if name in producers else _fingerprint(values[name]))
+                for name in stage.inputs
+            ]
+            keys[stage.name] = hashlib.sha1(joblib.hash((stage.name, stage.version(), inputs)).encode()).hexdigest()
+
+        return keys
+
+    def _cache_path(self, cache_dir, stage, key):
+        return os.path.join(cache_dir, stage.name, key + ".joblib")
+
+    def _store(self, cache_dir, stage, key, outputs):
+        stage_dir = os.path.join(cache_dir, stage.name)
+        os.makedirs(stage_dir, exist_ok=True)
+        path = self._cache_path(cache_dir, stage, key)
+        tmp_path = "{}.tmp-{}".format(path, os.getpid())
+        joblib.dump(outputs, tmp_path)
+        os.replace(tmp_path, path)
+        # Only the latest outputs of a stage are kept
+        for name in os.listdir(stage_dir):
+            if name != key + ".joblib" and name.endswith(".joblib"):
+                os.remove(os.path.join(stage_dir, name))
+
+    def run(self, values: dict = None, targets: list = None, cache_dir: str = None, max_workers: int = None, process_workers: int = None) -> dict:
+        """
+        Runs the stages needed for `targets`.
+
+        Stage functions must not modify their inputs: on the thread pool they share them with other stages.
+
+        Parameters:
+        values (dict, optional): Input values that no stage produces, e.g. {"raw_data_path": ...}.
+        targets (list, optional): Names of the values to compute. Defaults to None (the outputs that no stage reads).
+        cache_dir (str, optional): Directory of the stage output cache. Defaults to None (no caching).
+        max_workers (int, optional): Threads of the thread pool. Defaults to `os.cpu_count()`.
+        process_workers (int, optional): Workers of the process pool, started only if a stage needs it. Defaults to `os.cpu_count()`.
+
+        Returns:
+        dict: `values`, the targets and every other output computed or loaded on the way, by name.
+
+        Raises:
+        - ValueError: If a target is unknown, an input is missing or the stages form a cycle.
+        """
+        values = dict(values or {})
+        producers = self.producers()
+        order = self.order(values)
+        keys = self.keys(values)
+        if targets is None:
+            read = {name for stage in order for name in stage.inputs}
+            targets = [name for name in producers if name not in read]
+        targets = list(targets)
+        unknown = [name for name in targets if name not in producers and name not in values]
+        if unknown:
+            raise ValueError("Unknown targets {}".format(unknown))
+
+        # Stages the targets depend on
+        needed = set()
+        pending = [producers[name] for name in targets if name in producers]
+        while pending:
+            stage = pending.pop()
+            if stage.name not in needed:
+                needed.add(stage.name)
+                pending.extend(producers[name] for name in stage.inputs if name in producers)
+
+        def cached(stage):
+            return cache_dir is not None and stage.cache and os.path.exists(self._cache_path(cache_dir, stage, keys[stage.name]))
+
+        # A cached stage is loaded only if a stage that runs, or a target, reads one of its outputs
+        to_run = {stage.name for stage in order if stage.name in needed and not cached(stage)}
+        wanted = set(targets) | {name for stage_name in to_run for name in self.stages[stage_name].inputs}
+        to_load = {stage.name for stage in order if stage.name in needed and stage.name not in to_run and wanted & set(stage.outputs)}
+        dependencies = {
+            name: {producers[value].name for value in self.stages[name].inputs if value in producers} if name in to_run else set()
+            for name in to_run | to_load
+        }
+
+        records = {
+            stage.name: {"stage": stage.name, "status": "cached", "executor": None, "start": None, "seconds": None}
+            for stage in order if stage.name in needed
+        }
+        pools = {"thread": ThreadPoolExecutor(max_workers=max_workers)}
+        running = {}
+        finished = set()
+        start = time.perf_counter()
+
+        def submit(name):
+            stage = self.stages[name]
+            if name in to_load:
+                executor, future = "thread", pools["thread"].submit(_load, self._cache_path(cache_dir, stage, keys[name]))
+            else:
+                executor = stage.executor
+                if executor not in pools:
+                    pools[executor] = ProcessPoolExecutor(max_workers=process_workers)
+                future = pools[executor].submit(_call, stage.func, [values[value] for value in stage.inputs])
+            records[name].update(status="loaded" if name in to_load else "ran", executor=executor)
+            running[future] = name
+
+        try:
+            while len(finished) < len(dependencies):
+                for name in dependencies:
+                    if name not in finished and name not in running.values() and dependencies[name] <= finished:
+                        submit(name)
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    stage = self.stages[name]
+                    result, started, seconds = future.result()
+                    # Stored outputs are always a tuple
+                    outputs = result if name in to_load or len(stage.outputs) > 1 else (result,)
+                    values.update(zip(stage.outputs, outputs))
+                    if name in to_run and cache_dir is not None and stage.cache:
+                        self._store(cache_dir, stage, keys[name], tuple(outputs))
+                    records[name].update(start=started - start, seconds=seconds)
+                    finished.add(name)
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        self.wall_seconds = time.perf_counter() - start
+        self.report = pd.DataFrame(list(records.values()), columns=["stage", "status", "executor", "start", "seconds"])
+        self.critical_path = critical_path(self.report, dependencies)
+        self.report["critical"] = self.report["stage"].isin(self.critical_path)
+
+        return values
+
+
+def critical_path(report: pd.DataFrame, dependencies: dict) -> list:
+    """
+    Finds the chain of dependent stages with the longest total time.
+
+    Parameters:
+    report (pd.DataFrame): Stage timings with 'stage' and 'seconds' columns (see `PipelineDAG.report`).
+    dependencies (dict): The stages each stage waited for, by stage name.
+
+    Returns:
+    list: The stage names of the path, in execution order.
+    """
+    seconds = report.set_index("stage")["seconds"].fillna(0).to_dict()
+    finish, previous = {}, {}
+
+    def longest(name):
+        if name not in finish:
+            before = max(dependencies.get(name, ()), key=longest, default=None)
+            previous[name] = before
+            finish[name] = seconds.get(name, 0) + (finish[before] if before is not None else 0)
+        return finish[name]
+
+    if not dependencies:
+        return []
+    name = max(dependencies, key=longest)
+    path = []
+    while name is not None:
+        path.append(name)
+        name = previous[name]
+
+    return path[::-1]
+
+
+# Stages of the shelter pipeline. They copy the frames they modify, because stages share their inputs.
+
+def _age_sex_stage(raw, AnimalID, dep_var):
+    return data_processing.preprocess_age_sex(raw.copy(), AnimalID=AnimalID, dep_var=dep_var)
+
+
+def _breed_stage(animals, AnimalID):
+    _, breed, breed_mix = data_processing.process_breed_data(animals[[AnimalID, "AnimalType", "Breed"]].copy(), AnimalID=AnimalID)
+    return breed, breed_mix
+
+
+def _coat_stage(animals, AnimalID):
+    _, coat_color, coat_patterns = data_processing.process_coat_colors(animals[[AnimalID, "AnimalType", "Color"]].copy(), AnimalID=AnimalID)
+    return coat_color, coat_patterns
+
+
+def _engineer_stage(processed, AnimalID, dep_var, seed):
+    import feature_engineering
+    engineered = feature_engineering.engineer_features(processed.drop(columns=["Breed_broken"]), AnimalID=AnimalID, dep_var=dep_var)
+    # Split before compacting, so that the models validate on the rows an uncompacted split would give them
+    return feature_engineering.compact_split_rows(engineered, seed=seed, AnimalID=AnimalID)
+
+
+def _train_stage(engineered, builder, AnimalID, dep_var, seed):
+    import models
+    kwargs = {"home_dir": os.path.dirname(os.path.dirname(os.path.abspath(__file__)))} if builder == "xg_boost" else {}
+    return getattr(models, builder)(df=engineered.copy(), AnimalID=AnimalID, dep_var=dep_var, seed=seed, **kwargs)
+
+
+def _export_stage(animal_data, breed, breed_mix, coat_color, coat_patterns, output_dir, AnimalID, dep_var, fmt):
+    import tableau_data
+    frames = (animal_data, breed, breed_mix, coat_color, coat_patterns)
+    return tableau_data.export_tableau_data(os.path.join(output_dir, "tableau"), fmt=fmt, frames=frames, AnimalID=AnimalID, dep_var=dep_var)
+
+
+def _cube_stage(processed, breed, breed_mix, coat_color, coat_patterns, AnimalID):
+    import viz
+    return viz.build_cube(processed, breed, breed_mix, coat_color, coat_patterns, AnimalID=AnimalID)
+
+
+def _render_stage(cube, output_dir):
+    import viz
+    # Runs on the process pool: pyplot is not thread safe
+    return viz.render_chart_pack(cube, os.path.join(output_dir, "charts"), n_workers=0)
+
+
+def shelter_pipeline(
+    models: tuple = tuple(MODEL_BUILDERS),
+    export_format: str = "parquet",
+    render: bool = True,
+    seed: int = 0,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType"
+) -> PipelineDAG:
+    """
+    Declares the shelter outcomes pipeline as a `PipelineDAG`.
+
+    Stages (outputs): load (raw), age_sex (animals), animal_data, breed (breed, breed_mix), coat (coat_color,
+    coat_patterns), merge (processed), engineer (engineered), train_<model> (model_<model>), export (export_files),
+    cube and render (chart_files). The breed and coat stages, the model trainings, the export and the chart
+    rendering do not depend on each other and run concurrently. Rendering runs on the process pool; the other
+    stages run on threads.
+
+    Parameters:
+    models (tuple, optional): Models to train, among the keys of `MODEL_BUILDERS`. Defaults to all of them.
+    export_format (str, optional): Format of the Tableau export (see `tableau_data.export_tableau_data`). Defaults to "parquet".
+    render (bool, optional): Declare the cube and render stages. Defaults to True.
+    seed (int, optional): Random state of the train/validation split and the models. Defaults to 0.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+
+    Returns:
+    PipelineDAG: The pipeline; its run needs the values "raw_data_path" and "output_dir".
+
+    Example usage:
+    dag = shelter_pipeline()
+    values = dag.run({"raw_data_path": "/path/to/data.csv", "output_dir": "/path/to/output"}, cache_dir="/path/to/cache")
+    print(dag.report, dag.critical_path)
+    """
+    unknown = [model for model in models if model not in MODEL_BUILDERS]
+    if unknown:
+        raise ValueError("Unknown models {}; choose from {}".format(unknown, ", ".join(MODEL_BUILDERS)))
+
+    # The modules each stage runs code of, so that editing e.g. `data_processing.process_breed_data` reruns the
+    # stages that call it
+    processing = ("data_processing", "row_guard")
+    engineering = ("feature_engineering", "trends", "utils")
+    training = ("models", "feature_store", "utils")
+    exporting = ("tableau_data", "export", "utils")
+    charts = ("viz", "utils")
+
+    dag = PipelineDAG()
+    dag.add_stage("load", functools.partial(data_processing.load_data, dep_var=dep_var), inputs=["raw_data_path"], outputs=["raw"], modules=processing)
+    dag.add_stage("age_sex", functools.partial(_age_sex_stage, AnimalID=AnimalID, dep_var=dep_var), inputs=["raw"], outputs=["animals"], modules=processing)
+    dag.add_stage("animal_data", functools.partial(data_processing.select_animal_data, AnimalID=AnimalID, dep_var=dep_var), inputs=["animals"], modules=processing)
+    dag.add_stage("breed", functools.partial(_breed_stage, AnimalID=AnimalID), inputs=["animals"], outputs=["breed", "breed_mix"], modules=processing)
+    dag.add_stage("coat", functools.partial(_coat_stage, AnimalID=AnimalID), inputs=["animals"], outputs=["coat_color", "coat_patterns"], modules=processing)
+    components = ["animal_data", "breed", "breed_mix", "coat_color", "coat_patterns"]
+    dag.add_stage("merge", functools.partial(data_processing.merge_processed, AnimalID=AnimalID), inputs=components, outputs=["processed"], modules=processing)
+    engineer = functools.partial(_engineer_stage, AnimalID=AnimalID, dep_var=dep_var, seed=seed)
+    dag.add_stage("engineer", engineer, inputs=["processed"], outputs=["engineered"], modules=engineering)
+    for model in models:
+        train = functools.partial(_train_stage, builder=MODEL_BUILDERS[model], AnimalID=AnimalID, dep_var=dep_var, seed=seed)
+        dag.add_stage("train_" + model, train, inputs=["engineered"], outputs=["model_" + model], modules=training)
+    export = functools.partial(_export_stage, AnimalID=AnimalID, dep_var=dep_var, fmt=export_format)
+    dag.add_stage("export", export, inputs=components + ["output_dir"], outputs=["export_files"], cache=False, modules=exporting)
+    if render:
+        dag.add_stage("cube", functools.partial(_cube_stage, AnimalID=AnimalID), inputs=["processed", "breed", "breed_mix", "coat_color", "coat_patterns"], modules=charts)
+        dag.add_stage("render", _render_stage, inputs=["cube", "output_dir"], outputs=["chart_files"], executor="process", cache=False, modules=charts)
+
+    return dag
@@ -0,0 +1,347 @@
+import numpy as np
+import pandas as pd
+import polars as pl
+
+import data_processing
+import instrumentation
+
+
+# Values of the 'Mix' flag before breed counts are applied. pandas keeps them as floats next to the 'Mix' and
+# 'Pure breed' labels; Polars columns hold one type, so they are carried as text and turned back into floats
+# when the frames are handed back as pandas.
+_MIX_FLOATS = {"0.0": 0.0, "1.0": 1.0}
+# Strings `pd.read_csv` treats as missing by default
+_NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA",
+    "NULL", "NaN", "n/a", "nan", "null"
+]
+
+
+def _row_index(frame: pl.LazyFrame, name: str) -> pl.LazyFrame:
+    return frame.with_row_index(name)
+
+
+def _left_join(
+    left: pl.LazyFrame,
+    right: pl.LazyFrame,
+    on: str,
+    left_order: str,
+    right_order: str
+) -> pl.LazyFrame:
+    # pandas left merges keep the left row order and, per left row, the order of the matching right rows
+    return left.join(right, on=on, how="left", nulls_equal=True).sort(
+        [left_order, right_order], nulls_last=True, maintain_order=True
+    )
+
+
+def load_data(
+    raw_data_path: str,
+    dep_var: str = r"OutcomeType"
+) -> pl.LazyFrame:
+    """
+    Lazy Polars equivalent of `data_processing.load_data`.
+
+    Parameters:
+    raw_data_path (str): The full path to the CSV file to be loaded.
+    dep_var (str, optional): The name of the dependent variable column used for prediction. Defaults to 'OutcomeType'.
+
+    Returns:
+    pl.LazyFrame: The cleaned and filtered data, with every column read as text.
+    """
+    data = pl.scan_csv(raw_data_path, infer_schema=False, null_values=_NA_VALUES)
+    renames = {
+        "Outcome Type": "OutcomeType",
+        "Date of Birth": "DateOfBirth",
+        "Outcome Subtype": "OutcomeSubtype",
+        "Animal Type": "AnimalType",
+        "Sex upon Outcome": "SexuponOutcome",
+        "Age upon Outcome": "AgeuponOutcome"
+    }
+    columns = data.collect_schema().names()
+    data = data.rename({old: new for old, new in renames.items() if old in columns})
+
+    return data.unique(keep="first", maintain_order=True).filter(
+        pl.col("AnimalType").is_in(["Cat", "Dog"]) &
+        pl.col(dep_var).is_in(['Adoption', 'Euthanasia', 'Transfer', 'Return to Owner', 'Died'])
+    )
+
+
+def _age_group() -> pl.Expr:
+    # Vectorised `convert_to_days` followed by `group_age`
+    parts = pl.col("AgeuponOutcome").str.replace_all("  ", " ", literal=True).str.extract_groups(
+        r"^(?<number>\d+)\s*(?<unit>years?|months?|weeks?|days?)"
+    )
+    number = parts.struct.field("number").cast(pl.Int64)
+    unit = parts.struct.field("unit")
+    days = (
+        pl.when(unit.str.contains("year", literal=True)).then(number * 365)
+        .when(unit.str.contains("month", literal=True)).then(number * 30)
+        .when(unit.str.contains("week", literal=True)).then(number * 7)
+        .otherwise(number)
+    )
+
+    return (
+        pl.when(days < 7).then(pl.lit("<1 week"))
+        .when(days < 30).then(pl.lit("<1 month"))
+        .when(days < 180).then(pl.lit("<6 months"))
+        .when(days < 365).then(pl.lit("<1 year"))
+        .when(days < 1825).then(pl.lit("<5 years"))
+        .when(days < 3650).then(pl.lit("<10 years"))
+        .when(days < 5475).then(pl.lit("<15 years"))
+        .when(days.is_not_null()).then(pl.lit("15+ years"))
+        .alias("AgeuponOutcome")
+    )
+
+
+def _sex_columns() -> list:
+    sex = (
+        pl.col("SexuponOutcome").str.replace_all("  ", " ", literal=True)
+        .str.replace_all(r"(?i)unknown", "").str.strip_chars()
+    )
+    sex = pl.when(sex == "").then(None).otherwise(sex)
+    parts = sex.str.split(" ")
+
+    return [
+        parts.list.get(0, null_on_oob=True).replace({"Spayed": "Sterilized", "Neutered": "Sterilized"}).alias("Sterilization"),
+        parts.list.get(1, null_on_oob=True).alias("SexuponOutcome")
+    ]
+
+
+def _breed_type() -> pl.Expr:
+    # Same mapping as `data_processing.get_breed_type`, with "Unknown" dog breeds turned into missing values
+    breed_group_map = {breed: group for breed, (group, _) in data_processing.build_breed_group_map().items()}
+    mapped = pl.col("Breed_broken").replace_strict(breed_group_map, default=None)
+
+    return (
+        pl.when(mapped.is_not_null()).then(mapped)
+        .when(pl.col("AnimalType") == "Dog").then(None)
+        .otherwise(pl.col("Breed_broken"))
+        .alias("BreedType")
+    )
+
+
+def process_breed_data(
+    df: pl.LazyFrame,
+    AnimalID: str = r"AnimalID"
+) -> tuple:
+    """
+    Lazy Polars equivalent of `data_processing.process_breed_data`.
+
+    Parameters:
+    df (pl.LazyFrame): Animal data with at least 'Breed', 'AnimalType' and the AnimalID column, plus a `_row` index.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+
+    Returns:
+    tuple: (df, breed, breed_mix) as in `data_processing.process_breed_data`, with 'Mix' flags held as text.
+    """
+    breed = pl.col("Breed")
+    for pattern, repl in data_processing.BREED_REPLACEMENTS:
+        breed = breed.str.replace_all("(?i)" + pattern, repl).str.strip_chars()
+    mix = breed.str.contains("(?i)Mix").cast(pl.Float64).cast(pl.String)
+    breed = breed.str.split(" Mix").list.first().str.replace_all(r"(?i)^Mix$", "")
+    df = df.with_columns(
+        pl.when(breed == "").then(None).otherwise(breed).alias("Breed"),
+        mix.alias("Mix")
+    )
+
+    breed = (
+        df.select(["_row", AnimalID, "AnimalType", "Breed", "Mix"])
+        .with_columns(pl.col("Breed").str.split("/").alias("Breed_broken"))
+        .explode("Breed_broken")
+        .drop("_row")
+        .unique(keep="first", maintain_order=True)
+    )
+    breed_list = breed.select([AnimalID, "Breed_broken"])
+    breed = breed.with_columns(_breed_type()).drop("AnimalType").unique(keep="first", maintain_order=True)
+
+    breed_freq = breed_list.group_by(AnimalID).agg(pl.len().alias("count"))
+    df = df.join(breed_freq, on=AnimalID, how="left", nulls_equal=True).sort("_row").with_columns(
+        pl.when(pl.col("count") > 1).then(pl.lit("Mix"))
+        .otherwise(pl.col("Mix").fill_null("Pure breed"))
+        .alias("Mix")
+    ).drop("count")
+
+    breed = breed.drop("Mix")
+    breed_mix = df.select([AnimalID, "Breed", "Mix"]).unique(keep="first", maintain_order=True)
+
+    return df, breed, breed_mix
+
+
+def _replace_colors() -> pl.Expr:
+    # Vectorised `data_processing.replace_colors`: the first matching rule wins
+    color = pl.col("Color")
+    expression = (
+        pl.when((pl.col("AnimalType") == "Dog") & color.str.contains("Orange", literal=True))
+        .then(color.str.replace_all("Orange", "Red", literal=True))
+        .when((pl.col("AnimalType") == "Cat") & color.str.contains("Yellow", literal=True))
+        .then(color.str.replace_all("Yellow", "Orange", literal=True))
+        .when((pl.col("AnimalType") == "Cat") & color.str.contains("Tricolor", literal=True))
+        .then(color.str.replace_all("Tricolor", "Calico", literal=True))
+    )
+    for old, new in data_processing.COLOR_REPLACEMENTS.items():
+        expression = expression.when(color.str.contains(old, literal=True)).then(color.str.replace_all(old, new, literal=True))
+
+    return expression.otherwise(color).alias("Color")
+
+
+def process_coat_colors(
+    df: pl.LazyFrame,
+    AnimalID: str = r"AnimalID"
+) -> tuple:
+    """
+    Lazy Polars equivalent of `data_processing.process_coat_colors`.
+
+    Parameters:
+    df (pl.LazyFrame): Animal data with at least 'Color', 'AnimalType' and the AnimalID column, plus a `_row` index.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+
+    Returns:
+    tuple: (df, coat_color, coat_patterns) as in `data_processing.process_coat_colors`.
+    """
+    df = df.with_columns(pl.col("Color").str.replace_all("  ", " ", literal=True).str.strip_chars())
+
+    coat_patterns_regex = "(?i)" + "|".join(data_processing.COAT_PATTERNS)
+    coatcolor = df.with_columns(_replace_colors()).with_columns(
+        # `extract_coat_pattern` only ever checks the first pattern
+        pl.when(pl.col("Color").str.contains("(?i)" + data_processing.COAT_PATTERNS[0]))
+        .then(pl.lit(data_processing.COAT_PATTERNS[0])).otherwise(pl.lit("")).alias("CoatPattern")
+    ).with_columns(pl.col("Color").str.replace_all(coat_patterns_regex, "").str.strip_chars())
+
+    coat_color = _left_join(
+        df.select(["_row", AnimalID, "Color"]),
+        coatcolor.select([AnimalID, pl.col("Color").alias("CoatColor"), pl.col("_row").alias("_right_row")]),
+        on=AnimalID,
+        left_order="_row",
+        right_order="_right_row"
+    ).select([AnimalID, "Color", "CoatColor"]).unique(keep="first", maintain_order=True).with_columns(
+        pl.col("CoatColor").str.replace_all(" /", "/", literal=True).str.replace_all("/ ", "/", literal=True)
+        .str.strip_chars().str.replace_all(" ", "/", literal=True)
+    )
+
+    coat_patterns = coatcolor.select([AnimalID, "Color", "CoatPattern"]).unique(keep="first", maintain_order=True)
+
+    coat_color = (
+        coat_color.with_columns(pl.col("CoatColor").str.split("/"))
+        .explode("CoatColor")
+        .unique(keep="first", maintain_order=True)
+        .with_columns(
+            pl.when(pl.col("CoatColor").is_in(["Unknown", ""])).then(None).otherwise(pl.col("CoatColor")).alias("CoatColor")
+        )
+    )
+
+    return df, coat_color, coat_patterns
+
+
+def preprocess_data(
+    df: pl.LazyFrame,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType"
+) -> list:
+    """
+    Lazy Polars equivalent of `data_processing.preprocess_data`.
+
+    Nothing is computed here; the six returned LazyFrames share one query plan, so collecting them together with
+    `pl.collect_all` runs the chained string replaces, explodes and joins once with multi-threaded kernels and
+    projection pushdown.
+
+    Parameters:
+    df (pl.LazyFrame): The loaded data, e.g. from `load_data`.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+
+    Returns:
+    list: Six LazyFrames in the order of `data_processing.preprocess_data`.
+    """
+    columns = df.collect_schema().names()
+    if dep_var in columns:
+        df = df.filter(pl.col(dep_var).is_not_null()).with_columns(
+            pl.col(dep_var).str.replace(
+                r"(?i)^(return\s*to\s*owner|Return\s*To\s*Owner|RETURN\s+TO\s+OWNER|return_to_owner)$", "Return_to_owner"
+            )
+        )
+
+    df = df.sort([AnimalID, "DateTime"], nulls_last=True, maintain_order=True).with_row_index("_row")
+    df = df.with_columns(_age_group(), *_sex_columns())
+
+    df, breed, breed_mix = process_breed_data(df, AnimalID=AnimalID)
+    df, coat_color, coat_patterns = process_coat_colors(df, AnimalID=AnimalID)
+
+    animal_columns = [AnimalID, dep_var, 'Name', 'DateTime', 'AnimalType', 'AgeuponOutcome', 'SexuponOutcome', 'Sterilization']
+    animal_data = df.select([column for column in animal_columns if column in columns or column == 'Sterilization']).unique(keep="first", maintain_order=True)
+
+    # Same nesting as the pandas merge tree; row numbers reproduce pandas' output order
+    breed_all = _left_join(
+        _row_index(breed.drop("Breed"), "_breed_row"),
+        _row_index(breed_mix.drop("Breed"), "_breed_mix_row"),
+        on=AnimalID,
+        left_order="_breed_row",
+        right_order="_breed_mix_row"
+    )
+    coat_all = _left_join(
+        _row_index(coat_color.drop("Color"), "_coat_row"),
+        _row_index(coat_patterns.drop("Color"), "_pattern_row"),
+        on=AnimalID,
+        left_order="_coat_row",
+        right_order="_pattern_row"
+    )
+    processed = (
+        _row_index(animal_data, "_animal_row")
+        .join(breed_all.join(coat_all, on=AnimalID, how="full", coalesce=True, nulls_equal=True), on=AnimalID, how="left", nulls_equal=True)
+        .sort(["_animal_row", "_breed_row", "_breed_mix_row", "_coat_row", "_pattern_row"], nulls_last=True, maintain_order=True)
+        .drop(["_animal_row", "_breed_row", "_breed_mix_row", "_coat_row", "_pattern_row"])
+    )
+
+    return [processed, animal_data, breed, breed_mix, coat_color, coat_patterns]
+
+
+def to_pandas(frame: pl.DataFrame) -> pd.DataFrame:
+    """
+    Converts a collected frame to pandas with the same column types `data_processing` produces.
+
+    Text columns come back as object columns with NaN for missing values, and the text-encoded 'Mix' flags are
+    turned back into floats.
+
+    Parameters:
+    frame (pl.DataFrame): A collected output frame.
+
+    Returns:
+    pd.DataFrame: The pandas frame.
+    """
+    df = frame.to_pandas()
+    # Only text columns that actually hold nulls need their None values replaced
+    null_counts = frame.null_count().row(0, named=True)
+    for column in df.columns[df.dtypes == object]:
+        if null_counts[column]:
+            df[column] = df[column].fillna(np.nan)
+    if "Mix" in df.columns:
+        mix = df["Mix"].to_numpy(dtype=object, copy=True)
+        for text, value in _MIX_FLOATS.items():
+            mix[mix == text] = value
+        df["Mix"] = mix
+
+    return df
+
+
+@instrumentation.instrument
+def process_data(
+    raw_data_path: str,
+    AnimalID: str = "AnimalID",
+    dep_var: str = "OutcomeType"
+) -> tuple:
+    """
+    Polars version of `data_processing.process_data`.
+
+    Loads and preprocesses the data as a single lazy query and returns the same six pandas DataFrames as the
+    pandas backend.
+
+    Parameters:
+    raw_data_path (str): The full path to the CSV file to be loaded.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+
+    Returns:
+    tuple: The six DataFrames returned by `data_processing.preprocess_data`.
+    """
+    outputs = preprocess_data(load_data(raw_data_path, dep_var=dep_var), AnimalID=AnimalID, dep_var=dep_var)
+
+    return tuple(to_pandas(frame) for frame in pl.collect_all(outputs))
@@ -0,0 +1,267 @@
+import collections
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+# Memory budget (in bytes) for the projected output of a single merge or explode. None disables the check
+# but fan-out ratios are still recorded.
+_memory_budget = float(os.environ["SHELTER_MEMORY_BUDGET_MB"]) * 1024 ** 2 if os.environ.get("SHELTER_MEMORY_BUDGET_MB") else None
+# What to do when the projected size exceeds the budget: "raise", "warn" or "chunk"
+_on_exceed = os.environ.get("SHELTER_ON_EXCEED", "raise")
+# Most recent fan-out records kept; older ones are dropped so that a long-running process does not grow without limit
+MAX_RECORDS = 10_000
+_fanout_records = collections.deque(maxlen=MAX_RECORDS)
+
+# Number of rows sampled to estimate the in-memory width of a row
+_SAMPLE_ROWS = 1000
+
+
+class RowExplosionError(MemoryError):
+    """
+    Raised when a merge or explode is projected to exceed the configured memory budget.
+    """
+
+
+def configure(memory_budget_mb: float = None, on_exceed: str = "raise") -> None:
+    """
+    Sets the memory budget and the action taken when a merge or explode is projected to exceed it.
+
+    Parameters:
+    memory_budget_mb (float, optional): Budget in megabytes for the projected output of a single merge or explode. None disables the check. Defaults to None.
+    on_exceed (str, optional): One of "raise" (abort with `RowExplosionError`), "warn" (log and continue) or "chunk" (merge in chunks that each fit the budget). Defaults to "raise".
+
+    Raises:
+    - ValueError: If `on_exceed` is not one of the supported actions.
+    """
+    global _memory_budget, _on_exceed
+    if on_exceed not in ("raise", "warn", "chunk"):
+        raise ValueError("on_exceed must be one of 'raise', 'warn' or 'chunk', got {!r}".format(on_exceed))
+    _memory_budget = None if memory_budget_mb is None else memory_budget_mb * 1024 ** 2
+    _on_exceed = on_exceed
+
+
+def reset() -> None:
+    """
+    Clears the recorded fan-out ratios. Only the last `MAX_RECORDS` records are kept in any case.
+    """
+    _fanout_records.clear()
+
+
+def fanout_report() -> pd.DataFrame:
+    """
+    Returns the fan-out ratios recorded so far (the last `MAX_RECORDS`).
+
+    Returns:
+    pd.DataFrame: One row per guarded merge/explode with the stage name, input rows, projected output rows,
+    fan-out ratio (projected rows / left input rows), projected size in MB and the strategy that was used.
+    """
+    return pd.DataFrame(
+        list(_fanout_records),
+        columns=["stage", "operation", "rows_in", "rows_right", "projected_rows", "fanout", "projected_mb", "strategy"]
+    )
+
+
+def estimate_row_bytes(df) -> float:
+    """
+    Estimates the in-memory width of one row from a sample of the first rows, including Python string payloads.
+
+    Parameters:
+    df (pd.DataFrame or pd.Series): The frame to inspect.
+
+    Returns:
+    float: The estimated number of bytes per row (0 for empty frames).
+    """
+    if len(df) == 0:
+        return 0.0
+    sample = df.iloc[:_SAMPLE_ROWS]
+    usage = sample.memory_usage(deep=True, index=False)
+    usage = usage.sum() if isinstance(usage, pd.Series) else usage
+
+    return float(usage) / len(sample)
+
+
+def estimate_join_rows(
+    left_keys: pd.Series,
+    right_keys: pd.Series,
+    how: str = "inner"
+) -> int:
+    """
+    Estimates the number of rows a join will produce from the per-key counts of both sides.
+
+    The estimate is exact for pandas merge semantics: every left row with key k is paired with every right
+    row with key k, unmatched rows are kept on the preserved side(s), and missing keys match each other.
+
+    Parameters:
+    left_keys (pd.Series): Join keys of the left frame, one value per row.
+    right_keys (pd.Series): Join keys of the right frame, one value per row.
+    how (str, optional): The join type: "inner", "left", "right" or "outer". Defaults to "inner".
+
+    Returns:
+    int: The projected number of output rows.
+    """
+    left_counts, right_counts = left_keys.value_counts(dropna=False).align(
+        right_keys.value_counts(dropna=False), join="outer", fill_value=0
+    )
+    left_counts = left_counts.to_numpy(dtype=np.int64)
+    right_counts = right_counts.to_numpy(dtype=np.int64)
+
+    rows = left_counts * right_counts
+    if how in ("left", "outer"):
+        rows = rows + np.where(right_counts == 0, left_counts, 0)
+    if how in ("right", "outer"):
+        rows = rows + np.where(left_counts == 0, right_counts, 0)
+
+    return int(rows.sum())
+
+
+def estimate_explode_rows(series: pd.Series) -> int:
+    """
+    Estimates the number of rows `Series.explode` will produce.
+
+    Parameters:
+    series (pd.Series): A Series of lists (missing values and empty lists each produce one row).
+
+    Returns:
+    int: The projected number of output rows.
+    """
+    lengths = series.str.len().fillna(1).to_numpy()
+
+    return int(np.maximum(lengths, 1).sum())
+
+
+def _join_keys(df, on, use_index) -> pd.Series:
+    if use_index:
+        return pd.Series(df.index, copy=False)
+    if isinstance(on, (list, tuple)):
+        if len(on) == 1:
+            return df[on[0]].reset_index(drop=True)
+        return pd.Series(pd.util.hash_pandas_object(df[list(on)], index=False).to_numpy())
+    return df[on].reset_index(drop=True)
+
+
+def _record(stage, operation, rows_in, rows_right, projected_rows, projected_bytes, strategy):
+    _fanout_records.append({
+        "stage": stage,
+        "operation": operation,
+        "rows_in": rows_in,
+        "rows_right": rows_right,
+        "projected_rows": projected_rows,
+        "fanout": projected_rows / rows_in if rows_in else np.nan,
+        "projected_mb": projected_bytes / 1024 ** 2,
+        "strategy": strategy
+    })
+    logger.debug(
+        "stage=%s operation=%s rows_in=%s projected_rows=%s fanout=%.2f strategy=%s",
+        stage, operation, rows_in, projected_rows, projected_rows / rows_in if rows_in else float("nan"), strategy
+    )
+
+
+def _exceeds_budget(stage, projected_rows, projected_bytes) -> bool:
+    if _memory_budget is None or projected_bytes <= _memory_budget:
+        return False
+    message = "{} is projected to produce {:,} rows (~{:,.0f} MB), above the memory budget of {:,.0f} MB".format(
+        stage, projected_rows, projected_bytes / 1024 ** 2, _memory_budget / 1024 ** 2
+    )
+    if _on_exceed == "raise":
+        raise RowExplosionError(message)
+    logger.warning(message)
+    return True
+
+
+def _chunk_bounds(row_fanout: np.ndarray, rows_per_chunk: int) -> list:
+    # Split consecutive rows so that each chunk projects at most `rows_per_chunk` output rows
+    cumulative = np.cumsum(row_fanout)
+    bounds = [0]
+    while bounds[-1] < len(row_fanout):
+        start_total = cumulative[bounds[-1] - 1] if bounds[-1] > 0 else 0
+        end = int(np.searchsorted(cumulative, start_total + rows_per_chunk, side="right"))
+        bounds.append(max(end, bounds[-1] + 1))
+
+    return bounds
+
+
+def guarded_merge(
+    left: pd.DataFrame,
+    right: pd.DataFrame,
+    stage: str = "merge",
+    **merge_kwargs
+) -> pd.DataFrame:
+    """
+    `pd.merge` with an up-front cardinality estimate, fan-out recording and a memory budget check.
+
+    The projected number of output rows is computed from the per-key counts of both sides before merging.
+    If the projected size exceeds the configured budget the merge is aborted with `RowExplosionError`,
+    logged and run as usual, or run in chunks of consecutive left rows that each fit the budget. Chunking
+    bounds the transient working memory of the join itself and is only used for "left" joins, whose chunk
+    results concatenate to the same row order a single merge would produce; other joins that exceed the
+    budget under "chunk" are logged and merged as usual.
+
+    Parameters:
+    left (pd.DataFrame): The left frame.
+    right (pd.DataFrame): The right frame.
+    stage (str, optional): Name under which the fan-out is recorded. Defaults to "merge".
+    **merge_kwargs: Keyword arguments forwarded to `pd.merge` (`on`, `left_on`, `right_on`, `left_index`, `right_index`, `how`).
+
+    Returns:
+    pd.DataFrame: The merged frame, identical to `pd.merge(left, right, **merge_kwargs)`.
+
+    Raises:
+    - RowExplosionError: If the projected size exceeds the memory budget and the configured action is "raise".
+    """
+    how = merge_kwargs.get("how", "inner")
+    left_on = merge_kwargs.get("left_on", merge_kwargs.get("on"))
+    right_on = merge_kwargs.get("right_on", merge_kwargs.get("on"))
+    left_keys = _join_keys(left, left_on, merge_kwargs.get("left_index", False))
+    right_keys = _join_keys(right, right_on, merge_kwargs.get("right_index", False))
+
+    projected_rows = estimate_join_rows(left_keys, right_keys, how=how)
+    projected_bytes = projected_rows * (estimate_row_bytes(left) + estimate_row_bytes(right))
+
+    exceeds_budget = _exceeds_budget(stage, projected_rows, projected_bytes)
+    if not exceeds_budget or _on_exceed != "chunk" or how != "left" or merge_kwargs.get("sort"):
+        _record(stage, "merge", len(left), len(right), projected_rows, projected_bytes, "merge")
+        return pd.merge(left=left, right=right, **merge_kwargs)
+
+    # Left merges keep the left row order, so chunk on consecutive left rows
+    rows_per_chunk = max(int(projected_rows * _memory_budget / projected_bytes), 1)
+    row_fanout = left_keys.map(right_keys.value_counts(dropna=False)).fillna(0).to_numpy(dtype=np.int64)
+    row_fanout = np.maximum(row_fanout, 1)
+    bounds = _chunk_bounds(row_fanout, rows_per_chunk)
+    chunks = [pd.merge(left=left.iloc[start:end], right=right, **merge_kwargs) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    _record(stage, "merge", len(left), len(right), projected_rows, projected_bytes, "chunked ({} chunks)".format(len(chunks)))
+    merged = pd.concat(chunks, ignore_index=not (merge_kwargs.get("left_index") or merge_kwargs.get("right_index")))
+
+    return merged
+
+
+def guarded_explode(
+    series: pd.Series,
+    stage: str = "explode"
+) -> pd.Series:
+    """
+    `Series.explode` with an up-front row estimate, fan-out recording and a memory budget check.
+
+    Parameters:
+    series (pd.Series): A Series of lists, e.g. the output of `Series.str.split('/')`.
+    stage (str, optional): Name under which the fan-out is recorded. Defaults to "explode".
+
+    Returns:
+    pd.Series: The exploded Series, identical to `series.explode()`.
+
+    Raises:
+    - RowExplosionError: If the projected size exceeds the memory budget and the configured action is "raise".
+    """
+    projected_rows = estimate_explode_rows(series)
+    # Exploded rows hold one element of each list, so size them from the elements rather than the lists
+    projected_bytes = projected_rows * estimate_row_bytes(series.iloc[:_SAMPLE_ROWS].explode())
+    _exceeds_budget(stage, projected_rows, projected_bytes)
+    _record(stage, "explode", len(series), None, projected_rows, projected_bytes, "explode")
+
+    return series.explode()
+
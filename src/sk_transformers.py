@@ -0,0 +1,267 @@
+import re
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+
+import data_processing
+import utils
+
+
+class _LookupTransformer(BaseEstimator, TransformerMixin, ABC):
+    """
+    Base class of the row-wise preprocessing stages.
+
+    The output of a stage depends only on a few key columns, which take few distinct values. `fit` computes the
+    output of every distinct training key once (`table_`, indexed by the 64-bit hash of the key values);
+    `transform` looks the rows up by hash and only computes keys that were not seen in `fit`. Subclasses define
+    the key and output columns and `_lookup`.
+    """
+
+    # Input columns the output depends on, columns replaced by the output, and output columns
+    keys = []
+    replaces = []
+    outputs = []
+
+    @abstractmethod
+    def _lookup(self, keys: pd.DataFrame) -> pd.DataFrame:
+        """
+        Computes the output columns of distinct key rows.
+
+        Parameters:
+        keys (pd.DataFrame): Distinct rows of the key columns.
+
+        Returns:
+        pd.DataFrame: At least the output columns, with the index of `keys`.
+        """
+
+    def _hashes(self, keys: pd.DataFrame) -> np.ndarray:
+        return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+    def _table(self, keys: pd.DataFrame, hashes: np.ndarray) -> pd.DataFrame:
+        first = utils.first_occurrences(pd.factorize(hashes)[0])
+        table = self._lookup(keys[first].copy())[self.outputs]
+        table.index = pd.Index(hashes[first], name="key_hash")
+
+        return table
+
+    def fit(self, X: pd.DataFrame, y=None):
+        """
+        Computes the output of each distinct key of `X`.
+
+        Parameters:
+        X (pd.DataFrame): Raw outcome rows with the key columns.
+        y: Ignored.
+
+        Returns:
+        self
+        """
+        keys = X[self.keys]
+        self.table_ = self._table(keys, self._hashes(keys))
+
+        return self
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        """
+        Adds the output columns to a copy of `X` and drops the replaced columns.
+
+        Parameters:
+        X (pd.DataFrame): Raw outcome rows with the key columns.
+
+        Returns:
+        pd.DataFrame: The transformed rows, with the index of `X`.
+        """
+        keys = X[self.keys]
+        hashes = self._hashes(keys)
+        table = self.table_
+        unseen = ~np.isin(hashes, table.index.to_numpy())
+        if unseen.any():
+            table = pd.concat([table, self._table(keys[unseen], hashes[unseen])])
+
+        values = table.reindex(hashes)
+        data = X.drop(columns=self.replaces)
+        for column in self.outputs:
+            data[column] = values[column].to_numpy()
+
+        return data
+
+
+class AgeBucketer(_LookupTransformer):
+    """
+    Replaces 'AgeuponOutcome' ("2 years", "3 weeks", ...) with its age group (see `data_processing.group_age`).
+    """
+
+    keys = ["AgeuponOutcome"]
+    replaces = ["AgeuponOutcome"]
+    outputs = ["AgeuponOutcome"]
+
+    def _lookup(self, keys: pd.DataFrame) -> pd.DataFrame:
+        days = keys["AgeuponOutcome"].str.replace('  ', ' ').map(data_processing.convert_to_days)
+
+        return pd.DataFrame({"AgeuponOutcome": days.map(data_processing.group_age)})
+
+
+class SexSterilizationSplitter(_LookupTransformer):
+    """
+    Splits 'SexuponOutcome' ("Neutered Male", ...) into 'SexuponOutcome' ("Male") and 'Sterilization'
+    ("Sterilized" or "Intact"), as `data_processing.preprocess_data` does.
+    """
+
+    keys = ["SexuponOutcome"]
+    replaces = ["SexuponOutcome"]
+    outputs = ["SexuponOutcome", "Sterilization"]
+
+    def _lookup(self, keys: pd.DataFrame) -> pd.DataFrame:
+        sex = keys["SexuponOutcome"].str.replace('  ', ' ')
+        sex = sex.str.replace(r'unknown', '', regex=True, flags=re.IGNORECASE).str.strip().replace('', np.nan)
+        sterilization = sex.str.split(' ').str[0].replace({'Spayed': 'Sterilized', 'Neutered': 'Sterilized'})
+
+        return pd.DataFrame({"SexuponOutcome": sex.str.split(' ').str[1], "Sterilization": sterilization})
+
+
+class BreedTyper(_LookupTransformer):
+    """
+    Replaces 'Breed' with 'BreedType' and 'Mix' ("Mix" or "Pure breed").
+
+    Unlike `data_processing.process_breed_data`, which creates one row per listed breed, the rows are kept: the
+    breed type is the type of the first listed breed, and animals with several listed breeds are mixes. The breed
+    group lookup (`data_processing.build_breed_group_map`) is built once in `fit`.
+    """
+
+    keys = ["AnimalType", "Breed"]
+    replaces = ["Breed"]
+    outputs = ["BreedType", "Mix"]
+
+    def fit(self, X: pd.DataFrame, y=None):
+        self.breed_groups_ = data_processing.build_breed_group_map()
+
+        return super().fit(X, y)
+
+    def _lookup(self, keys: pd.DataFrame) -> pd.DataFrame:
+        keys = data_processing.standardize_breeds(keys)
+        breeds = keys["Breed"].str.split('/')
+        first_breed = breeds.str[0]
+
+        groups = first_breed.map(lambda breed: self.breed_groups_.get(breed, (np.nan,))[0])
+        # Cats without a group keep their breed name, dogs without one are unknown
+        breed_type = groups.where(groups.notna() | (keys["AnimalType"] == "Dog"), first_breed)
+        mix = (keys["Mix"] == 1) | (breeds.str.len() > 1)
+
+        return pd.DataFrame({"BreedType": breed_type, "Mix": np.where(mix, "Mix", "Pure breed")})
+
+
+class CoatNormalizer(_LookupTransformer):
+    """
+    Replaces 'Color' with the standardized 'CoatColor' and 'CoatPattern' (see `data_processing.standardize_coat_colors`).
+
+    The rows are kept: animals with several colors get the first one.
+    """
+
+    keys = ["AnimalType", "Color"]
+    replaces = ["Color"]
+    outputs = ["CoatColor", "CoatPattern"]
+
+    def _lookup(self, keys: pd.DataFrame) -> pd.DataFrame:
+        known = keys["Color"].notna()
+        coat_color = pd.Series(np.nan, index=keys.index, dtype=object)
+        coat_pattern = pd.Series(np.nan, index=keys.index, dtype=object)
+        if known.any():
+            _, coatcolor = data_processing.standardize_coat_colors(keys[known].copy())
+            colors = coatcolor["Color"].str.replace(r' /', r'/').str.replace(r'/ ', r'/').str.strip().str.replace(r' ', r'/')
+            coat_color[known] = colors.str.split('/').str[0].replace({"Unknown": np.nan, "": np.nan})
+            coat_pattern[known] = coatcolor["CoatPattern"].replace("", np.nan)
+
+        return pd.DataFrame({"CoatColor": coat_color, "CoatPattern": coat_pattern})
+
+
+class OneHot(BaseEstimator, TransformerMixin):
+    """
+    One-hot encodes categorical columns with the vocabulary seen in `fit`.
+
+    The output always has the same columns: values not seen in `fit` (and missing values) are all zeros.
+    Numeric columns are passed through and other text columns (e.g. 'Name', 'DateTime') are dropped.
+
+    Parameters:
+    columns (list, optional): The columns to encode. Defaults to the categorical columns of `engineer_features`.
+    """
+
+    def __init__(self, columns: list = None):
+        self.columns = columns
+
+    def _columns(self) -> list:
+        if self.columns is not None:
+            return list(self.columns)
+
+        return ["AnimalType", "SexuponOutcome", "AgeuponOutcome", "Sterilization", "BreedType", "Mix", "CoatColor", "CoatPattern"]
+
+    def fit(self, X: pd.DataFrame, y=None):
+        """
+        Freezes the vocabulary of each column.
+
+        Parameters:
+        X (pd.DataFrame): The rows to learn the values from.
+        y: Ignored.
+
+        Returns:
+        self
+        """
+        self.vocabulary_ = {column: sorted(X[column].dropna().astype(str).unique()) for column in self._columns()}
+
+        return self
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        """
+        Encodes `X` with the frozen vocabulary.
+
+        Parameters:
+        X (pd.DataFrame): Rows with the encoded columns.
+
+        Returns:
+        pd.DataFrame: The numeric columns of `X` followed by one 0/1 column per (column, value) of the vocabulary.
+        """
+        numeric = X.drop(columns=self._columns()).select_dtypes(include="number")
+        dummies = [
+            pd.get_dummies(
+                pd.Categorical(X[column].where(X[column].isna(), X[column].astype(str)), categories=vocabulary),
+                prefix=column, prefix_sep="_", dtype=int
+            ).set_index(X.index)
+            for column, vocabulary in self.vocabulary_.items()
+        ]
+
+        return pd.concat([numeric] + dummies, axis=1)
+
+
+def preprocessing_pipeline(model=None, memory=None) -> Pipeline:
+    """
+    Builds the preprocessing stages, and optionally a model, as a scikit-learn Pipeline.
+
+    With a model, the stages are nested in one "preprocess" step, so with `memory` joblib caches the fitted stages
+    and their output once per input (keyed on the stage parameters and the input rows) and a grid search over the
+    model's parameters preprocesses each cross-validation fold once instead of once per candidate. Caching costs a
+    hash and a disk write of the raw rows, so it pays off for expensive stages; the lookup stages here are cheaper
+    than that, because their work is done once per distinct value in `fit`.
+
+    Parameters:
+    model (estimator, optional): Final estimator, e.g. `LogisticRegression(max_iter=1000)`. Defaults to None (preprocessing only).
+    memory (str or joblib.Memory, optional): Cache directory or `joblib.Memory`, used with a model. Defaults to None (no caching).
+
+    Returns:
+    Pipeline: The steps "age", "sex", "breed", "coat" and "onehot" or, with a model, the steps "preprocess" (those stages) and "model". Input rows are raw outcome rows (as returned by `data_processing.load_data`) without the target column.
+
+    Example usage:
+    search = GridSearchCV(preprocessing_pipeline(LogisticRegression(max_iter=1000), memory="/tmp/pipeline_cache"), {"model__C": [0.1, 1, 10]})
+    search.fit(raw_df.drop(columns=["OutcomeType"]), raw_df["OutcomeType"])
+    """
+    stages = Pipeline([
+        ("age", AgeBucketer()),
+        ("sex", SexSterilizationSplitter()),
+        ("breed", BreedTyper()),
+        ("coat", CoatNormalizer()),
+        ("onehot", OneHot())
+    ])
+    if model is None:
+        return stages
+
+    return Pipeline([("preprocess", stages), ("model", model)], memory=memory)
@@ -0,0 +1,127 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+# Modules the scoring entry point is imported before, as a notebook or service importing it already has them
+BASELINE_MODULES = ("numpy", "pandas")
+# Packages that take hundreds of milliseconds or more to import and are only needed to train, plot or export
+HEAVY_MODULES = ("xgboost", "sklearn", "scipy", "joblib", "torch", "matplotlib", "seaborn", "polars", "duckdb", "tableauhyperapi")
+# Import time budget of the scoring entry point, on top of the baseline, in milliseconds
+BUDGET_MS = 300
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+_IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def import_times(module: str, baseline: tuple = BASELINE_MODULES, python: str = sys.executable) -> pd.DataFrame:
+    """
+    Imports `module` after `baseline` in a fresh interpreter with `python -X importtime` and parses the report.
+
+    Parameters:
+    module (str): The module to import, e.g. "model_prediction". The src directory is on the path.
+    baseline (tuple, optional): Modules imported first, so their time is not counted for `module`. Defaults to `BASELINE_MODULES`.
+    python (str, optional): The interpreter. Defaults to the current one.
+
+    Returns:
+    pd.DataFrame: One row per imported module, in import order, with the columns 'name', 'depth' (0 for modules imported by the command itself), 'self_ms' and 'cumulative_ms'.
+
+    Raises:
+    RuntimeError: If the import fails.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIR, os.environ.get("PYTHONPATH")])))
+    statements = ["import {}".format(name) for name in list(baseline) + [module]]
+    result = subprocess.run([python, "-X", "importtime", "-c", "; ".join(statements)], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError("Importing {} failed:\n{}".format(module, result.stderr[-2000:]))
+
+    rows = [
+        {"name": match.group(4), "depth": len(match.group(3)) // 2, "self_ms": int(match.group(1)) / 1000, "cumulative_ms": int(match.group(2)) / 1000}
+        for match in map(_IMPORT_TIME_LINE.match, result.stderr.splitlines()) if match
+    ]
+
+    return pd.DataFrame(rows, columns=["name", "depth", "self_ms", "cumulative_ms"])
+
+
+def heavy_modules(times: pd.DataFrame) -> list:
+    """
+    Returns the packages of `HEAVY_MODULES` that were imported, given the output of `import_times`.
+    """
+    packages = set(times["name"].str.split(".").str[0])
+
+    return [name for name in HEAVY_MODULES if name in packages]
+
+
+def benchmark_startup(module: str = "model_prediction", repeats: int = 5, baseline: tuple = BASELINE_MODULES, budget_ms: float = BUDGET_MS) -> dict:
+    """
+    Measures the import time of `module` on top of `baseline`, as the median over fresh interpreters.
+
+    The time of `module` is its cumulative import time in the report, which excludes the baseline modules because
+    they are imported first. Only the first run pays for cold disk caches, so the median is the warm start time.
+
+    Parameters:
+    module (str, optional): The module to measure. Defaults to the scoring entry point "model_prediction".
+    repeats (int, optional): Number of interpreters to start. Defaults to 5.
+    baseline (tuple, optional): Modules imported first. Defaults to `BASELINE_MODULES`.
+    budget_ms (float, optional): Import time budget of `module`, in milliseconds. Defaults to `BUDGET_MS`.
+
+    Returns:
+    dict: 'module', 'module_ms' and 'baseline_ms' (medians), 'within_budget', 'heavy_modules' (imported packages of `HEAVY_MODULES`) and 'slowest' (the ten modules with the largest self time in the last run, as a DataFrame).
+
+    Example usage:
+    result = benchmark_startup("model_prediction")
+    print(result["module_ms"], result["heavy_modules"])
+    """
+    module_ms = []
+    baseline_ms = []
+    for _ in range(repeats):
+        times = import_times(module, baseline=baseline)
+        top_level = times[times["depth"] == 0].set_index("name")["cumulative_ms"]
+        module_ms.append(top_level.get(module, 0.0))
+        baseline_ms.append(top_level.reindex(list(baseline)).fillna(0.0).sum())
+
+    result = {
+        "module": module,
+        "module_ms": float(np.median(module_ms)),
+        "baseline_ms": float(np.median(baseline_ms)),
+        "heavy_modules": heavy_modules(times),
+        "slowest": times.nlargest(10, "self_ms").reset_index(drop=True)
+    }
+    result["within_budget"] = result["module_ms"] <= budget_ms
+
+    return result
+
+
+def main(argv: list = None) -> dict:
+    """
+    Command line entry point, e.g.
+
+    python src/startup_benchmark.py
+    python src/startup_benchmark.py --module models --repeats 10 --budget-ms 500
+
+    Exits with status 1 if the import is over budget or imports a package of `HEAVY_MODULES`.
+    """
+    parser = argparse.ArgumentParser(description="Measure the import time of a module with python -X importtime.")
+    parser.add_argument("--module", default="model_prediction", help="Module to import (default: model_prediction).")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of fresh interpreters (default: 5).")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="Import time budget on top of numpy and pandas (default: {}).".format(BUDGET_MS))
+    args = parser.parse_args(argv)
+
+    result = benchmark_startup(args.module, repeats=args.repeats, budget_ms=args.budget_ms)
+    print("import {}: {:.0f} ms on top of {} ({:.0f} ms), budget {:.0f} ms".format(
+        result["module"], result["module_ms"], ", ".join(BASELINE_MODULES), result["baseline_ms"], args.budget_ms
+    ))
+    print("Heavy modules imported: {}".format(", ".join(result["heavy_modules"]) or "none"))
+    print(result["slowest"].to_string(index=False))
+    if not result["within_budget"] or result["heavy_modules"]:
+        sys.exit(1)
+
+    return result
+
+
+if __name__ == "__main__":
+    main()
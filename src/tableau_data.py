@@ -1,96 +1,213 @@
-import sys
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
+import pyarrow.parquet as pq
 
+import data_processing
+import export
+import instrumentation
+import out_of_core
 
-home_dir = r"/Users/wrngnfreeman/Github/Shelter-Animal-Outcomes"
-data_file = r"Austin_Animal_Center_Outcomes_20250318"
-AnimalID=r"AnimalID"
-dep_var=r"OutcomeType"
-export_location=r"/Users/wrngnfreeman/Library/CloudStorage/OneDrive-Personal/shared_projects/Shelter Animal Outcomes/intermediate_data"
 
-# import required modules
-sys.path.append(home_dir + r"/src")
-import data_processing
+# Columns each Tableau output reads from the corresponding preprocess_data frame
+TABLEAU_COLUMNS = {
+    "animal_data": ["AnimalID", "OutcomeType", "AnimalType", "AgeuponOutcome", "SexuponOutcome", "Sterilization"],
+    "breed": ["AnimalID", "Breed_broken", "BreedType"],
+    "breed_mix": ["AnimalID", "Mix"],
+    "coat_color": ["AnimalID", "CoatColor"],
+    "coat_patterns": ["AnimalID", "CoatPattern"]
+}
+# Workbooks and worksheets used when exporting to Excel
+EXCEL_WORKBOOKS = {
+    "animal_data": {"animal_data": "animal_data"},
+    "breed": {"breed_type": "breed", "breed_mix": "breed_mix"},
+    "coat": {"coat_color": "coat_color", "coat_pattern": "coat_patterns"}
+}
 
-# Load data from the specified file path
-df = data_processing.load_data(home_dir=home_dir, data_file=data_file)
-
-# Preprocess the loaded DataFrame
-_, animal_data, breed, breed_mix, coat_color, coat_patterns = data_processing.preprocess_data(df=df, AnimalID=AnimalID, dep_var=dep_var)
-
-
-# Finishing touches
-## base animal info
-animal_data.drop(columns=["Name", "DateTime"], inplace=True)
-animal_data.rename(columns={
-    "AgeuponOutcome": "AgeGroup",
-    "SexuponOutcome": "Sex"
-}, inplace=True)
-## breed info
-breed.drop(columns="Breed", inplace=True)
-breed.rename(columns={"Breed_broken": "Breed"}, inplace=True)
-breed.dropna(subset=["Breed"], inplace=True)
-breed_mix.drop(columns=["Breed"], inplace=True)
-breed_mix.rename(columns={"Mix": "BreedMix"}, inplace=True)
-breed_mix["BreedMix"] = breed_mix["BreedMix"].str.replace("Mix", "Mixed Breed")
-breed_mix["BreedMix"] = breed_mix["BreedMix"].str.replace("Pure breed", "Pure Breed")
-
-breed_mix.rename(columns={"Mix": "BreedMix"}, inplace=True)
-breed_mix.dropna(how="any", inplace=True)
-# coat info
-coat_color.drop(columns=["Color"], inplace=True)
-coat_color.dropna(how="any", inplace=True)
-coat_patterns.drop(columns=["Color"], inplace=True)
-coat_patterns.dropna(how="any", inplace=True)
-
-# Export animal_data Excel file
-with pd.ExcelWriter(
-    path=export_location + r"/animal_data.xlsx",
-    mode="w",
-    date_format="YYYY-MM-DD",
-    datetime_format="YYYY-MM-DD"
-) as writer:
-    animal_data.to_excel(
-        excel_writer=writer,
-        index=False,
-        sheet_name=r"animal_data",
-        engine="openpyxl"
-    )
-# Export breed Excel file
-with pd.ExcelWriter(
-    path=export_location + r"/breed.xlsx",
-    mode="w",
-    date_format="YYYY-MM-DD",
-    datetime_format="YYYY-MM-DD"
-) as writer:
-    breed.to_excel(
-        excel_writer=writer,
-        index=False,
-        sheet_name=r"breed_type",
-        engine="openpyxl"
-    )
-    breed_mix.to_excel(
-        excel_writer=writer,
-        index=False,
-        sheet_name=r"breed_mix",
-        engine="openpyxl"
-    )
-# Export breed Excel file
-with pd.ExcelWriter(
-    path=export_location + r"/coat.xlsx",
-    mode="w",
-    date_format="YYYY-MM-DD",
-    datetime_format="YYYY-MM-DD"
-) as writer:
-    coat_color.to_excel(
-        excel_writer=writer,
-        index=False,
-        sheet_name=r"coat_color",
-        engine="openpyxl"
-    )
-    coat_patterns.to_excel(
-        excel_writer=writer,
-        index=False,
-        sheet_name=r"coat_pattern",
-        engine="openpyxl"
+
+def _columns(names: list, AnimalID: str, dep_var: str) -> list:
+    return [{"AnimalID": AnimalID, "OutcomeType": dep_var}.get(name, name) for name in names]
+
+
+@instrumentation.instrument
+def shape_for_tableau(
+    animal_data: pd.DataFrame,
+    breed: pd.DataFrame,
+    breed_mix: pd.DataFrame,
+    coat_color: pd.DataFrame,
+    coat_patterns: pd.DataFrame,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType"
+) -> dict:
+    """
+    Applies the Tableau finishing touches to the frames returned by `data_processing.preprocess_data`.
+
+    Each output is a single column projection with a row filter, so every frame is copied once and the inputs are
+    left untouched:
+    - animal_data: drops 'Name' and 'DateTime' and renames 'AgeuponOutcome'/'SexuponOutcome' to 'AgeGroup'/'Sex'.
+    - breed: keeps the individual breeds ('Breed_broken', renamed to 'Breed') that are not missing.
+    - breed_mix: keeps the 'Mix'/'Pure breed' labels as 'BreedMix' ("Mixed Breed"/"Pure Breed") and drops every other row.
+    - coat_color, coat_patterns: drop 'Color' and rows with missing values.
+
+    Parameters:
+    animal_data, breed, breed_mix, coat_color, coat_patterns (pd.DataFrame): The frames returned by `data_processing.preprocess_data` (or read from its stage cache).
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+
+    Returns:
+    dict: The five Tableau frames keyed by output name.
+    """
+    animal_columns = [column for column in _columns(TABLEAU_COLUMNS["animal_data"], AnimalID, dep_var) if column in animal_data.columns]
+
+    # Non-text 'Mix' values (the float flags, or their text form in a Parquet cache) are not labels and are dropped
+    breed_mix_labels = breed_mix["Mix"].map({"Mix": "Mixed Breed", "Pure breed": "Pure Breed"})
+    breed_mix_mask = breed_mix_labels.notna() & breed_mix[AnimalID].notna()
+    coat_color_columns = [AnimalID, "CoatColor"]
+    coat_patterns_columns = [AnimalID, "CoatPattern"]
+
+    return {
+        "animal_data": animal_data[animal_columns].rename(columns={"AgeuponOutcome": "AgeGroup", "SexuponOutcome": "Sex"}),
+        "breed": breed.loc[breed["Breed_broken"].notna(), [AnimalID, "Breed_broken", "BreedType"]].rename(columns={"Breed_broken": "Breed"}),
+        "breed_mix": pd.DataFrame({AnimalID: breed_mix[AnimalID][breed_mix_mask], "BreedMix": breed_mix_labels[breed_mix_mask]}),
+        "coat_color": coat_color.loc[coat_color[coat_color_columns].notna().all(axis=1), coat_color_columns],
+        "coat_patterns": coat_patterns.loc[coat_patterns[coat_patterns_columns].notna().all(axis=1), coat_patterns_columns]
+    }
+
+
+def read_stage_cache(
+    cache_dir: str,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType"
+) -> tuple:
+    """
+    Reads the frames needed for Tableau from the partitioned output of `out_of_core.preprocess_data_out_of_core`.
+
+    Only the columns used by `shape_for_tableau` are read from the Parquet files.
+
+    Parameters:
+    cache_dir (str): The `output_dir` passed to `preprocess_data_out_of_core`.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+
+    Returns:
+    tuple: (animal_data, breed, breed_mix, coat_color, coat_patterns)
+    """
+    frames = []
+    for name, columns in TABLEAU_COLUMNS.items():
+        path = os.path.join(cache_dir, name)
+        # The dependent variable is only present when the raw data had one
+        available = pq.read_schema(os.path.join(path, min(file for file in os.listdir(path) if file.endswith(".parquet")))).names
+        columns = [column for column in _columns(columns, AnimalID, dep_var) if column in available]
+        frames.append(out_of_core.read_partitioned_output(path, columns=columns))
+
+    return tuple(frames)
+
+
+@instrumentation.instrument
+def export_tableau_data(
+    output_dir: str,
+    fmt: str = "parquet",
+    frames: tuple = None,
+    cache_dir: str = None,
+    raw_data_path: str = None,
+    AnimalID: str = r"AnimalID",
+    dep_var: str = r"OutcomeType",
+    backend: str = "pandas",
+    n_workers: int = 5
+) -> dict:
+    """
+    Shapes the preprocessed data for Tableau and writes the five outputs concurrently.
+
+    The input is taken from the first of these that is given:
+    1. `frames`: the frames already returned by `data_processing.preprocess_data` (any of its six-frame or five-frame forms).
+    2. `cache_dir`: the stage cache written by `out_of_core.preprocess_data_out_of_core`.
+    3. `raw_data_path`: a raw CSV, preprocessed once with `data_processing.process_data`.
+
+    Parameters:
+    output_dir (str): Destination directory. It is created if needed.
+    fmt (str, optional): "parquet", "csv", "hyper" or "excel". Excel writes the animal_data, breed and coat workbooks. Defaults to "parquet".
+    frames (tuple, optional): Output of `data_processing.preprocess_data`, with or without the merged frame first.
+    cache_dir (str, optional): The output directory of `out_of_core.preprocess_data_out_of_core`.
+    raw_data_path (str, optional): The full path to the raw CSV file.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    dep_var (str, optional): The name of the dependent variable column. Defaults to 'OutcomeType'.
+    backend (str, optional): Backend passed to `data_processing.process_data` when reading `raw_data_path`. Defaults to "pandas".
+    n_workers (int, optional): Number of files written at the same time. Defaults to 5.
+
+    Returns:
+    dict: The written file paths keyed by output (or, for Excel, workbook) name.
+
+    Raises:
+    - ValueError: If no input is given or `fmt` is not supported.
+
+    Example usage:
+    outputs = data_processing.process_data("/path/to/data.csv")
+    export_tableau_data("/path/to/export", fmt="hyper", frames=outputs)
+    """
+    if fmt not in export.FORMATS:
+        raise ValueError("fmt must be one of {}, got {!r}".format(", ".join(export.FORMATS), fmt))
+    if frames is not None:
+        frames = tuple(frames)[-5:]
+    elif cache_dir is not None:
+        frames = read_stage_cache(cache_dir, AnimalID=AnimalID, dep_var=dep_var)
+    elif raw_data_path is not None:
+        frames = data_processing.process_data(raw_data_path, AnimalID=AnimalID, dep_var=dep_var, backend=backend)[1:]
+    else:
+        raise ValueError("One of frames, cache_dir or raw_data_path is required")
+
+    tableau_frames = shape_for_tableau(*frames, AnimalID=AnimalID, dep_var=dep_var)
+    os.makedirs(output_dir, exist_ok=True)
+
+    if fmt == "excel":
+        jobs = {
+            workbook: (export.write_excel, {sheet: tableau_frames[name] for sheet, name in sheets.items()}, os.path.join(output_dir, workbook + ".xlsx"))
+            for workbook, sheets in EXCEL_WORKBOOKS.items()
+        }
+    else:
+        writer = {"parquet": export.write_parquet, "csv": export.write_csv, "hyper": export.write_hyper}[fmt]
+        jobs = {
+            name: (writer, df, os.path.join(output_dir, name + export.FORMATS[fmt]))
+            for name, df in tableau_frames.items()
+        }
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        futures = {name: executor.submit(write, data, path) for name, (write, data, path) in jobs.items()}
+
+    return {name: future.result() for name, future in futures.items()}
+
+
+def main(argv: list = None) -> dict:
+    """
+    Command line entry point, e.g.
+
+    python src/tableau_data.py --raw-data /path/to/data.csv --output-dir /path/to/export --format hyper
+    python src/tableau_data.py --stage-cache /path/to/processed --output-dir /path/to/export
+    """
+    parser = argparse.ArgumentParser(description="Export the preprocessed shelter outcomes data for Tableau.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--raw-data", help="Raw outcomes CSV; preprocessed once before exporting.")
+    source.add_argument("--stage-cache", help="Output directory of out_of_core.preprocess_data_out_of_core.")
+    parser.add_argument("--output-dir", required=True, help="Directory the Tableau files are written to.")
+    parser.add_argument("--format", default="parquet", choices=list(export.FORMATS), help="Export format (default: parquet).")
+    parser.add_argument("--backend", default="pandas", choices=["pandas", "polars", "duckdb"], help="Preprocessing backend for --raw-data (default: pandas).")
+    parser.add_argument("--animal-id", default="AnimalID", help="Animal identifier column (default: AnimalID).")
+    parser.add_argument("--dep-var", default="OutcomeType", help="Outcome column (default: OutcomeType).")
+    parser.add_argument("--workers", type=int, default=5, help="Number of files written at the same time (default: 5).")
+    args = parser.parse_args(argv)
+
+    return export_tableau_data(
+        output_dir=args.output_dir,
+        fmt=args.format,
+        cache_dir=args.stage_cache,
+        raw_data_path=args.raw_data,
+        AnimalID=args.animal_id,
+        dep_var=args.dep_var,
+        backend=args.backend,
+        n_workers=args.workers
     )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The src modules import each other as top-level modules (as the scripts and notebooks do after
+# appending "<home_dir>/src" to sys.path), so make them importable the same way here.
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+
+@pytest.fixture
+def raw_df():
+    # A small raw outcomes frame in the shape `load_data` returns
+    rng = np.random.default_rng(0)
+    n = 200
+    df = pd.DataFrame({
+        "AnimalID": ["A{}".format(600000 + i) for i in rng.integers(0, 120, n)],
+        "Name": rng.choice(["Max", "Bella", "*Luna", "Charlie", None], n),
+        "DateTime": (pd.Timestamp("2014-01-01") + pd.to_timedelta(rng.integers(0, 24 * 2000, n), unit="h")).strftime("%m/%d/%Y %I:%M:%S %p"),
+        "OutcomeType": rng.choice(["Adoption", "Transfer", "Return to Owner", "Euthanasia", "Died"], n, p=[0.45, 0.3, 0.17, 0.05, 0.03]),
+        "AnimalType": rng.choice(["Dog", "Cat"], n),
+        "SexuponOutcome": rng.choice(["Neutered Male", "Spayed Female", "Intact Male", "Intact Female", "Unknown"], n),
+        "AgeuponOutcome": rng.choice(["1 year", "2 years", "3 weeks", "4 months", "10 years", "2 days", "16 years"], n),
+        "Breed": rng.choice(["Labrador Retriever Mix", "Pit Bull Mix", "Domestic Shorthair Mix", "Siamese", "Chihuahua Shorthair/Dachshund", "Unknown"], n),
+        "Color": rng.choice(["Brown/White", "Cream Tabby", "Blue/White", "Blue Cream", "Tan", "Black", "Tricolor", "Yellow"], n)
+    })
+    return df.drop_duplicates().reset_index(drop=True)
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+import out_of_core
+import utils
+from data_processing import preprocess_data
+
+duckdb_engine = pytest.importorskip("duckdb_engine")
+
+
+def test_duckdb_engine_matches_pandas(raw_df):
+    expected = preprocess_data(raw_df.copy())
+    result = preprocess_data(raw_df.copy(), engine="duckdb")
+
+    assert len(result) == len(expected)
+    for result_frame, expected_frame in zip(result, expected):
+        pd.testing.assert_frame_equal(result_frame, expected_frame, check_dtype=False)
+
+
+def test_merge_processed_frames_from_parquet_cache(raw_df, tmp_path):
+    expected = preprocess_data(raw_df.copy())
+    for name, frame in zip(out_of_core.OUTPUT_NAMES[1:], expected[1:]):
+        path = tmp_path / name
+        path.mkdir()
+        utils.to_arrow_compatible(frame).to_parquet(path / "part-00000.parquet", index=False)
+
+    con = duckdb_engine.connect(temp_directory=str(tmp_path / "spill"), memory_limit="256MB", threads=1)
+    result = duckdb_engine.merge_processed_frames(*[str(tmp_path / name) for name in out_of_core.OUTPUT_NAMES[1:]], con=con)
+
+    pd.testing.assert_frame_equal(result, expected[0], check_dtype=False)
+
+
+def test_connections_opened_by_the_engine_are_closed(raw_df, monkeypatch):
+    opened = []
+
+    def connect(**kwargs):
+        opened.append(duckdb_engine.duckdb.connect(database=":memory:"))
+        return opened[-1]
+
+    monkeypatch.setattr(duckdb_engine, "connect", connect)
+    frames = preprocess_data(raw_df.copy(), engine="duckdb")
+    duckdb_engine.merge_processed_frames(*frames[1:])
+
+    assert len(opened) == 2
+    for con in opened:
+        with pytest.raises(duckdb_engine.duckdb.ConnectionException):
+            con.execute("SELECT 1")
+
+
+def test_memory_limit_is_quoted():
+    with pytest.raises(duckdb_engine.duckdb.Error):
+        duckdb_engine.connect(memory_limit="1GB'; SET threads = 1; --")
+
+
+def test_unknown_engine(raw_df):
+    with pytest.raises(ValueError):
+        preprocess_data(raw_df.copy(), engine="spark")
@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pandas as pd
+import pytest
+
+import export
+from data_processing import preprocess_data
+
+
+@pytest.fixture
+def frames(raw_df):
+    _, animal_data, breed, breed_mix, coat_color, coat_patterns = preprocess_data(raw_df.copy())
+    return {"animal_data": animal_data, "breed": breed, "breed_mix": breed_mix}
+
+
+def _as_text(frame):
+    return frame.astype(object).where(frame.notna(), "<missing>").astype(str)
+
+
+def test_parquet_round_trip(frames, tmp_path):
+    paths = export.export_frames(frames, str(tmp_path), fmt="parquet")
+    for name, df in frames.items():
+        pd.testing.assert_frame_equal(_as_text(pd.read_parquet(paths[name])), _as_text(df))
+
+
+def test_chunked_csv_matches_single_write(frames, tmp_path):
+    df = frames["breed"]
+    path = export.write_csv(df, str(tmp_path / "breed.csv"), chunksize=7, n_workers=3)
+    pd.testing.assert_frame_equal(pd.read_csv(path, dtype=str), df.astype(str).where(df.notna()), check_dtype=False)
+
+
+def test_first_conversions_on_threads(tmp_path):
+    # The pyarrow pandas set-up runs on the first conversion, so this needs a fresh interpreter
+    script = textwrap.dedent("""
+        import sys
+        from concurrent.futures import ThreadPoolExecutor
+        import pandas as pd
+        import export
+
+        assert not export._arrow_pandas_ready
+        df = pd.DataFrame({"Breed": ["Pit Bull", "Siamese"] * 500, "Count": range(1000)})
+        frames = [df[df["Count"] % 4 == i] for i in range(4)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda item: export.write_parquet(item[1], "{}/{}.parquet".format(sys.argv[1], item[0])), enumerate(frames)))
+    """)
+    src_dir = os.path.dirname(os.path.abspath(export.__file__))
+    result = subprocess.run([sys.executable, "-c", script, str(tmp_path)], env=dict(os.environ, PYTHONPATH=src_dir), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_excel_row_limit(frames, tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXCEL_MAX_ROWS", 10)
+    with pytest.raises(ValueError):
+        export.write_excel({"breed": frames["breed"]}, str(tmp_path / "breed.xlsx"))
+
+
+def test_excel_constant_memory(frames, tmp_path):
+    pytest.importorskip("xlsxwriter")
+    path = export.write_excel({"breed_type": frames["breed"], "breed_mix": frames["breed_mix"]}, str(tmp_path / "breed.xlsx"))
+    assert (tmp_path / "breed.xlsx").stat().st_size > 0
+    assert path.endswith("breed.xlsx")
+
+
+def test_hyper_extract(frames, tmp_path):
+    tableauhyperapi = pytest.importorskip("tableauhyperapi")
+    path = export.write_hyper(frames["breed"], str(tmp_path / "breed.hyper"))
+    with tableauhyperapi.HyperProcess(telemetry=tableauhyperapi.Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU, parameters={"log_dir": str(tmp_path)}) as hyper:
+        with tableauhyperapi.Connection(endpoint=hyper.endpoint, database=path) as connection:
+            rows = connection.execute_scalar_query('SELECT COUNT(*) FROM "Extract"."Extract"')
+    assert rows == len(frames["breed"])
+
+
+def test_benchmark_formats(frames, tmp_path):
+    report = export.benchmark_formats(frames, str(tmp_path), formats=["parquet", "csv"])
+    assert list(report["format"]) == ["parquet", "csv"]
+    assert (report["size_mb"] > 0).all()
+
+
+def test_unknown_format(frames, tmp_path):
+    with pytest.raises(ValueError):
+        export.export_frames(frames, str(tmp_path), fmt="xls")
@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import feature_engineering
+import feature_store
+import models
+from data_processing import preprocess_data
+
+
+@pytest.fixture
+def engineered_df(raw_df):
+    processed_df = preprocess_data(raw_df.copy())[0].drop(columns=["Breed_broken"])
+    return feature_engineering.engineer_features(processed_df).dropna(subset=["OutcomeType"]).reset_index(drop=True)
+
+
+def _column_sums(store_dir):
+    return feature_store.open_feature_store(store_dir).X.sum(axis=0)
+
+
+def test_store_round_trips_through_a_memory_map(engineered_df, tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_store, "WRITE_BLOCK_ROWS", 7)
+    store_dir = str(tmp_path / "store")
+
+    manifest = feature_store.write_feature_store(engineered_df, store_dir)
+    store = feature_store.open_feature_store(store_dir)
+
+    assert feature_store.store_exists(store_dir)
+    assert isinstance(store.X, np.memmap) and not store.X.flags.writeable
+    assert manifest["arrays"] == ["features", "ids", "labels"]
+    assert json.load(open(os.path.join(store_dir, "manifest.json"))) == store.manifest
+    pd.testing.assert_frame_equal(store.frame(), engineered_df, check_dtype=False)
+    assert np.shares_memory(store.features().to_numpy(), store.X)
+    # Other processes map the same files
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        np.testing.assert_allclose(pool.submit(_column_sums, store_dir).result(), store.X.sum(axis=0))
+
+
+def test_compacted_store_has_weights_and_no_ids(engineered_df, tmp_path):
+    store_dir = str(tmp_path / "store")
+    compacted = feature_engineering.compact_rows(engineered_df)
+    feature_store.write_feature_store(engineered_df, store_dir)
+
+    feature_store.write_feature_store(compacted, store_dir)
+    store = feature_store.open_feature_store(store_dir)
+
+    assert store.ids is None and not os.path.exists(os.path.join(store_dir, store.manifest["data_dir"], "ids.npy"))
+    np.testing.assert_array_equal(store.weights, compacted["Weight"])
+    assert store.columns == [column for column in compacted.columns if column not in ["OutcomeType", "Weight"]]
+    with pytest.raises(ValueError):
+        feature_store.write_feature_store(engineered_df.assign(Name="Max"), store_dir)
+
+    # The split marker of compact_split_rows is a role, not a feature
+    split = feature_engineering.compact_split_rows(engineered_df)
+    feature_store.write_feature_store(split, store_dir)
+    store = feature_store.open_feature_store(store_dir)
+    assert store.columns == [column for column in split.columns if column not in ["OutcomeType", "Weight", "Validation"]]
+    np.testing.assert_array_equal(store.validation, split["Validation"] == 1)
+    pd.testing.assert_frame_equal(store.frame(), split, check_dtype=False)
+
+
+def test_rewrites_switch_versions_atomically(engineered_df, tmp_path):
+    store_dir = str(tmp_path / "store")
+    feature_store.write_feature_store(engineered_df, store_dir)
+    first = feature_store.open_feature_store(store_dir)
+    first_manifest = dict(first.manifest)
+
+    # A rewrite without ids: the first version stays readable, for readers that read its manifest before the switch
+    compacted = feature_engineering.compact_rows(engineered_df)
+    feature_store.write_feature_store(compacted, store_dir)
+    with open(os.path.join(store_dir, "manifest.json"), "w") as file:
+        json.dump(first_manifest, file)
+    pd.testing.assert_frame_equal(feature_store.open_feature_store(store_dir).frame(), engineered_df, check_dtype=False)
+    np.testing.assert_array_equal(first.ids, engineered_df["AnimalID"])
+
+    feature_store.write_feature_store(compacted, store_dir)
+    feature_store.write_feature_store(compacted, store_dir)
+    manifest = feature_store.open_feature_store(store_dir).manifest
+    assert not os.path.exists(os.path.join(store_dir, first_manifest["data_dir"]))
+    assert os.path.isdir(os.path.join(store_dir, manifest["previous_data_dir"]))
+    assert feature_store.open_feature_store(store_dir).ids is None
+
+
+def test_rewrites_keep_the_data_of_concurrent_writers(engineered_df, tmp_path):
+    store_dir = str(tmp_path / "store")
+    feature_store.write_feature_store(engineered_df, store_dir)
+    # The data directory of a writer that has not published its manifest yet
+    unpublished = tempfile.mkdtemp(prefix="data-", dir=store_dir)
+    for _ in range(3):
+        feature_store.write_feature_store(engineered_df, store_dir)
+    assert os.path.isdir(unpublished)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        manifests = list(executor.map(lambda _: feature_store.write_feature_store(engineered_df, store_dir), range(8)))
+    store = feature_store.open_feature_store(store_dir)
+    assert store.manifest["data_dir"] in [manifest["data_dir"] for manifest in manifests]
+    pd.testing.assert_frame_equal(store.frame(), engineered_df, check_dtype=False)
+    assert not [entry for entry in os.listdir(store_dir) if ".tmp-" in entry]
+
+
+def test_store_is_rebuilt_when_its_source_or_code_changes(engineered_df, tmp_path):
+    store_dir = str(tmp_path / "store")
+    data_path = tmp_path / "data.csv"
+    data_path.write_text("AnimalID\n")
+    source, code_version = feature_store.file_fingerprint(str(data_path)), feature_store.feature_code_version()
+
+    assert not feature_store.store_is_current(store_dir, source, code_version)
+    feature_store.write_feature_store(engineered_df, store_dir, source=source, code_version=code_version)
+    assert feature_store.store_is_current(store_dir, source, code_version)
+    assert not feature_store.store_is_current(store_dir, source, code_version + "-changed")
+
+    data_path.write_text("AnimalID\nA1\n")
+    assert not feature_store.store_is_current(store_dir, feature_store.file_fingerprint(str(data_path)), code_version)
+
+
+def test_builders_train_on_the_memory_map(engineered_df, tmp_path):
+    store_dir = str(tmp_path / "store")
+    split = feature_engineering.compact_split_rows(engineered_df, seed=1)
+    feature_store.write_feature_store(split, store_dir)
+    store = feature_store.open_feature_store(store_dir)
+
+    X_train, X_val, y_train, y_val, w_train, w_val = store.split()
+    expected = models._train_validation_split(split, "AnimalID", "OutcomeType", "Weight", 1)
+    assert np.shares_memory(X_train.to_numpy(), store.X) and np.shares_memory(X_val.to_numpy(), store.X)
+    for actual, frame in zip([X_train, X_val, y_train, y_val, w_train, w_val], expected):
+        np.testing.assert_allclose(np.asarray(actual, dtype=float), np.asarray(frame, dtype=float))
+
+    from_store = models.logistic_regression_model(store, seed=1)
+    from_frame = models.logistic_regression_model(split, seed=1)
+    np.testing.assert_allclose(from_store.coef_, from_frame.coef_, rtol=1e-3, atol=1e-4)
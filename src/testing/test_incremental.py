@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import incremental
+import trends
+from data_processing import preprocess_data
+from feature_engineering import engineer_features
+
+
+@pytest.fixture
+def engineered(raw_df):
+    processed_df = preprocess_data(raw_df.copy())[0].drop(columns=["Breed_broken"]).dropna(subset=["OutcomeType"])
+    months = trends.parse_datetime(processed_df["DateTime"]).dt.to_period("M")
+    return engineer_features(processed_df), months.to_numpy()
+
+
+@pytest.mark.parametrize("kind", incremental.KINDS)
+def test_updates_learn_from_new_rows_only(engineered, kind):
+    engineered_df, months = engineered
+    periods = np.unique(months)
+    history = engineered_df[months < periods[-3]]
+
+    learner = incremental.IncrementalLearner(kind, refit_every=10, drift_threshold=1.0, rounds=5, rounds_per_update=2).fit(history)
+    for period in periods[-3:]:
+        assert learner.update(engineered_df[months == period]) == "update"
+
+    assert learner.updates_since_fit == 3
+    assert [row["rows"] for row in learner.history] == [(months == period).sum() for period in periods[-3:]]
+    if kind == "xgboost":
+        assert learner.model.num_boosted_rounds() == 5 + 3 * 2
+    probabilities = learner.predict_proba(engineered_df.drop(columns=["OutcomeType"]))
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1, rtol=1e-5)
+
+
+def test_updates_keep_the_scaling_of_the_last_fit(engineered):
+    engineered_df, months = engineered
+    periods = np.unique(months)
+    history = engineered_df[months < periods[-2]]
+
+    learner = incremental.IncrementalLearner("sgd", refit_every=2, drift_threshold=1.0).fit(history)
+    mean, scale = learner.scaler.mean_.copy(), learner.scaler.scale_.copy()
+    assert learner.update(engineered_df[months == periods[-2]], history=engineered_df[months <= periods[-2]]) == "update"
+    np.testing.assert_array_equal(learner.scaler.mean_, mean)
+    np.testing.assert_array_equal(learner.scaler.scale_, scale)
+
+    assert learner.update(engineered_df[months == periods[-1]], history=engineered_df) == "refit"
+    np.testing.assert_allclose(learner.scaler.mean_, engineered_df[learner.feature_names].mean())
+
+
+def test_refit_is_scheduled_and_triggered_by_drift(engineered):
+    engineered_df, months = engineered
+    periods = np.unique(months)
+    history = engineered_df[months < periods[-2]]
+
+    learner = incremental.IncrementalLearner("sgd", refit_every=2, drift_threshold=1.0).fit(history)
+    assert learner.update(engineered_df[months == periods[-2]], history=engineered_df[months <= periods[-2]]) == "update"
+    assert learner.update(engineered_df[months == periods[-1]], history=engineered_df) == "refit"
+    assert learner.updates_since_fit == 0
+
+    # A day the model gets entirely wrong is drift
+    learner = incremental.IncrementalLearner("sgd", drift_threshold=0.2).fit(history)
+    day = engineered_df[months == periods[-1]]
+    learner.running_accuracy = 1.0
+    wrong = day.assign(OutcomeType=(learner.predict(day) + 1) % len(learner.classes_))
+    assert learner.update(wrong, history=engineered_df) == "drift_refit"
+
+    with pytest.raises(ValueError):
+        incremental.IncrementalLearner("forest")
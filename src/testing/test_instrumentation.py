@@ -0,0 +1,136 @@
+import os
+import subprocess
+import sys
+import threading
+import tracemalloc
+
+import pandas as pd
+import pytest
+
+import instrumentation
+from data_processing import preprocess_data
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    instrumentation.reset()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_disabled_records_nothing(raw_df):
+    instrumentation.disable()
+    preprocess_data(raw_df.copy())
+    assert instrumentation.get_records() == []
+    assert instrumentation.summary().empty
+
+
+def test_preprocess_stages_are_recorded(raw_df):
+    instrumentation.enable()
+    df, animal_data, breed, breed_mix, coat_color, coat_patterns = preprocess_data(raw_df.copy())
+
+    report = instrumentation.summary()
+    stages = set(report["stage"])
+    for name in ["data_processing.preprocess_data", "data_processing.process_breed_data",
+                 "data_processing.process_coat_colors", "data_processing.preprocess_data.merge"]:
+        assert name in stages
+    assert (report["wall_seconds"] >= 0).all()
+    assert (report["peak_memory_mb"] >= 0).all()
+
+    outer = report.set_index("stage").loc["data_processing.preprocess_data"]
+    assert outer["rows_in"] == len(raw_df)
+    assert outer["rows_out"] == sum(len(frame) for frame in [df, animal_data, breed, breed_mix, coat_color, coat_patterns])
+
+
+def test_instrument_decorator_and_nesting():
+    instrumentation.enable()
+
+    @instrumentation.instrument(name="inner")
+    def inner(frame):
+        return pd.concat([frame, frame])
+
+    @instrumentation.instrument(name="outer")
+    def outer(frame):
+        return inner(frame)
+
+    result = outer(pd.DataFrame({"a": range(10)}))
+    records = {record["stage"]: record for record in instrumentation.get_records()}
+    assert len(result) == 20
+    assert records["inner"]["rows_in"] == 10 and records["inner"]["rows_out"] == 20
+    assert records["outer"]["peak_memory_mb"] >= records["inner"]["peak_memory_mb"]
+
+
+def test_disable_keeps_tracing_started_elsewhere():
+    instrumentation.enable()
+    instrumentation.disable()
+    assert not tracemalloc.is_tracing()
+
+    tracemalloc.start()
+    try:
+        instrumentation.enable()
+        instrumentation.disable()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_environment_switch_traces_memory():
+    # A fresh interpreter, as the switch is read when instrumentation is imported
+    script = "\n".join([
+        "import tracemalloc, instrumentation",
+        "assert instrumentation.is_enabled() and tracemalloc.is_tracing()",
+        "with instrumentation.stage('block'):",
+        "    data = bytearray(2 ** 20)",
+        "assert instrumentation.get_records()[0]['peak_memory_mb'] >= 1"
+    ])
+    env = dict(os.environ, SHELTER_INSTRUMENT="1", PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+
+
+def test_records_are_capped():
+    instrumentation.enable(trace_memory=False)
+    for index in range(instrumentation.MAX_RECORDS + 5):
+        with instrumentation.stage("stage_{}".format(index)):
+            pass
+
+    records = instrumentation.get_records()
+    assert len(records) == instrumentation.MAX_RECORDS
+    assert records[0]["stage"] == "stage_5"
+
+
+def test_stages_on_threads_are_recorded_apart():
+    instrumentation.enable()
+    started = threading.Barrier(2)
+    finished = threading.Event()
+
+    def large():
+        with instrumentation.stage("large"):
+            started.wait()
+            data = [bytearray(2 ** 20) for _ in range(50)]
+            sum(range(3 * 10 ** 6))
+            del data
+        finished.set()
+
+    def small():
+        with instrumentation.stage("small"):
+            started.wait()
+            finished.wait()
+        with instrumentation.stage("small_alone"):
+            data = bytearray(2 ** 20)
+            del data
+
+    threads = [threading.Thread(target=large), threading.Thread(target=small)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    records = {record["stage"]: record for record in instrumentation.get_records()}
+    assert records["large"]["overlapped"] and records["small"]["overlapped"]
+    assert records["large"]["peak_memory_mb"] is None and records["small"]["peak_memory_mb"] is None
+    # CPU time is per thread: the small stage only waited for the large one
+    assert records["small"]["cpu_seconds"] < records["large"]["cpu_seconds"] / 2
+    assert not records["small_alone"]["overlapped"] and records["small_alone"]["peak_memory_mb"] >= 1
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+import model_prediction
+from data_processing import preprocess_data
+from feature_engineering import engineer_features
+
+
+class CountingModel:
+    # Wraps a model and records the number of rows passed to predict_proba
+    def __init__(self, model):
+        self.model = model
+        self.classes_ = model.classes_
+        self.feature_names_in_ = model.feature_names_in_
+        self.rows = []
+
+    def predict_proba(self, X):
+        self.rows.append(len(X))
+        return self.model.predict_proba(X)
+
+
+def _fitted(raw_df):
+    engineered_df = engineer_features(preprocess_data(raw_df.copy())[0].drop(columns=["Breed_broken"])).dropna(subset=["OutcomeType"])
+    X = engineered_df.drop(columns=["AnimalID", "OutcomeType"])
+    return CountingModel(LogisticRegression(max_iter=1000).fit(X, engineered_df["OutcomeType"])), X
+
+
+def test_cache_predicts_distinct_rows_once(raw_df):
+    model, X = _fitted(raw_df)
+    cache = model_prediction.PredictionCache(model)
+
+    first = cache.predict_proba(X)
+    second = cache.predict_proba(X.iloc[::-1])
+
+    np.testing.assert_allclose(first, model.model.predict_proba(X))
+    np.testing.assert_allclose(second, first[::-1])
+    assert model.rows == [len(X.drop_duplicates())]
+    assert (cache.hits, cache.misses) == (len(cache), len(cache))
+    np.testing.assert_array_equal(cache.predict(X), model.model.predict(X))
+
+
+def test_cache_evicts_least_recently_used(raw_df):
+    model, X = _fitted(raw_df)
+    distinct = X.drop_duplicates()
+    cache = model_prediction.PredictionCache(model, max_size=3)
+
+    cache.predict_proba(distinct.iloc[:3])
+    cache.predict_proba(distinct.iloc[[0]])
+    cache.predict_proba(distinct.iloc[[3]])
+    cache.predict_proba(distinct.iloc[[0, 2, 3]])
+
+    # Row 1 was the least recently used when row 3 was added
+    assert len(cache) == 3
+    assert model.rows == [3, 1]
+    cache.predict_proba(distinct.iloc[[1]])
+    assert model.rows == [3, 1, 1]
+
+
+def test_cache_checks_the_columns_and_owns_its_entries(raw_df):
+    model, X = _fitted(raw_df)
+    cache = model_prediction.PredictionCache(model)
+    cache.predict_proba(X)
+
+    # Same values under other names would hit the cache
+    renamed = X.rename(columns=dict(zip(X.columns, X.columns[::-1])))
+    with pytest.raises(ValueError):
+        cache.predict_proba(renamed)
+    with pytest.raises(ValueError):
+        cache.predict_proba(X[X.columns[::-1]])
+    assert all(entry.base is None for entry in cache._probabilities.values())
+
+
+def test_predict_outcomes_aligns_the_model_features(raw_df):
+    model, X = _fitted(raw_df)
+    cache = model_prediction.PredictionCache(model)
+    batch = raw_df.iloc[:50].drop(columns=["OutcomeType"])
+
+    predictions = model_prediction.predict_outcomes(model.model, batch, cache=cache)
+
+    assert len(predictions) == len(preprocess_data(batch.copy())[0])
+    np.testing.assert_array_equal(predictions, model_prediction.predict_outcomes(model.model, batch))
+    features = model_prediction.model_features(model, pd.DataFrame({"Unknown": [1], X.columns[0]: [1]}))
+    assert features.columns.tolist() == X.columns.tolist()
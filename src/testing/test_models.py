@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import accuracy_score
+
+import feature_engineering
+import models
+from data_processing import preprocess_data
+
+
+def test_categorical_features_keep_one_code_per_column(raw_df):
+    processed_df = preprocess_data(raw_df.copy())[0]
+
+    data = feature_engineering.categorical_features(processed_df)
+
+    assert data.columns.tolist() == ["AnimalID", "OutcomeType"] + feature_engineering.CATEGORICAL_COLUMNS
+    assert all(isinstance(data[column].dtype, pd.CategoricalDtype) for column in feature_engineering.CATEGORICAL_COLUMNS)
+    assert set(data["OutcomeType"].dropna()) <= set(feature_engineering.OUTCOME_CODES.values())
+    # Scoring data is coded with the training categories
+    levels = feature_engineering.category_levels(data)
+    scored = feature_engineering.categorical_features(processed_df.head(5).assign(AnimalType="Bird"), categories=levels)
+    assert scored["AnimalType"].isna().all()
+    assert scored["CoatColor"].cat.categories.equals(levels["CoatColor"])
+
+
+def test_xg_boost_categorical(raw_df, tmp_path):
+    data = feature_engineering.categorical_features(preprocess_data(raw_df.copy())[0]).dropna(subset=["OutcomeType"])
+    path = str(tmp_path / "xgb.joblib")
+
+    model = models.xg_boost_categorical(data, export_model_path=path)
+
+    X = data.drop(columns=["AnimalID", "OutcomeType"])
+    assert model.get_params()["enable_categorical"]
+    np.testing.assert_array_equal(models.joblib.load(path).predict(X), model.predict(X))
+
+
+def test_hist_gradient_boosting_model(raw_df, tmp_path):
+    data = feature_engineering.categorical_features(preprocess_data(raw_df.copy())[0]).dropna(subset=["OutcomeType"])
+    path = str(tmp_path / "hgb.joblib")
+
+    model = models.hist_gradient_boosting_model(data, seed=0, export_model_path=path)
+
+    X = models.category_codes(data.drop(columns=["AnimalID", "OutcomeType"]))
+    assert model.is_categorical_.all()
+    assert (X.fillna(0) >= 0).all().all()
+    np.testing.assert_array_equal(models.joblib.load(path).predict(X), model.predict(X))
+
+
+def test_benchmark_hist_gradient_boosting(raw_df):
+    processed_df = preprocess_data(raw_df.copy())[0]
+    engineered_df = feature_engineering.engineer_features(processed_df.drop(columns=["Breed_broken"])).dropna(subset=["OutcomeType"])
+    categorical_df = feature_engineering.categorical_features(processed_df).loc[engineered_df.index]
+
+    report = models.benchmark_hist_gradient_boosting(engineered_df, categorical_df)
+
+    assert report["model"].tolist() == ["random_forest", "hist_gradient_boosting"]
+    assert (report[["fit_seconds", "predict_seconds", "artifact_mb"]] > 0).all().all()
+    with pytest.raises(ValueError):
+        models.benchmark_hist_gradient_boosting(engineered_df, categorical_df.iloc[::-1])
+
+
+def test_compact_rows_keeps_the_weighted_rows(raw_df):
+    engineered_df = feature_engineering.engineer_features(preprocess_data(raw_df.copy())[0].drop(columns=["Breed_broken"]))
+
+    compact_df = feature_engineering.compact_rows(engineered_df)
+
+    features = [column for column in engineered_df.columns if column != "AnimalID"]
+    assert compact_df.columns.tolist() == features + ["Weight"]
+    assert not compact_df.duplicated(subset=features).any()
+    assert compact_df["Weight"].sum() == len(engineered_df)
+    # Expanding the weighted rows gives back the original rows
+    expanded = compact_df.loc[compact_df.index.repeat(compact_df["Weight"]), features]
+    pd.testing.assert_frame_equal(
+        expanded.sort_values(features).reset_index(drop=True),
+        engineered_df[features].sort_values(features).reset_index(drop=True)
+    )
+    # Weights of an already compacted frame are summed
+    twice = feature_engineering.compact_rows(pd.concat([compact_df, compact_df]))
+    assert twice["Weight"].tolist() == (2 * compact_df["Weight"]).tolist()
+
+
+def test_compact_split_rows_keep_the_uncompacted_split(raw_df):
+    engineered_df = feature_engineering.engineer_features(preprocess_data(raw_df.copy())[0].drop(columns=["Breed_broken"])).dropna(subset=["OutcomeType"])
+    _, X_val, _, y_val, _, _ = models._train_validation_split(engineered_df, "AnimalID", "OutcomeType", "Weight", 3)
+
+    compact_df = feature_engineering.compact_split_rows(engineered_df, seed=3)
+    X_train_c, X_val_c, _, y_val_c, w_train_c, w_val_c = models._train_validation_split(compact_df, "AnimalID", "OutcomeType", "Weight", 3)
+
+    assert "Validation" not in X_val_c.columns and X_val_c.columns.tolist() == X_val.columns.tolist()
+    assert (w_train_c.sum(), w_val_c.sum()) == (len(engineered_df) - len(X_val), len(X_val))
+    # Expanding the weighted validation rows gives back the validation rows of the uncompacted split
+    expanded = X_val_c.assign(OutcomeType=y_val_c).loc[X_val_c.index.repeat(w_val_c)]
+    columns = expanded.columns.tolist()
+    pd.testing.assert_frame_equal(
+        expanded.sort_values(columns).reset_index(drop=True),
+        X_val.assign(OutcomeType=y_val).sort_values(columns).reset_index(drop=True)
+    )
+
+
+def test_builders_use_the_row_weights(raw_df):
+    engineered_df = feature_engineering.engineer_features(preprocess_data(raw_df.copy())[0].drop(columns=["Breed_broken"]))
+    compact_df = feature_engineering.compact_rows(engineered_df.dropna(subset=["OutcomeType"]))
+
+    weighted = models.logistic_regression_model(compact_df)
+    unweighted = models.logistic_regression_model(compact_df.drop(columns=["Weight"]))
+
+    assert weighted.n_features_in_ == compact_df.shape[1] - 2
+    assert not np.allclose(weighted.coef_, unweighted.coef_)
+    assert models.xg_boost_categorical(
+        feature_engineering.compact_rows(feature_engineering.categorical_features(preprocess_data(raw_df.copy())[0]).dropna(subset=["OutcomeType"]))
+    ).n_features_in_ == len(feature_engineering.CATEGORICAL_COLUMNS)
+
+
+def test_random_forest_trains_on_weighted_split_rows(raw_df, tmp_path):
+    # Runs outside IPython: the builder prints the feature importances
+    engineered_df = feature_engineering.engineer_features(preprocess_data(raw_df.copy())[0].drop(columns=["Breed_broken"])).dropna(subset=["OutcomeType"])
+    compact_df = feature_engineering.compact_split_rows(engineered_df, seed=0)
+    path = str(tmp_path / "rf.joblib")
+
+    model = models.random_forest_model(compact_df, seed=0, export_model_path=path)
+
+    assert model.feature_names_in_.tolist() == [column for column in compact_df.columns if column not in ["OutcomeType", "Weight", "Validation"]]
+    X = compact_df[model.feature_names_in_]
+    np.testing.assert_array_equal(models.joblib.load(path).predict(X), model.predict(X))
+
+
+def test_regularization_path_picks_the_best_c(raw_df):
+    engineered_df = feature_engineering.engineer_features(preprocess_data(raw_df.copy())[0].drop(columns=["Breed_broken"])).dropna(subset=["OutcomeType"])
+    X_train, X_val, y_train, y_val, _, _ = models._train_validation_split(engineered_df, "AnimalID", "OutcomeType", "Weight", 0)
+    Cs = [10.0, 0.01, 1.0, 0.1]
+
+    model, path = models.regularization_path(X_train, y_train, X_val, y_val, Cs=Cs, n_jobs=2)
+
+    assert path["C"].tolist() == sorted(Cs)
+    assert (path["fit_seconds"] > 0).all()
+    assert model.C == path.loc[path["val_log_loss"].idxmin(), "C"]
+    assert model.solver == "saga" and model.warm_start
+    assert model.feature_names_in_.tolist() == X_train.columns.tolist()
+    np.testing.assert_allclose(
+        path.loc[path["C"] == model.C, "val_accuracy"].iloc[0], accuracy_score(y_val, model.predict(X_val))
+    )
+    assert models.logistic_regression_model(engineered_df, Cs=Cs).C == model.C
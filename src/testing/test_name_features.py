@@ -0,0 +1,45 @@
+import pandas as pd
+
+import feature_engineering
+from data_processing import preprocess_data
+
+
+def test_name_frequencies_count_animals_once():
+    df = pd.DataFrame({
+        "AnimalID": ["A1", "A1", "A2", "A3", "A4", "A5"],
+        "Name": ["*Luna", "*Luna", "Luna ", "Max", None, ""]
+    })
+
+    name_frequencies = feature_engineering.fit_name_frequencies(df)
+
+    assert name_frequencies["count"].to_dict() == {"luna": 2, "max": 1}
+    assert name_frequencies["bucket"].to_dict() == {"luna": 2, "max": 1}
+
+
+def test_name_features_look_up_the_persisted_table(raw_df, tmp_path):
+    processed_df = preprocess_data(raw_df.copy())[0]
+    path = feature_engineering.save_name_frequencies(
+        feature_engineering.fit_name_frequencies(processed_df), str(tmp_path / "name_frequencies.joblib")
+    )
+    name_frequencies = feature_engineering.load_name_frequencies(path)
+    new_animals = pd.DataFrame({"Name": ["*Zed", None, ""] + [processed_df["Name"].dropna().iloc[0]]})
+
+    data = feature_engineering.add_name_features(new_animals, name_frequencies)
+
+    assert data["HasName"].tolist() == [1, 0, 0, 1]
+    assert data["NameGivenByShelter"].tolist()[:3] == [1, 0, 0]
+    assert data["NameLength"].tolist()[:3] == [3, 0, 0]
+    # Unseen names count as rare, names in the table get their bucket
+    known = feature_engineering.clean_names(new_animals["Name"]).iloc[3]
+    assert data["NamePopularity"].tolist() == [1, 0, 0, name_frequencies.loc[known, "bucket"]]
+
+
+def test_engineer_features_adds_name_features(raw_df):
+    processed_df = preprocess_data(raw_df.copy())[0].drop(columns=["Breed_broken"])
+    name_frequencies = feature_engineering.fit_name_frequencies(processed_df)
+
+    data = feature_engineering.engineer_features(processed_df, name_frequencies=name_frequencies)
+
+    assert {"HasName", "NameGivenByShelter", "NameLength", "NamePopularity"} <= set(data.columns)
+    assert "Name" not in data.columns
+    assert data["HasName"].sum() == processed_df["Name"].str.strip().str.lstrip("*").str.len().gt(0).sum()
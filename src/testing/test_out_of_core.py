@@ -0,0 +1,28 @@
+import pandas as pd
+
+import out_of_core
+from data_processing import process_data
+
+
+def _sorted(frame):
+    frame = frame.astype(object).where(frame.notna(), "<missing>").astype(str)
+    return frame.sort_values(by=list(frame.columns), ignore_index=True)
+
+
+def test_partition_ids_keep_animals_together(raw_df):
+    partitions = out_of_core.partition_ids(raw_df["AnimalID"], 4)
+    assert set(partitions) <= {0, 1, 2, 3}
+    assert (raw_df.assign(partition=partitions).groupby("AnimalID")["partition"].nunique() == 1).all()
+
+
+def test_out_of_core_matches_in_memory(raw_df, tmp_path):
+    raw_path = str(tmp_path / "raw.csv")
+    raw_df.to_csv(raw_path, index=False)
+
+    expected = process_data(raw_path)
+    paths = out_of_core.preprocess_data_out_of_core(raw_path, str(tmp_path / "processed"), n_partitions=4, chunksize=50)
+
+    for name, expected_frame in zip(out_of_core.OUTPUT_NAMES, expected):
+        result = out_of_core.read_partitioned_output(paths[name])
+        assert list(result.columns) == list(expected_frame.columns)
+        pd.testing.assert_frame_equal(_sorted(result), _sorted(expected_frame))
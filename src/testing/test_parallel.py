@@ -0,0 +1,22 @@
+import pandas as pd
+
+import parallel
+from data_processing import preprocess_data
+
+
+def _as_text(frame):
+    return frame.astype(object).where(frame.notna(), "<missing>").astype(str)
+
+
+def test_ipc_round_trip(raw_df, tmp_path):
+    path = parallel.write_ipc(raw_df, str(tmp_path / "raw.arrow"))
+    pd.testing.assert_frame_equal(parallel.read_ipc(path), raw_df)
+
+
+def test_parallel_matches_sequential(raw_df):
+    expected = preprocess_data(raw_df.copy())
+    result = parallel.preprocess_data_parallel(raw_df, n_workers=2, n_shards=3)
+
+    assert len(result) == len(expected)
+    for result_frame, expected_frame in zip(result, expected):
+        pd.testing.assert_frame_equal(_as_text(result_frame), _as_text(expected_frame))
@@ -0,0 +1,107 @@
+import importlib
+import time
+
+import pandas as pd
+import pytest
+
+import pipeline_dag
+from data_processing import preprocess_data
+
+
+def _toy_dag(calls):
+    def step(name, seconds):
+        def run(*args):
+            calls.append(name)
+            time.sleep(seconds)
+            return sum(args)
+        return run
+
+    dag = pipeline_dag.PipelineDAG()
+    dag.add_stage("a", step("a", 0.05), inputs=["x"])
+    dag.add_stage("slow", step("slow", 0.3), inputs=["a"])
+    dag.add_stage("fast", step("fast", 0.3), inputs=["a"])
+    dag.add_stage("total", step("total", 0.05), inputs=["slow", "fast", "y"])
+    return dag
+
+
+def test_independent_stages_run_concurrently_and_are_cached(tmp_path):
+    calls = []
+    dag = _toy_dag(calls)
+
+    values = dag.run({"x": 1, "y": 10}, cache_dir=str(tmp_path), max_workers=2)
+
+    assert values["total"] == 12
+    # slow and fast both started before the other finished
+    timings = dag.report.set_index("stage")
+    ends = timings["start"] + timings["seconds"]
+    assert timings.loc["slow", "start"] < ends["fast"] and timings.loc["fast", "start"] < ends["slow"]
+    assert dag.critical_path[0] == "a" and dag.critical_path[-1] == "total" and len(dag.critical_path) == 3
+    assert set(dag.report["status"]) == {"ran"}
+
+    # Everything is up to date; only the requested output is loaded
+    calls.clear()
+    assert dag.run({"x": 1, "y": 10}, cache_dir=str(tmp_path))["total"] == 12
+    assert calls == []
+    assert dag.report.set_index("stage")["status"].to_dict() == {"a": "cached", "slow": "cached", "fast": "cached", "total": "loaded"}
+
+    # A changed input only reruns the stages that read it
+    assert dag.run({"x": 1, "y": 20}, cache_dir=str(tmp_path))["total"] == 22
+    assert calls == ["total"]
+
+
+def test_editing_a_called_module_reruns_the_stage(tmp_path, monkeypatch):
+    module_dir = tmp_path / "modules"
+    module_dir.mkdir()
+    monkeypatch.syspath_prepend(str(module_dir))
+    (module_dir / "dag_callee.py").write_text("def double(x):\n    return 2 * x\n")
+    callee = importlib.import_module("dag_callee")
+
+    def stage(x):
+        return callee.double(x)
+
+    dag = pipeline_dag.PipelineDAG()
+    dag.add_stage("double", stage, inputs=["x"], modules=["dag_callee"])
+    cache_dir = str(tmp_path / "cache")
+    assert dag.run({"x": 2}, cache_dir=cache_dir)["double"] == 4
+    dag.run({"x": 2}, cache_dir=cache_dir)
+    assert dag.report.set_index("stage").loc["double", "status"] == "loaded"
+
+    # The stage function is unchanged, the function it calls is not
+    (module_dir / "dag_callee.py").write_text("def double(x):\n    return x + x + 0\n")
+    importlib.reload(callee)
+    dag.run({"x": 2}, cache_dir=cache_dir)
+    assert dag.report.set_index("stage").loc["double", "status"] == "ran"
+
+
+def test_invalid_graphs_are_rejected():
+    dag = pipeline_dag.PipelineDAG()
+    dag.add_stage("a", lambda b: b, inputs=["b"])
+    with pytest.raises(ValueError):
+        dag.add_stage("other", lambda: 1, outputs=["a"])
+    with pytest.raises(ValueError):
+        dag.run()
+    dag.add_stage("b", lambda a: a, inputs=["a"])
+    with pytest.raises(ValueError):
+        dag.run()
+
+
+def test_shelter_pipeline_matches_preprocess_data(raw_df, tmp_path):
+    raw_data_path = str(tmp_path / "raw.csv")
+    raw_df.to_csv(raw_data_path, index=False)
+    dag = pipeline_dag.shelter_pipeline(models=("logistic_regression",), render=False)
+    assert "data_processing" in dag.stages["breed"].modules and "feature_engineering" in dag.stages["engineer"].modules
+
+    frames = ["processed", "animal_data", "breed", "breed_mix", "coat_color", "coat_patterns"]
+    targets = frames + ["export_files", "model_logistic_regression"]
+
+    values = dag.run({"raw_data_path": raw_data_path, "output_dir": str(tmp_path / "output")}, targets=targets, cache_dir=str(tmp_path / "cache"))
+
+    expected = preprocess_data(pd.read_csv(raw_data_path).pipe(pipeline_dag.data_processing.clean_raw_data))
+    for name, frame in zip(frames, expected):
+        pd.testing.assert_frame_equal(values[name], frame)
+    assert set(values["export_files"]) == {"animal_data", "breed", "breed_mix", "coat_color", "coat_patterns"}
+    assert hasattr(values["model_logistic_regression"], "predict")
+    assert dag.report.set_index("stage").loc["train_logistic_regression", "status"] == "ran"
+    # By default only the final outputs are loaded from the cache
+    values = dag.run({"raw_data_path": raw_data_path, "output_dir": str(tmp_path / "output")}, cache_dir=str(tmp_path / "cache"))
+    assert "raw" not in values and "model_logistic_regression" in values
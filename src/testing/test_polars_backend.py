@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+
+from data_processing import process_data
+
+pytest.importorskip("polars")
+
+
+@pytest.fixture
+def raw_csv(raw_df, tmp_path):
+    # Add the values the pandas pipeline treats specially: missing and unknown ages/sexes, breeds and colors
+    df = raw_df.copy()
+    df.loc[::17, "AgeuponOutcome"] = None
+    df.loc[::13, "SexuponOutcome"] = None
+    df.loc[::11, "Breed"] = "German Shepherd/Labrador Retriever"
+    df.loc[::7, "Color"] = "Orange Tabby/White"
+    df.loc[::19, "OutcomeType"] = "Missing"
+    path = tmp_path / "raw.csv"
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_polars_backend_matches_pandas(raw_csv):
+    expected = process_data(raw_csv)
+    result = process_data(raw_csv, backend="polars")
+
+    assert len(result) == len(expected)
+    for result_frame, expected_frame in zip(result, expected):
+        pd.testing.assert_frame_equal(result_frame, expected_frame, check_dtype=False)
+
+
+def test_unknown_backend(raw_csv):
+    with pytest.raises(ValueError):
+        process_data(raw_csv, backend="spark")
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import row_guard
+from data_processing import preprocess_data
+
+
+@pytest.fixture(autouse=True)
+def default_budget():
+    row_guard.reset()
+    yield
+    row_guard.configure(memory_budget_mb=None)
+    row_guard.reset()
+
+
+@pytest.mark.parametrize("how", ["inner", "left", "right", "outer"])
+def test_join_estimate_is_exact(how):
+    left = pd.DataFrame({"key": ["a", "a", "b", None, "c"], "x": range(5)})
+    right = pd.DataFrame({"key": ["a", "b", "b", None, "d"], "y": range(5)})
+    projected = row_guard.estimate_join_rows(left["key"], right["key"], how=how)
+    assert projected == len(pd.merge(left, right, on="key", how=how))
+
+
+def test_explode_estimate_is_exact():
+    series = pd.Series(["a/b", "c", None, "d/e/f"]).str.split("/")
+    assert row_guard.estimate_explode_rows(series) == len(series.explode())
+
+
+def test_budget_exceeded_raises(raw_df):
+    row_guard.configure(memory_budget_mb=0.001, on_exceed="raise")
+    with pytest.raises(row_guard.RowExplosionError):
+        preprocess_data(raw_df.copy())
+
+
+def test_chunked_merge_matches_merge():
+    rng = np.random.default_rng(1)
+    left = pd.DataFrame({"key": rng.integers(0, 50, 500), "x": range(500)})
+    right = pd.DataFrame({"key": rng.integers(10, 60, 300), "y": range(300)})
+    expected = pd.merge(left, right, on="key", how="left")
+
+    row_guard.configure(memory_budget_mb=0.01, on_exceed="chunk")
+    chunked = row_guard.guarded_merge(left, right, stage="test", on="key", how="left")
+
+    assert row_guard.fanout_report()["strategy"].iloc[-1].startswith("chunked")
+    pd.testing.assert_frame_equal(chunked, expected)
+
+
+def test_chunked_preprocess_matches_default(raw_df):
+    expected = preprocess_data(raw_df.copy())
+    report = row_guard.fanout_report()
+    assert (report["fanout"] > 0).all()
+    assert set(report["operation"]) == {"merge", "explode"}
+
+    row_guard.configure(memory_budget_mb=0.01, on_exceed="chunk")
+    chunked = preprocess_data(raw_df.copy())
+    for expected_frame, chunked_frame in zip(expected, chunked):
+        pd.testing.assert_frame_equal(chunked_frame, expected_frame)
+
+
+def test_fanout_records_are_capped():
+    series = pd.Series(["a/b"]).str.split("/")
+    for _ in range(row_guard.MAX_RECORDS + 5):
+        row_guard._record("test", "explode", 1, None, 2, 0, "explode")
+    row_guard.guarded_explode(series, stage="last")
+
+    report = row_guard.fanout_report()
+    assert len(report) == row_guard.MAX_RECORDS
+    assert report["stage"].iloc[-1] == "last"
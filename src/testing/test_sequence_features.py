@@ -0,0 +1,66 @@
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+
+import feature_engineering
+import model_prediction
+from data_processing import preprocess_data
+
+
+def test_sequence_features_follow_time_order():
+    # Two rows per visit, as in the merged frame, and visits out of order ("12/..." sorts before "2/..." as text)
+    df = pd.DataFrame({
+        "AnimalID": ["A1", "A1", "A1", "A1", "A2", "A2"],
+        "OutcomeType": ["Adoption", "Adoption", "Return_to_owner", "Return_to_owner", "Transfer", "Transfer"],
+        "DateTime": ["12/20/2015 01:00:00 PM"] * 2 + ["02/10/2015 09:30:00 AM"] * 2 + ["01/05/2016 10:00:00 AM"] * 2,
+        "CoatColor": ["Black", "White", "Black", "White", "Tan", "Brown"]
+    }, index=[10, 11, 12, 13, 14, 15])
+
+    data = feature_engineering.add_sequence_features(df)
+
+    assert data.index.tolist() == df.index.tolist()
+    assert data["VisitNumber"].tolist() == [2, 2, 1, 1, 1, 1]
+    assert data["DaysSincePrevious"].tolist() == [313, 313, -1, -1, -1, -1]
+    assert data["PreviousOutcome_Return_to_owner"].tolist() == [1, 1, 0, 0, 0, 0]
+    assert data["PreviousOutcome_Adoption"].sum() == 0
+    assert data["OutcomeMonth"].tolist() == [12, 12, 2, 2, 1, 1]
+    assert data["OutcomeWeekday"].tolist() == [6, 6, 1, 1, 1, 1]
+    assert data["OutcomeHour"].tolist() == [13, 13, 9, 9, 10, 10]
+
+
+def test_engineer_features_adds_sequence_features_on_request(raw_df):
+    processed_df = preprocess_data(raw_df.copy())[0].drop(columns=["Breed_broken"])
+
+    default = feature_engineering.engineer_features(processed_df)
+    with_sequence = feature_engineering.engineer_features(processed_df, sequence_features=True)
+
+    added = [column for column in with_sequence.columns if column not in default.columns]
+    assert added[:2] == ["VisitNumber", "DaysSincePrevious"]
+    assert len(added) == 2 + len(feature_engineering.OUTCOME_CODES) + 3
+    pd.testing.assert_frame_equal(with_sequence[default.columns], default)
+    assert not with_sequence[added].isna().any().any()
+    # Without the outcome column and a history (scoring data) the previous outcome is unknown, but the columns exist
+    unlabelled = feature_engineering.add_sequence_features(processed_df.drop(columns=["OutcomeType"]))
+    previous_columns = [column for column in with_sequence.columns if column.startswith("PreviousOutcome_")]
+    assert (unlabelled[previous_columns] == 0).all().all()
+
+
+def test_scoring_takes_previous_outcomes_from_history(raw_df):
+    processed_df = preprocess_data(raw_df.copy())[0].drop(columns=["Breed_broken"])
+    trained = feature_engineering.engineer_features(processed_df, sequence_features=True)
+    # Score the latest visit of each animal, with the earlier (labelled) visits as the history
+    later = (trained["VisitNumber"] == trained.groupby("AnimalID")["VisitNumber"].transform("max")).to_numpy()
+    history = processed_df[~later]
+    new = processed_df[later].drop(columns=["OutcomeType"])
+
+    scored = feature_engineering.engineer_features(new, sequence_features=True, history=history)
+
+    sequence_columns = ["VisitNumber", "DaysSincePrevious"] + [column for column in trained.columns if column.startswith("PreviousOutcome_")]
+    assert scored[sequence_columns].to_numpy().tolist() == trained.loc[later, sequence_columns].to_numpy().tolist()
+    assert scored[sequence_columns[2:]].to_numpy().sum() > 0
+
+    # Train on the history and score the new raw rows
+    train_df = feature_engineering.engineer_features(history, sequence_features=True).dropna(subset=["OutcomeType"])
+    model = LogisticRegression(max_iter=1000).fit(train_df.drop(columns=["AnimalID", "OutcomeType"]), train_df["OutcomeType"])
+    new_raw = raw_df[raw_df["AnimalID"].isin(new["AnimalID"])].drop(columns=["OutcomeType"])
+    predictions = model_prediction.predict_outcomes(model, new_raw, sequence_features=True, history=history)
+    assert len(predictions) == len(preprocess_data(new_raw.copy())[0])
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV
+
+import sk_transformers
+from data_processing import preprocess_data
+
+
+def test_stages_match_preprocess_data(raw_df):
+    processed_df = preprocess_data(raw_df.copy())[0].drop_duplicates(subset=["AnimalID", "DateTime"])
+    stages = sk_transformers.preprocessing_pipeline()[:2].fit(raw_df)
+
+    transformed = stages.transform(raw_df).merge(processed_df, on=["AnimalID", "DateTime"], suffixes=("", "_processed"))
+
+    assert len(transformed) == len(processed_df)
+    for column in ["AgeuponOutcome", "SexuponOutcome", "Sterilization"]:
+        pd.testing.assert_series_equal(transformed[column], transformed[column + "_processed"], check_names=False)
+
+
+def test_breed_and_coat_stages_match_preprocess_data(raw_df):
+    # preprocess_data gives one row per breed and color of the animal, and joins them on AnimalID only: compare
+    # animals with one visit, one listed breed and one color, where it gives one row per visit
+    single = raw_df[~raw_df["Breed"].str.contains("/") & ~raw_df["Color"].str.contains("/")]
+    single = single[~single["AnimalID"].duplicated(keep=False)]
+    processed_df = preprocess_data(single.copy())[0]
+    processed_df = processed_df[~processed_df.duplicated(subset=["AnimalID", "DateTime"], keep=False)]
+    processed_df = processed_df.assign(Mix=processed_df["Mix"].map({1.0: "Mix", 0.0: "Pure breed"}), CoatPattern=processed_df["CoatPattern"].replace("", np.nan))
+    stages = sk_transformers.preprocessing_pipeline()[:4].fit(single)
+
+    transformed = stages.transform(single).merge(processed_df, on=["AnimalID", "DateTime"], suffixes=("", "_processed"))
+
+    assert len(transformed) == len(processed_df) > 20
+    for column in ["BreedType", "Mix", "CoatColor", "CoatPattern"]:
+        pd.testing.assert_series_equal(transformed[column], transformed[column + "_processed"], check_names=False, check_dtype=False)
+
+
+def test_lookup_stages_must_define_the_lookup():
+    class NoLookup(sk_transformers._LookupTransformer):
+        keys = outputs = ["Breed"]
+
+    with pytest.raises(TypeError):
+        NoLookup()
+
+
+def test_unseen_values_keep_the_frozen_vocabulary(raw_df):
+    pipeline = sk_transformers.preprocessing_pipeline().fit(raw_df)
+    batch = raw_df.head(20).assign(AnimalType="Bird", Breed="Beagle Mix", AgeuponOutcome="5 months")
+
+    encoded = pipeline.transform(batch)
+
+    assert encoded.columns.tolist() == pipeline.transform(raw_df).columns.tolist()
+    assert encoded.index.equals(batch.index)
+    assert (encoded.filter(like="AnimalType_") == 0).all().all()
+    assert (encoded["Mix_Mix"] == 1).all()
+    # Unseen ages are bucketed, not learned: the fitted table is unchanged
+    assert len(pipeline["age"].table_) == raw_df["AgeuponOutcome"].nunique()
+
+
+def test_grid_search_reuses_cached_stages(raw_df, tmp_path, monkeypatch):
+    lookups = []
+    lookup = sk_transformers.AgeBucketer._lookup
+    monkeypatch.setattr(sk_transformers.AgeBucketer, "_lookup", lambda self, keys: lookups.append(len(keys)) or lookup(self, keys))
+    X, y = raw_df.drop(columns=["OutcomeType"]), raw_df["OutcomeType"]
+    grid = {"model__C": [0.1, 1.0, 10.0]}
+
+    def search(memory):
+        lookups.clear()
+        pipeline = sk_transformers.preprocessing_pipeline(LogisticRegression(max_iter=1000), memory=memory)
+        return GridSearchCV(pipeline, grid, cv=2).fit(X, y), len(lookups)
+
+    uncached, uncached_lookups = search(None)
+    cached, cached_lookups = search(str(tmp_path))
+
+    np.testing.assert_allclose(cached.cv_results_["mean_test_score"], uncached.cv_results_["mean_test_score"])
+    assert cached_lookups < uncached_lookups
+    # A second search over the same rows only fits the models
+    assert search(str(tmp_path))[1] == 0
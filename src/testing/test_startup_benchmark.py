@@ -0,0 +1,23 @@
+import pytest
+
+import startup_benchmark
+
+
+@pytest.mark.parametrize("module", ["model_prediction", "models", "viz", "incremental"])
+def test_entry_points_do_not_import_heavy_modules(module):
+    times = startup_benchmark.import_times(module)
+
+    assert module in times.loc[times["depth"] == 0, "name"].tolist()
+    assert startup_benchmark.heavy_modules(times) == []
+
+
+def test_benchmark_startup():
+    result = startup_benchmark.benchmark_startup("model_prediction", repeats=1)
+    assert result["heavy_modules"] == []
+    assert list(result["slowest"].columns) == ["name", "depth", "self_ms", "cumulative_ms"]
+
+    # sk_transformers imports sklearn, so the check fails whatever the budget
+    with pytest.raises(SystemExit):
+        startup_benchmark.main(["--module", "sk_transformers", "--repeats", "1", "--budget-ms", "1e9"])
+    with pytest.raises(RuntimeError):
+        startup_benchmark.import_times("no_such_module")
@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+
+import out_of_core
+import tableau_data
+from data_processing import preprocess_data
+
+
+def _sorted(frame):
+    frame = frame.astype(object).where(frame.notna(), "<missing>").astype(str)
+    return frame.sort_values(by=list(frame.columns), ignore_index=True)
+
+
+def test_shape_for_tableau(raw_df):
+    _, animal_data, breed, breed_mix, coat_color, coat_patterns = preprocess_data(raw_df.copy())
+    breed_before = breed.copy()
+
+    shaped = tableau_data.shape_for_tableau(animal_data, breed, breed_mix, coat_color, coat_patterns)
+
+    assert list(shaped["animal_data"].columns) == ["AnimalID", "OutcomeType", "AnimalType", "AgeGroup", "Sex", "Sterilization"]
+    assert list(shaped["breed"].columns) == ["AnimalID", "Breed", "BreedType"]
+    assert shaped["breed"]["Breed"].notna().all()
+    assert set(shaped["breed_mix"]["BreedMix"]) <= {"Mixed Breed", "Pure Breed"}
+    assert len(shaped["breed_mix"]) == breed_mix["Mix"].isin(["Mix", "Pure breed"]).sum()
+    assert not shaped["coat_color"].isna().any().any()
+    assert list(shaped["coat_patterns"].columns) == ["AnimalID", "CoatPattern"]
+    # The inputs are not modified
+    pd.testing.assert_frame_equal(breed, breed_before)
+
+
+def test_stage_cache_matches_frames(raw_df, tmp_path):
+    raw_path = str(tmp_path / "raw.csv")
+    raw_df.to_csv(raw_path, index=False)
+    out_of_core.preprocess_data_out_of_core(raw_path, str(tmp_path / "processed"), n_partitions=3)
+
+    from_cache = tableau_data.export_tableau_data(str(tmp_path / "from_cache"), cache_dir=str(tmp_path / "processed"))
+    from_raw = tableau_data.main(["--raw-data", raw_path, "--output-dir", str(tmp_path / "from_raw")])
+
+    assert sorted(from_cache) == sorted(tableau_data.TABLEAU_COLUMNS)
+    for name in tableau_data.TABLEAU_COLUMNS:
+        pd.testing.assert_frame_equal(_sorted(pd.read_parquet(from_cache[name])), _sorted(pd.read_parquet(from_raw[name])))
+
+
+def test_excel_workbooks(raw_df, tmp_path):
+    outputs = tableau_data.export_tableau_data(str(tmp_path), fmt="excel", frames=preprocess_data(raw_df.copy()))
+
+    assert sorted(outputs) == sorted(tableau_data.EXCEL_WORKBOOKS)
+    assert all(os.path.getsize(path) > 0 for path in outputs.values())
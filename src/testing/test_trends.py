@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+import trends
+from data_processing import preprocess_data
+
+
+def test_parse_datetime_handles_export_and_iso_formats():
+    values = pd.Series(["08/05/2014 07:52:00 PM", "2015-01-02 03:04:05", None])
+
+    parsed = trends.parse_datetime(values)
+
+    assert parsed.tolist()[:2] == [pd.Timestamp("2014-08-05 19:52:00"), pd.Timestamp("2015-01-02 03:04:05")]
+    assert pd.isna(parsed[2])
+    assert trends.parse_datetime(parsed) is parsed
+
+
+def test_monthly_counts_match_groupby(raw_df):
+    _, animal_data, _, _, _, _ = preprocess_data(raw_df.copy())
+
+    monthly = trends.resample_counts(trends.daily_outcome_counts(animal_data), "MS")
+
+    months = trends.parse_datetime(animal_data["DateTime"]).dt.to_period("M").dt.start_time
+    expected = animal_data.groupby(["AnimalType", months, "OutcomeType"]).size()
+    observed = monthly.stack()
+    assert observed[observed > 0].to_dict() == expected.to_dict()
+    assert monthly.to_numpy().sum() == animal_data["OutcomeType"].notna().sum()
+    np.testing.assert_allclose(trends.outcome_rates(monthly).sum(axis=1, min_count=1).dropna(), 1)
+
+
+def test_incremental_update_matches_full_history(raw_df):
+    _, animal_data, _, _, _, _ = preprocess_data(raw_df.copy())
+    timestamps = trends.parse_datetime(animal_data["DateTime"])
+    cutoff = timestamps.sort_values().iloc[len(animal_data) // 2]
+
+    daily = trends.daily_outcome_counts(animal_data[timestamps <= cutoff])
+    # New batches may repeat rows that were already counted
+    daily = trends.update_daily_counts(daily, animal_data[timestamps <= cutoff + pd.Timedelta(days=30)])
+    daily = trends.update_daily_counts(daily, animal_data)
+
+    pd.testing.assert_frame_equal(daily, trends.daily_outcome_counts(animal_data))
+    assert daily.attrs["through"] == timestamps.max()
+
+
+def test_incremental_update_counts_late_rows(raw_df, caplog):
+    _, animal_data, _, _, _, _ = preprocess_data(raw_df.copy())
+    timestamps = trends.parse_datetime(animal_data["DateTime"])
+    # An outcome exported after later days were counted, and a second outcome at the latest counted timestamp
+    late = timestamps.sort_values().index[len(animal_data) // 2]
+    watermark = animal_data.loc[[timestamps.idxmax()]].assign(AnimalID="A_LATE")
+    full = pd.concat([animal_data, watermark], ignore_index=True)
+
+    daily = trends.daily_outcome_counts(animal_data.drop(index=late))
+    daily = trends.update_daily_counts(daily, full)
+
+    pd.testing.assert_frame_equal(daily, trends.daily_outcome_counts(full))
+    assert trends.update_daily_counts(daily, full) is daily
+
+    # Without AnimalID, rows at or before the latest counted timestamp are skipped and logged
+    without_ids = trends.daily_outcome_counts(animal_data.drop(index=late).drop(columns="AnimalID"))
+    with caplog.at_level("WARNING", logger="trends"):
+        assert trends.update_daily_counts(without_ids, full.drop(columns="AnimalID")) is without_ids
+    assert "Skipped {} rows".format(len(full)) in caplog.text
+
+
+def test_rolling_counts_per_segment():
+    df = pd.DataFrame({
+        "AnimalType": ["Dog", "Dog", "Dog", "Cat"],
+        "OutcomeType": ["Adoption", "Transfer", "Adoption", "Adoption"],
+        "DateTime": ["01/01/2015 10:00:00 AM", "01/03/2015 10:00:00 AM", "01/04/2015 10:00:00 AM", "01/04/2015 10:00:00 AM"]
+    })
+
+    rolling = trends.rolling_outcome_counts(trends.daily_outcome_counts(df), window=3)
+
+    assert rolling.loc["Dog", "Adoption"].tolist() == [1, 1, 1, 1]
+    assert rolling.loc["Dog", "Transfer"].tolist() == [0, 0, 1, 1]
+    assert rolling.loc["Cat", "Adoption"].tolist() == [1]
+    assert trends.outcome_rates(rolling).loc[("Dog", pd.Timestamp("2015-01-04")), "Adoption"] == 0.5
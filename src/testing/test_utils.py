@@ -0,0 +1,81 @@
+import importlib
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+
+
+def test_distinct_counts_exact():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "AnimalType": rng.choice(["Dog", "Cat", None], 5000),
+        "CoatColor": rng.choice(["Black", "White", "Brown"], 5000),
+        "AnimalID": rng.choice(["A{}".format(i) for i in range(800)] + [None], 5000)
+    })
+
+    by_type = utils.distinct_counts(df["AnimalType"], df["AnimalID"])
+    by_type_and_color = utils.distinct_counts(df[["AnimalType", "CoatColor"]], df["AnimalID"])
+
+    expected = df.groupby("AnimalType", dropna=False, sort=False)["AnimalID"].nunique()
+    assert by_type.tolist() == expected.tolist()
+    assert by_type.index.equals(expected.index)
+    expected = df.groupby(["AnimalType", "CoatColor"], dropna=False, sort=False)["AnimalID"].nunique()
+    assert by_type_and_color.tolist() == expected.tolist()
+    assert by_type_and_color.index.names == ["AnimalType", "CoatColor"]
+
+
+def test_distinct_counts_hll():
+    rng = np.random.default_rng(1)
+    groups = rng.choice(["small", "large"], 200_000, p=[0.01, 0.99])
+    ids = np.where(groups == "small", rng.integers(0, 50, 200_000), rng.integers(0, 100_000, 200_000))
+
+    exact = utils.distinct_counts(groups, ids)
+    estimate = utils.distinct_counts(groups, ids, method="hll", precision=12)
+
+    # About 1.6% standard error at precision 12; small counts are exact through linear counting
+    assert estimate["small"] == exact["small"]
+    assert abs(estimate["large"] / exact["large"] - 1) < 0.05
+    with pytest.raises(ValueError):
+        utils.distinct_counts(groups, ids, method="sample")
+
+
+def test_hll_sketches_merge():
+    ids = np.array(["A{}".format(i) for i in range(20_000)], dtype=object)
+    first = utils.hll_sketches(np.zeros(12_000, dtype=int), ids[:12_000], n_groups=1)
+    second = utils.hll_sketches(np.zeros(12_000, dtype=int), ids[8_000:], n_groups=1)
+
+    merged = utils.hll_estimate(np.maximum(first, second))[0]
+
+    assert abs(merged / 20_000 - 1) < 0.05
+
+
+def test_first_occurrences():
+    codes = np.array([3, 1, 3, 2, 1, 2])
+
+    assert utils.first_occurrences(codes).tolist() == [True, True, False, True, False, False]
+    assert utils.first_occurrences(codes, mask=codes != 1).sum() == 2
+
+
+def test_lazy_import():
+    sys.modules.pop("colorsys", None)
+    imported = []
+    colorsys = utils.lazy_import("colorsys", on_import=imported.append)
+    assert "colorsys" not in sys.modules and "not imported yet" in repr(colorsys)
+
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    colorsys.ONE_THIRD
+    assert imported == [sys.modules["colorsys"]]
+
+
+def test_source_version_changes_with_the_source(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / "versioned_module.py").write_text("VALUE = 1\n")
+    module = importlib.import_module("versioned_module")
+    version = utils.source_version(module, "utils")
+
+    assert utils.source_version("versioned_module", utils) == version
+    (tmp_path / "versioned_module.py").write_text("VALUE = 2\n")
+    assert utils.source_version(module, "utils") != version
@@ -0,0 +1,173 @@
+import gc
+import os
+import subprocess
+import sys
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import pandas as pd
+import pytest
+
+import viz
+from data_processing import preprocess_data
+
+
+@pytest.fixture
+def frames(raw_df):
+    return preprocess_data(raw_df.copy())
+
+
+def _merge(animal_data, other):
+    return pd.merge(left=animal_data, right=other, on="AnimalID", how="left")
+
+
+def test_cube_slices_match_individual_frames(frames):
+    processed_df, animal_data, breed, breed_mix, coat_color, coat_patterns = frames
+    cube = viz.build_cube(processed_df, breed, breed_mix, coat_color, coat_patterns)
+
+    # Row counts of animal_data and of each merge the charts used to be drawn from
+    for column in ["OutcomeType", "AnimalType", "AgeuponOutcome", "SexuponOutcome", "Sterilization"]:
+        pd.testing.assert_series_equal(
+            viz.cube_counts(cube, column).sort_index(), animal_data[column].value_counts().sort_index(),
+            check_names=False, check_dtype=False
+        )
+    dogs = _merge(animal_data, breed).query("AnimalType == 'Dog'")
+    pd.testing.assert_series_equal(
+        viz.cube_counts(cube, "Breed_broken", "breed_rows", AnimalType="Dog").sort_index(), dogs["Breed_broken"].value_counts().sort_index(),
+        check_names=False, check_dtype=False
+    )
+    assert viz.cube_counts(cube, measure="breed_rows", AnimalType="Dog") == len(dogs)
+    assert viz.cube_counts(cube, measure="mix_rows", Mix="Mix") == (_merge(animal_data, breed_mix)["Mix"] == "Mix").sum()
+    assert viz.cube_counts(cube, measure="coat_rows") == len(_merge(animal_data, coat_color))
+    assert viz.cube_counts(cube, measure="pattern_rows") == len(_merge(animal_data, coat_patterns))
+
+    # Distinct animals per type, per coat color and with a known coat color
+    cats = _merge(animal_data, coat_color).query("AnimalType == 'Cat'")
+    assert viz.cube_counts(cube, measure="type_animals", AnimalType="Cat") == cats["AnimalID"].nunique()
+    pd.testing.assert_series_equal(
+        viz.cube_counts(cube, "CoatColor", "coat_color_animals", AnimalType="Cat").sort_index(), cats.groupby("CoatColor")["AnimalID"].nunique(),
+        check_names=False, check_dtype=False
+    )
+    assert viz.cube_counts(cube, measure="coat_color_known_animals", AnimalType="Cat") == cats.dropna(subset=["CoatColor"])["AnimalID"].nunique()
+
+
+def test_top_breeds_count_distinct_animals(frames):
+    processed_df, animal_data, breed, breed_mix, coat_color, coat_patterns = frames
+    cube = viz.build_cube(processed_df, breed, breed_mix, coat_color, coat_patterns)
+    dogs = _merge(animal_data, breed).query("AnimalType == 'Dog'")
+
+    top_dogs, dog_counts, total_dogs, missing_dogs = viz.get_top_breed(cube, "Dog", top_n=3)
+
+    expected = dogs.groupby("Breed_broken")["AnimalID"].nunique()
+    assert dog_counts.tolist() == expected.sort_values(ascending=False).head(3).tolist()
+    assert dog_counts.to_dict() == expected[top_dogs].to_dict()
+    assert total_dogs == dogs["AnimalID"].nunique()
+    assert missing_dogs == total_dogs - dogs.dropna(subset=["Breed_broken"])["AnimalID"].nunique()
+
+
+def test_top_helpers_accept_frames_or_cube(frames):
+    processed_df, animal_data, breed, breed_mix, coat_color, coat_patterns = frames
+    cube = viz.build_cube(processed_df, breed, breed_mix, coat_color, coat_patterns)
+    merged = _merge(animal_data, breed)
+    merged_before = merged.copy()
+
+    from_frame = viz.get_top_breed(merged, "Dog", top_n=3)
+    from_cube = viz.get_top_breed(cube, "Dog", top_n=3)
+
+    assert from_frame[0] == from_cube[0]
+    pd.testing.assert_series_equal(from_frame[1], from_cube[1])
+    assert from_frame[2:] == from_cube[2:]
+    # The caller's frame is not modified
+    pd.testing.assert_frame_equal(merged, merged_before)
+
+
+def test_breed_display(frames):
+    _, animal_data, breed, _, _, _ = frames
+    merged = _merge(animal_data, breed)
+    merged_before = merged.copy()
+
+    display = viz.breed_display(merged)
+
+    expected = [
+        merged.loc[i, "BreedType"] if merged.loc[i, "AnimalType"] == "Cat" else merged.loc[i, "Breed_broken"]
+        for i in range(len(merged))
+    ]
+    pd.testing.assert_series_equal(display, pd.Series(expected, index=merged.index, name="BreedDisplay"))
+    pd.testing.assert_frame_equal(merged, merged_before)
+
+
+def test_type_summaries_are_shared_and_released(frames):
+    processed_df, animal_data, breed, breed_mix, coat_color, coat_patterns = frames
+    cube = viz.build_cube(processed_df, breed, breed_mix, coat_color, coat_patterns)
+    cube_id = id(cube)
+
+    viz.get_top_coat_colors(cube, "Cat")
+    viz.get_top_coat_colors(cube, "Dog")
+    viz.get_top_breed(cube, "Dog")
+
+    assert len([key for key in viz._TYPE_SUMMARIES if key[0] == cube_id]) == 2
+    del cube
+    gc.collect()
+    assert not [key for key in viz._TYPE_SUMMARIES if key[0] == cube_id]
+
+
+def test_charts_render_from_cube(frames, monkeypatch):
+    processed_df, animal_data, breed, breed_mix, coat_color, coat_patterns = frames
+    cube = viz.build_cube(processed_df, breed, breed_mix, coat_color, coat_patterns)
+    monkeypatch.setattr(viz.plt, "show", lambda: viz.plt.close("all"))
+
+    for chart in [viz.viz_outcometype, viz.viz_animal_type, viz.viz_age, viz.viz_sex, viz.viz_sterilization,
+                  viz.viz_breed, viz.viz_breed_mix, viz.viz_coatcolor, viz.viz_coatpattern]:
+        chart(home_dir="", processed_df=cube)
+
+
+def test_save_path_writes_the_figures(frames, tmp_path):
+    processed_df, animal_data, breed, breed_mix, coat_color, coat_patterns = frames
+    cube = viz.build_cube(processed_df, breed, breed_mix, coat_color, coat_patterns)
+
+    assert viz.viz_sex(None, cube, save_path=str(tmp_path / "sex.png")) == [str(tmp_path / "sex.png")]
+    assert viz.viz_animal_type(None, cube, save_path=str(tmp_path / "animal_type.svg")) == [
+        str(tmp_path / "animal_type_1.svg"), str(tmp_path / "animal_type_2.svg")
+    ]
+    assert all((tmp_path / name).stat().st_size > 0 for name in ["sex.png", "animal_type_1.svg", "animal_type_2.svg"])
+
+
+def test_render_chart_pack(frames, tmp_path):
+    processed_df, animal_data, breed, breed_mix, coat_color, coat_patterns = frames
+    cube = viz.build_cube(processed_df, breed, breed_mix, coat_color, coat_patterns)
+    backend = viz.plt.get_backend()
+
+    in_process = viz.render_chart_pack(cube, str(tmp_path / "in_process"), n_workers=0, charts=["age", "breed"])
+    pooled = viz.render_chart_pack(cube, str(tmp_path / "pooled"), fmt="svg", n_workers=2)
+
+    assert sorted(in_process) == ["age", "breed"]
+    assert sorted(pooled) == sorted(viz.CHART_PACK)
+    assert all(os.path.getsize(path) > 0 for paths in pooled.values() for path in paths)
+    assert viz.plt.get_backend() == backend
+    with pytest.raises(ValueError):
+        viz.render_chart_pack(cube, str(tmp_path), fmt="jpg")
+
+
+def test_slice_cube_keeps_chart_counts(frames):
+    processed_df, animal_data, breed, breed_mix, coat_color, coat_patterns = frames
+    cube = viz.build_cube(processed_df, breed, breed_mix, coat_color, coat_patterns)
+
+    cube_slice = viz.slice_cube(cube, ["AnimalType", "CoatColor"])
+
+    assert viz.get_top_coat_colors(cube_slice, "Dog")[0] == viz.get_top_coat_colors(cube, "Dog")[0]
+    pd.testing.assert_series_equal(viz.get_top_coat_colors(cube_slice, "Dog")[1], viz.get_top_coat_colors(cube, "Dog")[1])
+    assert viz.get_top_coat_colors(cube_slice, "Dog")[2:] == viz.get_top_coat_colors(cube, "Dog")[2:]
+
+
+def test_seaborn_is_imported_and_styled_only_when_used():
+    # A fresh interpreter, as matplotlib and seaborn are already imported here
+    script = (
+        "import sys, viz; viz.plt.switch_backend('Agg'); assert 'seaborn' not in sys.modules; "
+        "viz.sns.despine; assert viz.plt.rcParams['axes.grid']"
+    )
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
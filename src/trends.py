@@ -0,0 +1,239 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+
+logger = logging.getLogger(__name__)
+
+
+# Format of 'DateTime' in the Austin Animal Center exports, e.g. "08/05/2014 07:52:00 AM"
+DATETIME_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+
+
+def parse_datetime(
+    values: pd.Series,
+    format: str = DATETIME_FORMAT
+) -> pd.Series:
+    """
+    Parses 'DateTime' values into `datetime64`.
+
+    Values are parsed with the explicit `format`, which is vectorized. Values that do not match it (e.g. ISO
+    timestamps) fall back to pandas' general parser. Values that are already `datetime64` are returned unchanged,
+    so parsing once upstream is enough.
+
+    Parameters:
+    values (pd.Series): The 'DateTime' column.
+    format (str, optional): The expected strftime format. Defaults to `DATETIME_FORMAT`.
+
+    Returns:
+    pd.Series: The timestamps; unparseable values are NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+
+    parsed = pd.to_datetime(values, format=format, errors="coerce")
+    unparsed = parsed.isna() & values.notna()
+    if unparsed.any():
+        parsed[unparsed] = pd.to_datetime(values[unparsed], errors="coerce")
+
+    return parsed
+
+
+def _segments(segment) -> list:
+    return [segment] if isinstance(segment, str) else list(segment)
+
+
+def _row_keys(df: pd.DataFrame, timestamps: pd.Series, AnimalID: str) -> np.ndarray:
+    # One 64-bit hash per (animal, timestamp) outcome row
+    keys = pd.DataFrame({AnimalID: df[AnimalID].to_numpy(), "timestamp": timestamps.to_numpy()})
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def _fill_periods(counts: pd.DataFrame, segments: list, freq: str, datetime_column: str) -> pd.DataFrame:
+    # Adds the periods without outcomes, as zero rows, between the first and last period of each segment
+    frames = []
+    for key, frame in counts.groupby(level=segments, sort=True):
+        periods = frame.index.get_level_values(datetime_column)
+        full_range = pd.date_range(periods.min(), periods.max(), freq=freq, name=datetime_column)
+        frame = frame.droplevel(segments).reindex(full_range, fill_value=0)
+        key = key if isinstance(key, tuple) else (key,)
+        frames.append(pd.concat({key: frame}, names=segments))
+    if not frames:
+        return counts
+
+    return pd.concat(frames)
+
+
+@instrumentation.instrument
+def daily_outcome_counts(
+    df: pd.DataFrame,
+    segment="AnimalType",
+    dep_var: str = r"OutcomeType",
+    datetime_column: str = r"DateTime",
+    AnimalID: str = r"AnimalID"
+) -> pd.DataFrame:
+    """
+    Counts outcomes per segment and day.
+
+    This is the base aggregate of the trend series. 'DateTime' is parsed once (see `parse_datetime`), every outcome
+    is one-hot encoded and the rows are summed in a single groupby. Days without outcomes are filled with zeros.
+    The latest timestamp counted is kept in `attrs["through"]`, and the (AnimalID, DateTime) rows counted in
+    `attrs["counted"]`, for `update_daily_counts`.
+
+    Parameters:
+    df (pd.DataFrame): Outcome rows with the segment, `dep_var` and `datetime_column` columns, e.g. the animal_data frame returned by `data_processing.preprocess_data`.
+    segment (str or list, optional): Column(s) to segment by. Defaults to "AnimalType".
+    dep_var (str, optional): The name of the outcome column. Defaults to 'OutcomeType'.
+    datetime_column (str, optional): The name of the timestamp column. Defaults to 'DateTime'.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID". Without it, no rows are recorded as counted.
+
+    Returns:
+    pd.DataFrame: One column per outcome, indexed by the segment(s) and the day.
+
+    Example usage:
+    processed_df, animal_data, breed, breed_mix, coat_color, coat_patterns = data_processing.process_data("/path/to/data.csv")
+    daily = daily_outcome_counts(animal_data)
+    monthly_rates = outcome_rates(resample_counts(daily, "MS"))
+    """
+    segments = _segments(segment)
+    timestamps = parse_datetime(df[datetime_column])
+    rows = df[segments].assign(**{datetime_column: timestamps.dt.normalize()})
+    outcomes = pd.get_dummies(df[dep_var], dtype="int64")
+    outcomes.columns.name = dep_var
+
+    counts = outcomes.groupby([rows[column] for column in segments + [datetime_column]]).sum()
+    counts = _fill_periods(counts, segments, "D", datetime_column)
+    counts.attrs["through"] = timestamps.max()
+    if AnimalID in df.columns:
+        # Kept as bytes, which pandas copies and compares cheaply when it carries `attrs` over
+        counts.attrs["counted"] = np.unique(_row_keys(df, timestamps, AnimalID)).tobytes()
+
+    return counts
+
+
+@instrumentation.instrument
+def update_daily_counts(
+    daily: pd.DataFrame,
+    new_df: pd.DataFrame,
+    segment="AnimalType",
+    dep_var: str = r"OutcomeType",
+    datetime_column: str = r"DateTime",
+    AnimalID: str = r"AnimalID"
+) -> pd.DataFrame:
+    """
+    Adds new outcome rows to the daily counts without recomputing the history.
+
+    Rows whose (AnimalID, DateTime) was already counted are skipped, so batches may repeat earlier rows, and late
+    rows (exported after later days were counted) are still added to their day. Without `AnimalID` columns, only
+    rows after `daily.attrs["through"]` are counted and the rows at or before it are logged as skipped. The daily
+    counts are added to the existing days, new days are appended, and new outcome types become new columns.
+
+    Parameters:
+    daily (pd.DataFrame): Counts returned by `daily_outcome_counts` or a previous `update_daily_counts`.
+    new_df (pd.DataFrame): The newly arrived outcome rows, with the same columns as the original input.
+    segment (str or list, optional): Column(s) to segment by, as for `daily`. Defaults to "AnimalType".
+    dep_var (str, optional): The name of the outcome column. Defaults to 'OutcomeType'.
+    datetime_column (str, optional): The name of the timestamp column. Defaults to 'DateTime'.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+
+    Returns:
+    pd.DataFrame: The updated daily counts.
+
+    Example usage:
+    daily = update_daily_counts(daily, todays_outcomes)
+    """
+    through = daily.attrs.get("through")
+    counted = daily.attrs.get("counted")
+    timestamps = parse_datetime(new_df[datetime_column])
+    if counted is not None and AnimalID in new_df.columns:
+        counted = np.frombuffer(counted, dtype=np.uint64)
+        new_df = new_df[~np.isin(_row_keys(new_df, timestamps, AnimalID), counted)]
+    else:
+        counted = None
+        if through is not None and pd.notna(through):
+            late = (timestamps <= through).to_numpy()
+            if late.any():
+                logger.warning("Skipped %d rows at or before %s, which cannot be told apart from counted rows without %s", late.sum(), through, AnimalID)
+            new_df = new_df[~late]
+    if new_df.empty:
+        return daily
+
+    new_counts = daily_outcome_counts(new_df, segment=segment, dep_var=dep_var, datetime_column=datetime_column, AnimalID=AnimalID)
+    counts = daily.add(new_counts, fill_value=0).fillna(0).astype("int64")
+    counts = _fill_periods(counts, _segments(segment), "D", datetime_column)
+    counts.columns.name = dep_var
+    counts.attrs = {"through": max(ts for ts in [through, new_counts.attrs["through"]] if ts is not None and pd.notna(ts))}
+    if counted is not None:
+        counts.attrs["counted"] = np.union1d(counted, np.frombuffer(new_counts.attrs["counted"], dtype=np.uint64)).tobytes()
+
+    return counts
+
+
+def resample_counts(
+    daily: pd.DataFrame,
+    freq: str = "MS",
+    datetime_column: str = r"DateTime"
+) -> pd.DataFrame:
+    """
+    Aggregates daily counts into weekly, monthly or other periods.
+
+    Parameters:
+    daily (pd.DataFrame): Counts returned by `daily_outcome_counts` or `update_daily_counts`.
+    freq (str, optional): A pandas offset alias, e.g. "W-SUN" (weeks ending on Sunday) or "MS" (months). Defaults to "MS".
+    datetime_column (str, optional): The name of the day level of the index. Defaults to 'DateTime'.
+
+    Returns:
+    pd.DataFrame: The counts per segment and period, labelled as `DataFrame.resample` labels them, with empty periods as zeros.
+    """
+    segments = [level for level in daily.index.names if level != datetime_column]
+    counts = daily.groupby(segments + [pd.Grouper(level=datetime_column, freq=freq)]).sum()
+
+    return _fill_periods(counts, segments, freq, datetime_column)
+
+
+def outcome_rates(counts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts outcome counts into the share of each outcome per row.
+
+    Parameters:
+    counts (pd.DataFrame): Counts returned by `daily_outcome_counts`, `resample_counts` or `rolling_outcome_counts`.
+
+    Returns:
+    pd.DataFrame: The outcome rates; rows without outcomes are NaN.
+    """
+    totals = counts.sum(axis=1)
+
+    return counts.div(totals.where(totals > 0), axis=0)
+
+
+def rolling_outcome_counts(
+    counts: pd.DataFrame,
+    window: int,
+    datetime_column: str = r"DateTime"
+) -> pd.DataFrame:
+    """
+    Sums outcome counts over a trailing window of periods, separately per segment.
+
+    The counts are gap-filled, so a window of 30 periods over daily counts covers 30 calendar days. The first periods
+    of each segment sum over the periods available.
+
+    Parameters:
+    counts (pd.DataFrame): Counts returned by `daily_outcome_counts`, `update_daily_counts` or `resample_counts`.
+    window (int): Number of periods in the window.
+    datetime_column (str, optional): The name of the period level of the index. Defaults to 'DateTime'.
+
+    Returns:
+    pd.DataFrame: The rolling counts, with the index of `counts`.
+
+    Example usage:
+    rates_30d = outcome_rates(rolling_outcome_counts(daily, 30))
+    """
+    segments = [level for level in counts.index.names if level != datetime_column]
+    rolled = counts.groupby(level=segments, sort=False).rolling(window, min_periods=1).sum()
+    # groupby().rolling() prepends the group keys to the index
+    rolled = rolled.droplevel(list(range(len(segments))))
+
+    return rolled.reindex(counts.index).astype(counts.dtypes)
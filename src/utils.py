@@ -1,6 +1,13 @@
+import hashlib
+import importlib
+import importlib.util
+import threading
 import time
 import re
 
+import numpy as np
+import pandas as pd
+
 def calculate_elapsed_time(start_time):
     """
     Calculate elapsed time since a given start time.
@@ -71,3 +78,249 @@ def clean_feature_name(name):
     
     return cleaned_name
 
+
+class LazyModule:
+    """
+    Stand-in for a module that is only imported on first attribute access.
+
+    Module-level `plt = lazy_import("matplotlib.pyplot")` keeps the code that
+    uses `plt.figure(...)` unchanged while importing the module costs nothing
+    until a function actually draws. Setting attributes (e.g. monkeypatching
+    in tests) sets them on the real module.
+
+    Args:
+        name (str): Module to import, e.g. "matplotlib.pyplot"
+        on_import (callable, optional): Called with the module once, right
+            after it is imported, e.g. to apply a plotting style
+    """
+
+    def __init__(self, name, on_import=None):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_on_import", on_import)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.RLock())
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module = importlib.import_module(self._name)
+                    object.__setattr__(self, "_module", module)
+                    if self._on_import is not None:
+                        self._on_import(module)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._load(), attribute, value)
+
+    def __delattr__(self, attribute):
+        delattr(self._load(), attribute)
+
+    def __repr__(self):
+        state = "imported" if self._module is not None else "not imported yet"
+        return "<lazy module {!r} ({})>".format(self._name, state)
+
+
+def lazy_import(name, on_import=None):
+    """
+    Import a module on first use instead of now, see `LazyModule`.
+
+    Args:
+        name (str): Module to import, e.g. "seaborn"
+        on_import (callable, optional): Called with the module right after it
+            is imported
+
+    Returns:
+        LazyModule: The stand-in for the module
+    """
+    return LazyModule(name, on_import=on_import)
+
+
+def source_version(*modules):
+    """
+    Hash the source files of modules, to tell when cached results of their code are stale.
+
+    Modules given by name are located without importing them.
+
+    Args:
+        *modules (module or str): Modules or module names, e.g. "feature_engineering"
+
+    Returns:
+        str: Hex digest of the module names and the contents of their source files
+    """
+    digest = hashlib.sha256()
+    for module in modules:
+        if isinstance(module, str):
+            name, path = module, importlib.util.find_spec(module).origin
+        else:
+            name, path = module.__name__, module.__file__
+        digest.update(name.encode())
+        with open(path, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def to_arrow_compatible(df):
+    """
+    Prepare a DataFrame for Arrow-based formats (Parquet, Arrow IPC).
+
+    Arrow columns hold a single type, so object columns mixing strings with
+    other Python objects (e.g. the float/str 'Mix' column) are written as
+    strings; missing values stay missing.
+
+    Args:
+        df (pd.DataFrame): DataFrame to convert
+
+    Returns:
+        pd.DataFrame: The same DataFrame if no column needed converting,
+            otherwise a shallow copy with the mixed columns cast to str
+    """
+    mixed_columns = []
+    for column in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[column], skipna=True) not in ("string", "empty"):
+            mixed_columns.append(column)
+    if not mixed_columns:
+        return df
+
+    df = df.copy(deep=False)
+    for column in mixed_columns:
+        df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+
+    return df
+
+
+def first_occurrences(codes, mask=None):
+    """
+    Flag the first row of each distinct key.
+
+    Summing the flags over any subset of rows that contains every row of a key
+    counts that key once, which makes distinct counts additive (e.g. across the
+    cells of an aggregate cube).
+
+    Args:
+        codes (np.ndarray): Integer key of each row
+        mask (np.ndarray, optional): Only rows where mask is True are considered
+
+    Returns:
+        np.ndarray: Boolean array, True on the first considered row of each key
+    """
+    positions = np.arange(len(codes)) if mask is None else np.flatnonzero(mask)
+    first = np.zeros(len(codes), dtype=bool)
+    first[positions[np.unique(codes[positions], return_index=True)[1]]] = True
+
+    return first
+
+
+def _bit_length(values):
+    # Bit length of each uint64, from the exponents of its two exact 32-bit halves
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+def hll_sketches(codes, ids, n_groups, precision=12):
+    """
+    Build one HyperLogLog sketch of the ids of each group.
+
+    Each id is hashed to 64 bits; the first `precision` bits pick a register and
+    the register keeps the highest rank (leading zeros + 1) seen in the other
+    bits. A sketch takes 2**precision bytes however many ids it has seen, and
+    sketches of the same group from different batches merge with np.maximum.
+
+    Args:
+        codes (np.ndarray): Integer group code (0 to n_groups - 1) of each row
+        ids (array-like): The id of each row; missing ids are skipped
+        n_groups (int): Number of groups
+        precision (int): Register index bits, 4 to 16
+
+    Returns:
+        np.ndarray: uint8 registers of shape (n_groups, 2**precision)
+    """
+    ids = pd.Series(ids)
+    valid = ids.notna().to_numpy()
+    hashes = pd.util.hash_array(ids.to_numpy()[valid], categorize=False)
+    registers = 1 << precision
+    keys = np.asarray(codes)[valid].astype(np.int64) * registers + (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    ranks = (64 - precision) - _bit_length(hashes & np.uint64((1 << (64 - precision)) - 1)) + 1
+
+    # Keep the highest rank per (group, register): sort by key then rank and take the last row of each key
+    order = np.lexsort((ranks, keys))
+    keys, ranks = keys[order], ranks[order]
+    last = np.append(keys[1:] != keys[:-1], True)
+    sketches = np.zeros(n_groups * registers, dtype=np.uint8)
+    sketches[keys[last]] = ranks[last]
+
+    return sketches.reshape(n_groups, registers)
+
+
+def hll_estimate(sketches):
+    """
+    Estimate the number of distinct ids in HyperLogLog sketches.
+
+    Args:
+        sketches (np.ndarray): Registers from hll_sketches, one sketch per row
+
+    Returns:
+        np.ndarray: Estimated distinct count of each sketch
+    """
+    registers = sketches.shape[-1]
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(registers, 0.7213 / (1 + 1.079 / registers))
+    raw = alpha * registers ** 2 / np.exp2(-sketches.astype(np.float64)).sum(axis=-1)
+    # Linear counting while the sketch is sparse
+    zeros = np.count_nonzero(sketches == 0, axis=-1)
+    linear = registers * np.log(registers / np.maximum(zeros, 1))
+
+    return np.where((raw <= 2.5 * registers) & (zeros > 0), linear, raw)
+
+
+def distinct_counts(groups, ids, method="exact", precision=12):
+    """
+    Count the distinct ids per group.
+
+    Group labels and ids are factorized to integer codes. In "exact" mode the
+    distinct (group, id) pairs are found with np.unique on one int64 key per
+    row and counted per group with np.bincount, with no per-group Python work
+    or drop_duplicates copies. In "hll" mode the counts are estimated from
+    HyperLogLog sketches (see hll_sketches), which keeps memory at
+    2**precision bytes per group for very large histories; the relative error
+    is about 1.04 / sqrt(2**precision).
+
+    Args:
+        groups (array-like or pd.DataFrame): Group label of each row, or one
+            column per group key. Missing labels form their own group.
+        ids (array-like): The id of each row; missing ids are not counted
+        method (str): "exact" or "hll"
+        precision (int): HyperLogLog precision for method="hll"
+
+    Returns:
+        pd.Series: Distinct ids per group, indexed by group label (a
+            MultiIndex for several key columns) in order of first appearance
+
+    Raises:
+        ValueError: If method is not "exact" or "hll"
+    """
+    if method not in ("exact", "hll"):
+        raise ValueError("method must be 'exact' or 'hll', got {!r}".format(method))
+
+    if isinstance(groups, pd.DataFrame):
+        codes = groups.groupby(list(groups.columns), dropna=False, sort=False).ngroup().to_numpy()
+        labels = groups.iloc[np.unique(codes, return_index=True)[1]]
+        labels = pd.MultiIndex.from_frame(labels) if labels.shape[1] > 1 else pd.Index(labels.iloc[:, 0])
+    else:
+        codes, labels = pd.factorize(pd.Series(groups), use_na_sentinel=False)
+    n_groups = len(labels)
+
+    if method == "hll":
+        counts = np.round(hll_estimate(hll_sketches(codes, ids, n_groups, precision))).astype(np.int64)
+    else:
+        id_codes = pd.factorize(pd.Series(ids))[0]
+        valid = id_codes >= 0
+        n_ids = max(id_codes.max(initial=-1) + 1, 1)
+        pairs = np.unique(codes[valid].astype(np.int64) * n_ids + id_codes[valid])
+        counts = np.bincount(pairs // n_ids, minlength=n_groups)
+
+    return pd.Series(counts, index=labels, name="distinct_count")
@@ -1,28 +1,258 @@
-import sys
+import os
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.ticker import FuncFormatter
-import seaborn as sns
 
-# Set the aesthetic style of the plots
-sns.set_style('whitegrid')
+import instrumentation
+import utils
+
+
+def _set_style(module):
+    # Set the aesthetic style of the plots
+    module.set_style('whitegrid')
+
+
+# matplotlib and seaborn take seconds to import, so they are imported when a chart is first drawn (the cube
+# functions do not need them); the seaborn style is set when seaborn is imported
+plt = utils.lazy_import("matplotlib.pyplot")
+sns = utils.lazy_import("seaborn", on_import=_set_style)
+
+# Dimensions of the aggregate cube; only those present in the aggregated frame are used
+CUBE_DIMENSIONS = [
+    "AnimalType", "OutcomeType", "AgeuponOutcome", "SexuponOutcome", "Sterilization",
+    "BreedType", "Breed_broken", "Mix", "CoatColor", "CoatPattern"
+]
+# Measures of the aggregate cube (see build_cube)
+CUBE_MEASURES = [
+    "rows", "animals", "visits", "breed_rows", "mix_rows", "coat_rows", "pattern_rows", "type_animals",
+    "breed_animals", "breed_known_animals", "coat_color_animals", "coat_color_known_animals",
+    "coat_pattern_animals", "coat_pattern_known_animals"
+]
+# Measures that add up over cells: all but the distinct-animal count
+ADDITIVE_MEASURES = [measure for measure in CUBE_MEASURES if measure != "animals"]
+# Image formats of render_chart_pack
+RENDER_FORMATS = ("png", "svg")
+# Per-AnimalType summaries of cubes, keyed by (id(cube), column, measures) and dropped with their cube
+_TYPE_SUMMARIES = {}
+
+
+
+# Aggregate cube
+
+def breed_display(df):
+    """
+    Returns the breed shown in the breed charts: the breed type for cats and the individual breed for dogs.
+
+    The column is built with `np.where` on AnimalType and returned as a new Series; `df` is not modified.
+
+    Parameters:
+    df (pd.DataFrame): A frame or cube with 'AnimalType', 'BreedType' and 'Breed_broken' columns.
+
+    Returns:
+    pd.Series: The breed to display, aligned with `df`.
+    """
+    return pd.Series(
+        np.where(df["AnimalType"].to_numpy() == "Cat", df["BreedType"].to_numpy(), df["Breed_broken"].to_numpy()),
+        index=df.index, name="BreedDisplay"
+    )
+
+
+def build_cube(processed_df, breed=None, breed_mix=None, coat_color=None, coat_patterns=None, AnimalID=r"AnimalID", distinct="exact"):
+    """
+    Aggregates a frame into the count cube that every viz_* chart is drawn from.
+
+    The rows are numbered by cell in a single groupby and every measure is then a `np.bincount` over those cell
+    numbers. The cube has one row per combination of the `CUBE_DIMENSIONS` present in `processed_df` (missing values
+    included) and these measures:
+    - rows: the number of rows of `processed_df`.
+    - animals: the number of distinct animals (`utils.distinct_counts`).
+    - visits, breed_rows, mix_rows, coat_rows, pattern_rows: the number of rows animal_data, and animal_data merged
+      with breed, breed_mix, coat_color or coat_patterns, have in the cell.
+    - type_animals: 1 on the first row of each animal per AnimalType (`utils.first_occurrences`), so that summing it
+      over cells gives distinct animals.
+    - breed_animals, coat_color_animals, coat_pattern_animals: the same per breed (BreedDisplay), coat color and coat
+      pattern, e.g. the number of distinct dogs with a breed. breed_known_animals, coat_color_known_animals and
+      coat_pattern_known_animals count each animal once among its rows with a known value.
+    When the breed columns are present, a 'BreedDisplay' column (see `breed_display`) is added to the cube cells.
+
+    In the merged frame returned by `data_processing.preprocess_data`, every outcome of an animal is repeated once per
+    combination of its breed, breed_mix, coat_color and coat_patterns rows. Given those frames, each row is weighted
+    by how often it is repeated, so summing a measure over any slice of the cube gives the count in the individual
+    frame. Components that are not given count as one row per animal, so a single frame (e.g. animal_data, or
+    animal_data merged with breed) can also be aggregated on its own.
+
+    Parameters:
+    processed_df (pd.DataFrame): The frame to aggregate, usually the merged frame returned by `data_processing.preprocess_data`.
+    breed, breed_mix, coat_color, coat_patterns (pd.DataFrame, optional): The frames `processed_df` was merged from.
+    AnimalID (str, optional): The name of the column that identifies individual animals. Defaults to "AnimalID".
+    distinct (str, optional): How 'animals' is counted: "exact", or "hll" for HyperLogLog estimates on very large histories. Defaults to "exact".
+
+    Returns:
+    pd.DataFrame: The cube, with the dimensions and `CUBE_MEASURES` as columns. Weighted measures are floats that
+    add up to whole numbers; `cube_counts` rounds them.
+
+    Example usage:
+    processed_df, animal_data, breed, breed_mix, coat_color, coat_patterns = data_processing.process_data("/path/to/data.csv")
+    cube = build_cube(processed_df, breed, breed_mix, coat_color, coat_patterns)
+    viz_outcometype(home_dir, cube)
+    viz_breed(home_dir, cube, top_n=5)
+    """
+    dimensions = [column for column in CUBE_DIMENSIONS if column in processed_df.columns]
+    ids = processed_df[AnimalID]
+    # Number the cells of the cube and keep the first row of each as its dimension values
+    cells = processed_df.groupby(dimensions, dropna=False, sort=False).ngroup().to_numpy()
+    first_rows = np.unique(cells, return_index=True)[1]
+    n_cells = len(first_rows)
+    cube = processed_df.iloc[first_rows][dimensions].reset_index(drop=True)
+
+    # Rows per animal in each component frame; every animal has at least one
+    repeats = {}
+    for name, frame in [("breed", breed), ("breed_mix", breed_mix), ("coat_color", coat_color), ("coat_patterns", coat_patterns)]:
+        repeats[name] = np.ones(len(processed_df)) if frame is None else ids.map(frame[AnimalID].value_counts()).fillna(1).to_numpy()
+    total_repeats = repeats["breed"] * repeats["breed_mix"] * repeats["coat_color"] * repeats["coat_patterns"]
+    weights = {
+        "visits": 1 / total_repeats,
+        "breed_rows": repeats["breed"] / total_repeats,
+        "mix_rows": repeats["breed_mix"] / total_repeats,
+        "coat_rows": repeats["coat_color"] / total_repeats,
+        "pattern_rows": repeats["coat_patterns"] / total_repeats
+    }
+
+    # First rows of each animal per AnimalType, overall, per charted value and among the rows with a known value
+    animal_codes = processed_df.groupby([AnimalID, "AnimalType"], dropna=False, sort=False).ngroup().to_numpy()
+    flags = {"type_animals": utils.first_occurrences(animal_codes)}
+    has_breed = {"BreedType", "Breed_broken"}.issubset(dimensions)
+    charted = [
+        ("breed", breed_display(processed_df) if has_breed else None),
+        ("coat_color", processed_df["CoatColor"] if "CoatColor" in dimensions else None),
+        ("coat_pattern", processed_df["CoatPattern"] if "CoatPattern" in dimensions else None)
+    ]
+    for name, values in charted:
+        if values is None:
+            flags[name + "_animals"] = flags[name + "_known_animals"] = np.zeros(len(processed_df), dtype=bool)
+            continue
+        value_codes = pd.factorize(values, use_na_sentinel=False)[0]
+        flags[name + "_animals"] = utils.first_occurrences(animal_codes * (value_codes.max(initial=0) + 1) + value_codes)
+        flags[name + "_known_animals"] = utils.first_occurrences(animal_codes, mask=values.notna().to_numpy())
+
+    measures = {
+        "rows": np.bincount(cells, minlength=n_cells),
+        "animals": utils.distinct_counts(cells, ids, method=distinct).sort_index().to_numpy(),
+        **{measure: np.bincount(cells, weights=weight, minlength=n_cells) for measure, weight in weights.items()},
+        **{measure: np.bincount(cells[flag], minlength=n_cells) for measure, flag in flags.items()}
+    }
+    cube = cube.assign(**{measure: measures[measure] for measure in CUBE_MEASURES})
+    if has_breed:
+        cube["BreedDisplay"] = breed_display(cube)
+    return cube
+
+
+def _as_cube(df, AnimalID=r"AnimalID"):
+    # Charts accept a cube from build_cube (or slice_cube), or a frame that is aggregated first
+    if set(ADDITIVE_MEASURES).issubset(df.columns):
+        return df
+    return build_cube(df, AnimalID=AnimalID)
+
+
+def slice_cube(cube, dimensions):
+    """
+    Re-aggregates a cube to fewer dimensions, e.g. the ones a single chart reads.
+
+    The additive measures are summed. 'animals' is left out, as distinct counts of cells do not add up.
+
+    Parameters:
+    cube (pd.DataFrame): A cube returned by `build_cube`.
+    dimensions (list): The dimensions to keep.
+
+    Returns:
+    pd.DataFrame: The smaller cube, which the viz_* functions accept in place of the full one.
+
+    Example usage:
+    viz_sex(home_dir, slice_cube(cube, ["SexuponOutcome", "OutcomeType"]))
+    """
+    return cube.groupby(dimensions, dropna=False, sort=False)[ADDITIVE_MEASURES].sum().reset_index()
+
+
+def cube_counts(cube, by=None, measure="visits", **filters):
+    """
+    Sums a measure of the cube over the cells that match `filters`, optionally per value of `by`.
+
+    Parameters:
+    cube (pd.DataFrame): A cube returned by `build_cube`.
+    by (str or list, optional): Dimension(s) to group by; missing values are left out, as in `value_counts`. Defaults to None, which returns the total.
+    measure (str, optional): One of `CUBE_MEASURES`. Defaults to "visits".
+    **filters: Dimension values the cells must have, e.g. AnimalType="Cat".
+
+    Returns:
+    pd.Series or int: The counts per value of `by`, or the total if `by` is None.
+
+    Example usage:
+    cat_outcomes = cube_counts(cube, "OutcomeType", AnimalType="Cat")
+    """
+    mask = np.ones(len(cube), dtype=bool)
+    for column, value in filters.items():
+        mask &= (cube[column] == value).to_numpy()
+    if by is None:
+        return int(round(cube.loc[mask, measure].sum()))
+    return cube.loc[mask].groupby(by, sort=False)[measure].sum().round().astype(int)
+
+
+def _forget_cube(cube_id):
+    for key in [key for key in _TYPE_SUMMARIES if key[0] == cube_id]:
+        del _TYPE_SUMMARIES[key]
+
+
+def _type_summary(cube, column, measures):
+    # One groupby of the cube by AnimalType and `column` (missing values included), shared by the Cat and Dog charts.
+    # Cubes are not modified after build_cube, so the result is cached until the cube is garbage collected.
+    key = (id(cube), column, measures)
+    if key not in _TYPE_SUMMARIES:
+        if not any(cached[0] == id(cube) for cached in _TYPE_SUMMARIES):
+            weakref.finalize(cube, _forget_cube, id(cube))
+        _TYPE_SUMMARIES[key] = cube.groupby(["AnimalType", column], dropna=False, sort=False)[list(dict.fromkeys(measures))].sum()
+    return _TYPE_SUMMARIES[key]
+
+
+def _get_top_values(cube, animal_type, column, top_n, count_measure, total_measure, known_measure):
+    # Top n values of `column` for the given animal type, with the total and the number missing a value
+    summary = _type_summary(cube, column, (count_measure, total_measure, known_measure))
+    summary = summary[summary.index.get_level_values("AnimalType") == animal_type].droplevel("AnimalType")
+    known = summary[summary.index.notna()]
+    total_counts = int(round(summary[total_measure].sum()))
+    missing = total_counts - int(round(known[known_measure].sum()))
+    counts = known[count_measure].round().astype(int).sort_values(ascending=False, kind='mergesort').head(top_n)
+    return counts.index.tolist(), counts, total_counts, missing
+
+
+def _show_or_save(save_path=None, part=None):
+    # Shows the current figure, or writes it to save_path (as <name>_<part><extension> if given) and closes it
+    if save_path is None:
+        plt.show()
+        return []
+    if part is not None:
+        stem, extension = os.path.splitext(save_path)
+        save_path = "{}_{}{}".format(stem, part, extension)
+    plt.savefig(save_path, bbox_inches='tight')
+    plt.close()
+    return [save_path]
 
 
 
 # Data exploration
+# The viz_* functions take the processed frame (or a cube, see build_cube) and show the chart, or write it to
+# save_path and return the written files. home_dir is no longer used and is kept for the existing notebooks.
 
 ## Visualize the distribution of the dependent variable
 
-def viz_outcometype(home_dir, processed_df, chart_title="Enter Chart Title"):
-    # import required modules
-    sys.path.append(home_dir + r"/src")
-    import utils
+def viz_outcometype(home_dir, processed_df, chart_title="Enter Chart Title", save_path=None):
     # Define the order and colors for OutcomeType
     order = ["Adoption", "Return_to_owner", "Transfer", "Euthanasia", "Died"]
     colors = ["#76C7C0", "#6495ED", "#DA70D6", "#FFA07A", "#FF4500"]
     # Count the occurrences of each OutcomeType
-    outcome_counts = processed_df['OutcomeType'].value_counts().reindex(order, fill_value=0)
+    cube = _as_cube(processed_df)
+    outcome_counts = cube_counts(cube, 'OutcomeType').reindex(order, fill_value=0)
     # Calculate the total number of animals
     total_animals = outcome_counts.sum()
     # Calculate the percentage of each OutcomeType
@@ -49,20 +279,19 @@ def viz_outcometype(home_dir, processed_df, chart_title="Enter Chart Title"):
         ax.text(i, count + 0.005 * max(outcome_counts), f'{percentages.iloc[i]:.1f}%', ha='center', va='bottom', fontsize=9)
     # Show the plot
     plt.tight_layout(rect=[0, 0.03, 1, 1])
-    plt.show()
+    # Show the plot, or write it to save_path
+    return _show_or_save(save_path) or None
 
 
 
 ## Animal Type
-def viz_animal_type(home_dir, processed_df, chart_title1="Enter Chart Title", chart_title2="Enter Chart Title"):
-    # import required modules
-    sys.path.append(home_dir + r"/src")
-    import utils
+def viz_animal_type(home_dir, processed_df, chart_title1="Enter Chart Title", chart_title2="Enter Chart Title", save_path=None):
     # Define the order and colors for AnimalType
     order = ["Dog", "Cat"]
     colors = ["#8E9498", "#2D3033"]
     # Count the occurrences of each AnimalType
-    animal_counts = processed_df['AnimalType'].value_counts().reindex(order, fill_value=0)
+    cube = _as_cube(processed_df)
+    animal_counts = cube_counts(cube, 'AnimalType').reindex(order, fill_value=0)
     # Calculate the total number of animals
     total_animals = animal_counts.sum()
     # Calculate the percentage of each AnimalType
@@ -86,9 +315,9 @@ def viz_animal_type(home_dir, processed_df, chart_title1="Enter Chart Title", ch
     # Add percentage labels on the right side of each bar
     for i, count in enumerate(animal_counts.values):
         ax.text(count + 0.005 * max(animal_counts), i, f'{percentages.iloc[i]:.1f}%', ha='left', va='center', fontsize=9)
-    # Show the plot
     plt.tight_layout()
-    plt.show()
+    # Show the plot, or write it to save_path
+    written = _show_or_save(save_path, part=1)
 
 
     # Define the order for OutcomeType and colors
@@ -97,20 +326,16 @@ def viz_animal_type(home_dir, processed_df, chart_title1="Enter Chart Title", ch
     # Create a subplot for Cats and Dogs
     plt.figure(figsize=(14, 6))
     plt.suptitle(chart_title2, fontsize=18)
-    # Filter data for Cats and Dogs
-    cats_df = processed_df.loc[processed_df['AnimalType']=='Cat', ]
-    dogs_df = processed_df.loc[processed_df['AnimalType']=='Dog', ]
-    # Calculate total counts for males and females
-    total_cats = len(cats_df)
-    total_dogs = len(dogs_df)
+    # Calculate total counts for Cats and Dogs
+    total_cats = cube_counts(cube, AnimalType='Cat')
+    total_dogs = cube_counts(cube, AnimalType='Dog')
     # Determine the maximum count from both datasets
-    cats_counts = cats_df['OutcomeType'].value_counts().reindex(order).fillna(0)
-    dogs_counts = dogs_df['OutcomeType'].value_counts().reindex(order).fillna(0)
+    cats_counts = cube_counts(cube, 'OutcomeType', AnimalType='Cat').reindex(order).fillna(0)
+    dogs_counts = cube_counts(cube, 'OutcomeType', AnimalType='Dog').reindex(order).fillna(0)
     max_count = ((max(cats_counts.max(), dogs_counts.max()) // 1000) + 1) * 1000
     # Plot bar chart for Cats
     ax1 = plt.subplot(1, 2, 1)
-    male_counts = cats_df['OutcomeType'].value_counts().reindex(order).fillna(0)
-    sns.barplot(x=male_counts.index, y=male_counts.values, order=order, ax=ax1)
+    sns.barplot(x=cats_counts.index, y=cats_counts.values, order=order, ax=ax1)
     plt.title('Cats')
     plt.xlabel('Outcome Type')
     plt.ylabel(f'Number of Cats (Total: {total_cats:,})', fontsize=10)
@@ -121,7 +346,7 @@ def viz_animal_type(home_dir, processed_df, chart_title1="Enter Chart Title", ch
     for i, bar in enumerate(ax1.patches):
         bar.set_color(colors[i])
     # Format y-axis ticks
-    ax1.yaxis.set_major_formatter(FuncFormatter(utils.format_y_tick))
+    ax1.yaxis.set_major_formatter(plt.FuncFormatter(utils.format_y_tick))
     # Annotate bars with percentages for Cats
     for p in ax1.patches:
         height = p.get_height()
@@ -131,8 +356,7 @@ def viz_animal_type(home_dir, processed_df, chart_title1="Enter Chart Title", ch
                     ha='center', va='bottom', fontsize=9, color='black')
     # Plot bar chart for Dogs
     ax2 = plt.subplot(1, 2, 2)
-    female_counts = dogs_df['OutcomeType'].value_counts().reindex(order).fillna(0)
-    sns.barplot(x=female_counts.index, y=female_counts.values, order=order, ax=ax2)
+    sns.barplot(x=dogs_counts.index, y=dogs_counts.values, order=order, ax=ax2)
     plt.title('Dogs')
     plt.xlabel('Outcome Type')
     plt.ylabel(f'Number of Dogs (Total: {total_dogs:,})', fontsize=10)
@@ -143,7 +367,7 @@ def viz_animal_type(home_dir, processed_df, chart_title1="Enter Chart Title", ch
     for i, bar in enumerate(ax2.patches):
         bar.set_color(colors[i])
     # Format y-axis ticks
-    ax2.yaxis.set_major_formatter(FuncFormatter(utils.format_y_tick))
+    ax2.yaxis.set_major_formatter(plt.FuncFormatter(utils.format_y_tick))
     # Annotate bars with percentages for Dogs
     for p in ax2.patches:
         height = p.get_height()
@@ -153,21 +377,20 @@ def viz_animal_type(home_dir, processed_df, chart_title1="Enter Chart Title", ch
                     ha='center', va='bottom', fontsize=9, color='black')
     # Adjust layout
     plt.tight_layout()
-    # Show the plots
-    plt.show()
+    # Show the plots, or write them to save_path
+    return written + _show_or_save(save_path, part=2) or None
 
 
 
 ## AgeuponOutcome
-def viz_age(home_dir, processed_df, chart_title="Enter Chart Title"):
-    # import required modules
-    sys.path.append(home_dir + r"/src")
-    import utils
+def viz_age(home_dir, processed_df, chart_title="Enter Chart Title", save_path=None):
     # Define the order and colors for AgeuponOutcome
     order = ['<1 week', '<1 month', '<6 months', '<1 year', '<5 years', '<10 years', '<15 years', '15+ years']
     # Count the occurrences of each AgeuponOutcome
-    outcome_counts = processed_df.loc[processed_df["AgeuponOutcome"].notna(), 'AgeuponOutcome'].value_counts().reindex(order, fill_value=0)
-    missing = len(processed_df.loc[processed_df["AgeuponOutcome"].isna(), 'AgeuponOutcome'])
+    cube = _as_cube(processed_df)
+    age_counts = cube_counts(cube, 'AgeuponOutcome')
+    outcome_counts = age_counts.reindex(order, fill_value=0)
+    missing = cube_counts(cube) - age_counts.sum()
     # Calculate the total number of animals
     total_animals = outcome_counts.sum()
     # Calculate the percentage of each AgeuponOutcome
@@ -175,8 +398,8 @@ def viz_age(home_dir, processed_df, chart_title="Enter Chart Title"):
     # Define the order and colors for OutcomeType
     order_outcome = ["Adoption", "Return_to_owner", "Transfer", "Euthanasia", "Died"]
     colors_outcome = ["#76C7C0", "#6495ED", "#DA70D6", "#FFA07A", "#FF4500"]
-    # Count the occurrences of each combination of AgeuponOutcome and OutcomeType
-    pivot_table = processed_df.pivot_table(values='AnimalID', index='AgeuponOutcome', columns='OutcomeType', aggfunc='count', fill_value=0)
+    # Count the occurrences of each combination of AgeuponOutcome and OutcomeType, in the order of the bars
+    pivot_table = cube_counts(cube, ['AgeuponOutcome', 'OutcomeType']).unstack(fill_value=0).reindex(index=order, columns=order_outcome, fill_value=0)
     # Normalize the pivot table to get percentages
     pivot_table_percentage = pivot_table.div(pivot_table.sum(axis=1), axis=0) * 100
     # Set up the layout for two side-by-side subplots
@@ -195,7 +418,7 @@ def viz_age(home_dir, processed_df, chart_title="Enter Chart Title"):
     plt.tick_params(axis='x', labelsize=9)  # Size for x-axis ticks
     plt.tick_params(axis='y', labelsize=9)  # Size for y-axis ticks
     # Apply the custom y-axis formatter to both subplots
-    formatter = FuncFormatter(utils.format_y_tick)
+    formatter = plt.FuncFormatter(utils.format_y_tick)
     plt.gca().yaxis.set_major_formatter(formatter)  # This applies to the last subplot by default
     for i, count in enumerate(outcome_counts.values):
         ax1.text(i, count + 0.005 * max(outcome_counts), f'{percentages_age.iloc[i]:.2f}%', ha='center', fontsize=9)
@@ -227,32 +450,28 @@ def viz_age(home_dir, processed_df, chart_title="Enter Chart Title"):
     text = "*Missing age info: {:,} animals".format(missing)
     ax2.text(1, -0.15, text, transform=ax2.transAxes, ha='right', color='red', fontsize=8)
     plt.tight_layout()
-    plt.show()
+    # Show the plot, or write it to save_path
+    return _show_or_save(save_path) or None
 
 
 
 
 ## SexuponOutcome
-def viz_sex(home_dir, processed_df, chart_title="Enter Chart Title"):
-    # import required modules
-    sys.path.append(home_dir + r"/src")
-    import utils
+def viz_sex(home_dir, processed_df, chart_title="Enter Chart Title", save_path=None):
     # Define the order for OutcomeType and colors
     order = ["Adoption", "Return_to_owner", "Transfer", "Euthanasia", "Died"]
     colors = ["#76C7C0", "#6495ED", "#DA70D6", "#FFA07A", "#FF4500"]
     # Create a subplot for Males and Females
     plt.figure(figsize=(14, 6))
     plt.suptitle(chart_title, fontsize=18)
-    # Filter data for Males and Females
-    males_df = processed_df.loc[processed_df['SexuponOutcome']=='Male', ]
-    females_df = processed_df.loc[processed_df['SexuponOutcome']=='Female', ]
-    missing = len(processed_df) - len(males_df) - len(females_df)
     # Calculate total counts for males and females
-    total_males = len(males_df)
-    total_females = len(females_df)
+    cube = _as_cube(processed_df)
+    total_males = cube_counts(cube, SexuponOutcome='Male')
+    total_females = cube_counts(cube, SexuponOutcome='Female')
+    missing = cube_counts(cube) - total_males - total_females
     # Plot bar chart for Males
     ax1 = plt.subplot(1, 2, 1)
-    male_counts = males_df['OutcomeType'].value_counts().reindex(order).fillna(0)
+    male_counts = cube_counts(cube, 'OutcomeType', SexuponOutcome='Male').reindex(order).fillna(0)
     sns.barplot(x=male_counts.index, y=male_counts.values, order=order, ax=ax1)
     plt.title('Males')
     plt.xlabel('Outcome Type')
@@ -263,7 +482,7 @@ def viz_sex(home_dir, processed_df, chart_title="Enter Chart Title"):
     for i, bar in enumerate(ax1.patches):
         bar.set_color(colors[i])
     # Format y-axis ticks
-    ax1.yaxis.set_major_formatter(FuncFormatter(utils.format_y_tick))
+    ax1.yaxis.set_major_formatter(plt.FuncFormatter(utils.format_y_tick))
     # Annotate bars with percentages for Males
     for p in ax1.patches:
         height = p.get_height()
@@ -273,7 +492,7 @@ def viz_sex(home_dir, processed_df, chart_title="Enter Chart Title"):
                     ha='center', va='bottom', fontsize=9, color='black')
     # Plot bar chart for Females
     ax2 = plt.subplot(1, 2, 2)
-    female_counts = females_df['OutcomeType'].value_counts().reindex(order).fillna(0)
+    female_counts = cube_counts(cube, 'OutcomeType', SexuponOutcome='Female').reindex(order).fillna(0)
     sns.barplot(x=female_counts.index, y=female_counts.values, order=order, ax=ax2)
     plt.title('Females')
     plt.xlabel('Outcome Type')
@@ -284,7 +503,7 @@ def viz_sex(home_dir, processed_df, chart_title="Enter Chart Title"):
     for i, bar in enumerate(ax2.patches):
         bar.set_color(colors[i])
     # Format y-axis ticks
-    ax2.yaxis.set_major_formatter(FuncFormatter(utils.format_y_tick))
+    ax2.yaxis.set_major_formatter(plt.FuncFormatter(utils.format_y_tick))
     # Annotate bars with percentages for Females
     for p in ax2.patches:
         height = p.get_height()
@@ -297,33 +516,28 @@ def viz_sex(home_dir, processed_df, chart_title="Enter Chart Title"):
     ax2.text(1, -0.15, text, transform=ax2.transAxes, ha='right', color='red', fontsize=8)
     # Adjust layout
     plt.tight_layout()
-    # Show the plots
-    plt.show()
+    # Show the plot, or write it to save_path
+    return _show_or_save(save_path) or None
 
 
 
 
 ## Sterilization Type
-def viz_sterilization(home_dir, processed_df, chart_title="Enter Chart Title"):
-    # import required modules
-    sys.path.append(home_dir + r"/src")
-    import utils
+def viz_sterilization(home_dir, processed_df, chart_title="Enter Chart Title", save_path=None):
     # Define the order for OutcomeType and colors
     order = ["Adoption", "Return_to_owner", "Transfer", "Euthanasia", "Died"]
     colors = ["#76C7C0", "#6495ED", "#DA70D6", "#FFA07A", "#FF4500"]
     # Create a subplot for Sterilization Type
     plt.figure(figsize=(14, 6))
     plt.suptitle(chart_title, fontsize=18)
-    # Filter data for both Sterilization Types
-    sterilized_df = processed_df.loc[processed_df['Sterilization']=='Sterilized', ]
-    intact_df = processed_df.loc[processed_df['Sterilization']=='Intact', ]
-    missing = len(processed_df) - len(sterilized_df) - len(intact_df)
     # Calculate total counts for both Sterilization Type
-    total_sterilized = len(sterilized_df)
-    total_intact = len(intact_df)
+    cube = _as_cube(processed_df)
+    total_sterilized = cube_counts(cube, Sterilization='Sterilized')
+    total_intact = cube_counts(cube, Sterilization='Intact')
+    missing = cube_counts(cube) - total_sterilized - total_intact
     # Determine the maximum count from both datasets
-    sterilized_counts = sterilized_df['OutcomeType'].value_counts().reindex(order).fillna(0)
-    intact_counts = intact_df['OutcomeType'].value_counts().reindex(order).fillna(0)
+    sterilized_counts = cube_counts(cube, 'OutcomeType', Sterilization='Sterilized').reindex(order).fillna(0)
+    intact_counts = cube_counts(cube, 'OutcomeType', Sterilization='Intact').reindex(order).fillna(0)
     max_count = ((max(sterilized_counts.max(), intact_counts.max()) // 1000) + 1) * 1000
     # Plot bar chart for Sterilized animals
     ax1 = plt.subplot(1, 2, 1)
@@ -338,7 +552,7 @@ def viz_sterilization(home_dir, processed_df, chart_title="Enter Chart Title"):
     for i, bar in enumerate(ax1.patches):
         bar.set_color(colors[i])
     # Format y-axis ticks
-    ax1.yaxis.set_major_formatter(FuncFormatter(utils.format_y_tick))
+    ax1.yaxis.set_major_formatter(plt.FuncFormatter(utils.format_y_tick))
     # Annotate bars with percentages for Sterilized animals
     for p in ax1.patches:
         height = p.get_height()
@@ -359,7 +573,7 @@ def viz_sterilization(home_dir, processed_df, chart_title="Enter Chart Title"):
     for i, bar in enumerate(ax2.patches):
         bar.set_color(colors[i])
     # Format y-axis ticks
-    ax2.yaxis.set_major_formatter(FuncFormatter(utils.format_y_tick))
+    ax2.yaxis.set_major_formatter(plt.FuncFormatter(utils.format_y_tick))
     # Annotate bars with percentages for Intact animals
     for p in ax2.patches:
         height = p.get_height()
@@ -372,8 +586,8 @@ def viz_sterilization(home_dir, processed_df, chart_title="Enter Chart Title"):
     ax2.text(1, -0.15, text, transform=ax2.transAxes, ha='right', color='red', fontsize=8)
     # Adjust layout
     plt.tight_layout()
-    # Show the plots
-    plt.show()
+    # Show the plot, or write it to save_path
+    return _show_or_save(save_path) or None
 
 
 
@@ -382,32 +596,15 @@ def viz_sterilization(home_dir, processed_df, chart_title="Enter Chart Title"):
 # Breed
 # Function to filter top n Breeds for a given animal type
 def get_top_breed(df, animal_type, top_n=5, AnimalID=r"AnimalID"):
-    # Filter data for the given animal type
-    filtered_df = df[df['AnimalType'] == animal_type]
-    # Calculate the value counts for Breeds
-    total_counts = filtered_df[AnimalID].count()
-    if animal_type=="Cat":
-        missing = total_counts - filtered_df['BreedType'].count()
-        breed_counts = filtered_df['BreedType'].value_counts().head(top_n)
-    else:
-        missing = total_counts - filtered_df['Breed_broken'].count()
-        breed_counts = filtered_df['Breed_broken'].value_counts().head(top_n)
-    # Get the index (coat colors) of the top n most common coat colors
-    top_breed = breed_counts.index.tolist()
-    return top_breed, breed_counts, total_counts, missing
-def viz_breed(home_dir, processed_df, top_n=5, chart_title="Enter Chart Title"):
-    # import required modules
-    sys.path.append(home_dir + r"/src")
-    import utils
-    processed_df["BreedType"] = [
-        processed_df.loc[i, "BreedType"] if processed_df.loc[i, "AnimalType"]=="Cat" \
-        else processed_df.loc[i, "Breed_broken"] \
-        for i in range(len(processed_df))
-    ]
-    # Get top n coat colors and their counts for Cats and Dogs
-    top_cats, cat_counts, total_cats, missing_cats = get_top_breed(df=processed_df, animal_type='Cat', top_n=top_n)
-    top_dogs, dog_counts, total_dogs, missing_dogs = get_top_breed(df=processed_df, animal_type='Dog', top_n=top_n)
-    processed_df['BreedType'] = processed_df['BreedType'].replace("Unknown", np.nan)
+    # Cats are shown by breed type and dogs by individual breed (the cube's BreedDisplay column)
+    cube = _as_cube(df, AnimalID=AnimalID)
+    # Get the top n most common breeds, the number of animals and the number of animals without a breed
+    return _get_top_values(cube, animal_type, 'BreedDisplay', top_n, 'breed_animals', 'type_animals', 'breed_known_animals')
+def viz_breed(home_dir, processed_df, top_n=5, chart_title="Enter Chart Title", save_path=None):
+    # Get top n breeds and their counts for Cats and Dogs
+    cube = _as_cube(processed_df)
+    top_cats, cat_counts, total_cats, missing_cats = get_top_breed(df=cube, animal_type='Cat', top_n=top_n)
+    top_dogs, dog_counts, total_dogs, missing_dogs = get_top_breed(df=cube, animal_type='Dog', top_n=top_n)
     # Determine the maximum count from both datasets
     max_count = ((max(cat_counts.max(), dog_counts.max()) // 1000) + 1) * 1000
     # Set up the matplotlib figure
@@ -415,7 +612,7 @@ def viz_breed(home_dir, processed_df, top_n=5, chart_title="Enter Chart Title"):
     plt.suptitle(chart_title, fontsize=18)
     # Create a subplot for Cats
     ax1 = plt.subplot(1, 2, 1)
-    sns.countplot(x='BreedType', data=processed_df[processed_df['AnimalType'] == 'Cat'], order=top_cats)
+    sns.barplot(x=cat_counts.index, y=cat_counts.values, order=top_cats, ax=ax1)
     plt.title('Distribution of Breed for Cats (Top {})'.format(top_n))
     plt.xlabel('Breed')
     plt.ylabel('Number of Cats (Total: {:,})'.format(total_cats), fontsize=10)
@@ -432,7 +629,7 @@ def viz_breed(home_dir, processed_df, top_n=5, chart_title="Enter Chart Title"):
                     ha='center', va='bottom', fontsize=9, color='black')
     # Create a subplot for Dogs
     ax2 = plt.subplot(1, 2, 2)
-    sns.countplot(x='BreedType', data=processed_df[processed_df['AnimalType'] == 'Dog'], order=top_dogs)
+    sns.barplot(x=dog_counts.index, y=dog_counts.values, order=top_dogs, ax=ax2)
     plt.title('Distribution of Breed for Dogs (Top {})'.format(top_n), fontsize=12)
     plt.xlabel('BreedType')
     plt.ylabel('Number of Dogs (Total: {:,})'.format(total_dogs), fontsize=10)
@@ -448,7 +645,7 @@ def viz_breed(home_dir, processed_df, top_n=5, chart_title="Enter Chart Title"):
                     (p.get_x() + p.get_width() / 2., height), 
                     ha='center', va='bottom', fontsize=9, color='black')
     # Apply the custom y-axis formatter to both subplots
-    formatter = FuncFormatter(utils.format_y_tick)
+    formatter = plt.FuncFormatter(utils.format_y_tick)
     plt.gca().yaxis.set_major_formatter(formatter)  # This applies to the last subplot by default
     # Get all axes and apply the formatter to each
     axes = plt.gcf().get_axes()
@@ -459,23 +656,21 @@ def viz_breed(home_dir, processed_df, top_n=5, chart_title="Enter Chart Title"):
     ax2.text(1, -0.15, text, transform=ax2.transAxes, ha='right', color='red', fontsize=8)
     # Adjust layout
     plt.tight_layout()
-    # Show the plots
-    plt.show()
+    # Show the plot, or write it to save_path
+    return _show_or_save(save_path) or None
 
 
 
 
 
 ## Mixed or Pure Breed
-def viz_breed_mix(home_dir, processed_df, chart_title1="Enter Chart Title", chart_title2="Enter Chart Title"):
-    # import required modules
-    sys.path.append(home_dir + r"/src")
-    import utils
+def viz_breed_mix(home_dir, processed_df, chart_title1="Enter Chart Title", chart_title2="Enter Chart Title", save_path=None):
     # Define the order and colors for AnimalType
     order = ["Mix", "Pure breed"]
     colors = ["#8E9498", "#2D3033"]
     # Count the occurrences of each AnimalType
-    animal_counts = processed_df['Mix'].value_counts().reindex(order, fill_value=0)
+    cube = _as_cube(processed_df)
+    animal_counts = cube_counts(cube, 'Mix', measure='mix_rows').reindex(order, fill_value=0)
     # Calculate the total number of animals
     total_animals = animal_counts.sum()
     # Calculate the percentage of each AnimalType
@@ -499,9 +694,9 @@ def viz_breed_mix(home_dir, processed_df, chart_title1="Enter Chart Title", char
     # Add percentage labels on the right side of each bar
     for i, count in enumerate(animal_counts.values):
         ax.text(count + 0.005 * max(animal_counts), i, f'{percentages.iloc[i]:.1f}%', ha='left', va='center', fontsize=9)
-    # Show the plot
     plt.tight_layout()
-    plt.show()
+    # Show the plot, or write it to save_path
+    written = _show_or_save(save_path, part=1)
 
 
     # Define the order for OutcomeType and colors
@@ -510,15 +705,12 @@ def viz_breed_mix(home_dir, processed_df, chart_title1="Enter Chart Title", char
     # Create a subplot for Mixed and Pure Breed animals
     plt.figure(figsize=(14, 6))
     plt.suptitle(chart_title2, fontsize=18)
-    # Filter data for Mix and Pure
-    mix_df = processed_df.loc[processed_df['Mix']=='Mix', ]
-    pure_df = processed_df.loc[processed_df['Mix']=='Pure breed', ]
-    # Calculate total counts for males and females
-    total_mix = len(mix_df)
-    total_pure = len(pure_df)
-    # Plot bar chart for Cats
+    # Calculate total counts for Mix and Pure
+    total_mix = cube_counts(cube, measure='mix_rows', Mix='Mix')
+    total_pure = cube_counts(cube, measure='mix_rows', Mix='Pure breed')
+    # Plot bar chart for Mixed Breeds
     ax1 = plt.subplot(1, 2, 1)
-    mix_counts = mix_df['OutcomeType'].value_counts().reindex(order).fillna(0)
+    mix_counts = cube_counts(cube, 'OutcomeType', measure='mix_rows', Mix='Mix').reindex(order).fillna(0)
     sns.barplot(x=mix_counts.index, y=mix_counts.values, order=order, ax=ax1)
     plt.title('Mixed Breeds')
     plt.xlabel('Outcome Type')
@@ -529,7 +721,7 @@ def viz_breed_mix(home_dir, processed_df, chart_title1="Enter Chart Title", char
     for i, bar in enumerate(ax1.patches):
         bar.set_color(colors[i])
     # Format y-axis ticks
-    ax1.yaxis.set_major_formatter(FuncFormatter(utils.format_y_tick))
+    ax1.yaxis.set_major_formatter(plt.FuncFormatter(utils.format_y_tick))
     # Annotate bars with percentages for Mixed Breeds
     for p in ax1.patches:
         height = p.get_height()
@@ -539,7 +731,7 @@ def viz_breed_mix(home_dir, processed_df, chart_title1="Enter Chart Title", char
                     ha='center', va='bottom', fontsize=9, color='black')
     # Plot bar chart for Pure Breeds
     ax2 = plt.subplot(1, 2, 2)
-    pure_counts = pure_df['OutcomeType'].value_counts().reindex(order).fillna(0)
+    pure_counts = cube_counts(cube, 'OutcomeType', measure='mix_rows', Mix='Pure breed').reindex(order).fillna(0)
     sns.barplot(x=pure_counts.index, y=pure_counts.values, order=order, ax=ax2)
     plt.title('Pure Breeds')
     plt.xlabel('Outcome Type')
@@ -550,7 +742,7 @@ def viz_breed_mix(home_dir, processed_df, chart_title1="Enter Chart Title", char
     for i, bar in enumerate(ax2.patches):
         bar.set_color(colors[i])
     # Format y-axis ticks
-    ax2.yaxis.set_major_formatter(FuncFormatter(utils.format_y_tick))
+    ax2.yaxis.set_major_formatter(plt.FuncFormatter(utils.format_y_tick))
     # Annotate bars with percentages for Pure Breeds
     for p in ax2.patches:
         height = p.get_height()
@@ -560,8 +752,8 @@ def viz_breed_mix(home_dir, processed_df, chart_title1="Enter Chart Title", char
                     ha='center', va='bottom', fontsize=9, color='black')
     # Adjust layout
     plt.tight_layout()
-    # Show the plots
-    plt.show()
+    # Show the plots, or write them to save_path
+    return written + _show_or_save(save_path, part=2) or None
 
 
 
@@ -571,22 +763,14 @@ def viz_breed_mix(home_dir, processed_df, chart_title1="Enter Chart Title", char
 # CoatColor
 # Function to filter top n coat colors for a given animal type
 def get_top_coat_colors(df, animal_type, AnimalID=r"AnimalID", top_n=5):
-    # Filter data for the given animal type
-    filtered_df = df[df['AnimalType'] == animal_type]
-    # Calculate the value counts for CoatColor
-    total_counts = filtered_df[AnimalID].drop_duplicates().count()
-    missing = total_counts - filtered_df[[AnimalID, 'CoatColor']].dropna().drop_duplicates()[AnimalID].drop_duplicates().count()
-    coat_color_counts = filtered_df['CoatColor'].value_counts().head(top_n)
-    # Get the index (coat colors) of the top n most common coat colors
-    top_coat_colors = coat_color_counts.index.tolist()
-    return top_coat_colors, coat_color_counts, total_counts, missing
-def viz_coatcolor(home_dir, processed_df, top_n=5, chart_title="Enter Chart Title"):
-    # import required modules
-    sys.path.append(home_dir + r"/src")
-    import utils
+    cube = _as_cube(df, AnimalID=AnimalID)
+    # Get the top n most common coat colors, the number of animals and the number of animals without a coat color
+    return _get_top_values(cube, animal_type, 'CoatColor', top_n, 'coat_color_animals', 'type_animals', 'coat_color_known_animals')
+def viz_coatcolor(home_dir, processed_df, top_n=5, chart_title="Enter Chart Title", save_path=None):
     # Get top n coat colors and their counts for Cats and Dogs
-    top_cats, cat_counts, total_cats, missing_cats = get_top_coat_colors(df=processed_df, animal_type='Cat')
-    top_dogs, dog_counts, total_dogs, missing_dogs = get_top_coat_colors(df=processed_df, animal_type='Dog')
+    cube = _as_cube(processed_df)
+    top_cats, cat_counts, total_cats, missing_cats = get_top_coat_colors(df=cube, animal_type='Cat', top_n=top_n)
+    top_dogs, dog_counts, total_dogs, missing_dogs = get_top_coat_colors(df=cube, animal_type='Dog', top_n=top_n)
     # Determine the maximum count from both datasets
     max_count = ((max(cat_counts.max(), dog_counts.max()) // 1000) + 1) * 1000
     # Set up the matplotlib figure
@@ -594,7 +778,7 @@ def viz_coatcolor(home_dir, processed_df, top_n=5, chart_title="Enter Chart Titl
     plt.suptitle(chart_title, fontsize=18)
     # Create a subplot for Cats
     ax1 = plt.subplot(1, 2, 1)
-    sns.countplot(x='CoatColor', data=processed_df[processed_df['AnimalType'] == 'Cat'], order=top_cats)
+    sns.barplot(x=cat_counts.index, y=cat_counts.values, order=top_cats, ax=ax1)
     plt.title('Distribution of Coat Color for Cats (Top {})'.format(top_n))
     plt.xlabel('Coat Color')
     plt.ylabel('Number of Cats (Total: {:,})'.format(total_cats), fontsize=10)
@@ -611,7 +795,7 @@ def viz_coatcolor(home_dir, processed_df, top_n=5, chart_title="Enter Chart Titl
                     ha='center', va='bottom', fontsize=9, color='black')
     # Create a subplot for Dogs
     ax2 = plt.subplot(1, 2, 2)
-    sns.countplot(x='CoatColor', data=processed_df[processed_df['AnimalType'] == 'Dog'], order=top_dogs)
+    sns.barplot(x=dog_counts.index, y=dog_counts.values, order=top_dogs, ax=ax2)
     plt.title('Distribution of Coat Color for Dogs (Top {})'.format(top_n), fontsize=12)
     plt.xlabel('Coat Color')
     plt.ylabel('Number of Dogs (Total: {:,})'.format(total_dogs), fontsize=10)
@@ -627,7 +811,7 @@ def viz_coatcolor(home_dir, processed_df, top_n=5, chart_title="Enter Chart Titl
                     (p.get_x() + p.get_width() / 2., height), 
                     ha='center', va='bottom', fontsize=9, color='black')
     # Apply the custom y-axis formatter to both subplots
-    formatter = FuncFormatter(utils.format_y_tick)
+    formatter = plt.FuncFormatter(utils.format_y_tick)
     plt.gca().yaxis.set_major_formatter(formatter)  # This applies to the last subplot by default
     # Get all axes and apply the formatter to each
     axes = plt.gcf().get_axes()
@@ -638,8 +822,8 @@ def viz_coatcolor(home_dir, processed_df, top_n=5, chart_title="Enter Chart Titl
     ax2.text(1, -0.15, text, transform=ax2.transAxes, ha='right', color='red', fontsize=8)
     # Adjust layout
     plt.tight_layout()
-    # Show the plots
-    plt.show()
+    # Show the plot, or write it to save_path
+    return _show_or_save(save_path) or None
 
 
 
@@ -649,22 +833,14 @@ def viz_coatcolor(home_dir, processed_df, top_n=5, chart_title="Enter Chart Titl
 # CoatPattern
 # Function to filter top n coat pattern for a given animal type
 def get_top_coat_pattern(df, animal_type, AnimalID=r"AnimalID", top_n=5):
-    # Filter data for the given animal type
-    filtered_df = df[df['AnimalType'] == animal_type]
-    # Calculate the value counts for CoatPattern
-    total_counts = filtered_df[AnimalID].drop_duplicates().count()
-    missing = total_counts - filtered_df[[AnimalID, 'CoatPattern']].dropna().drop_duplicates()[AnimalID].drop_duplicates().count()
-    coat_pattern_counts = filtered_df['CoatPattern'].value_counts().head(top_n)
-    # Get the index (coat pattern) of the top n most common coat pattern
-    top_coat_colors = coat_pattern_counts.index.tolist()
-    return top_coat_colors, coat_pattern_counts, total_counts, missing
-def viz_coatpattern(home_dir, processed_df, top_n=5, chart_title="Enter Chart Title"):
-    # import required modules
-    sys.path.append(home_dir + r"/src")
-    import utils
+    cube = _as_cube(df, AnimalID=AnimalID)
+    # Get the top n most common coat patterns, the number of animals and the number of animals without a coat pattern
+    return _get_top_values(cube, animal_type, 'CoatPattern', top_n, 'coat_pattern_animals', 'type_animals', 'coat_pattern_known_animals')
+def viz_coatpattern(home_dir, processed_df, top_n=5, chart_title="Enter Chart Title", save_path=None):
     # Get top n coat pattern and their counts for Cats and Dogs
-    top_cats, cat_counts, total_cats, missing_cats = get_top_coat_pattern(df=processed_df, animal_type='Cat')
-    top_dogs, dog_counts, total_dogs, missing_dogs = get_top_coat_pattern(df=processed_df, animal_type='Dog')
+    cube = _as_cube(processed_df)
+    top_cats, cat_counts, total_cats, missing_cats = get_top_coat_pattern(df=cube, animal_type='Cat', top_n=top_n)
+    top_dogs, dog_counts, total_dogs, missing_dogs = get_top_coat_pattern(df=cube, animal_type='Dog', top_n=top_n)
     # Determine the maximum count from both datasets
     max_count = ((max(cat_counts.max(), dog_counts.max()) // 1000) + 1) * 1000
     # Set up the matplotlib figure
@@ -672,7 +848,7 @@ def viz_coatpattern(home_dir, processed_df, top_n=5, chart_title="Enter Chart Ti
     plt.suptitle(chart_title, fontsize=18)
     # Create a subplot for Cats
     ax1 = plt.subplot(1, 2, 1)
-    sns.countplot(x='CoatPattern', data=processed_df[processed_df['AnimalType'] == 'Cat'], order=top_cats)
+    sns.barplot(x=cat_counts.index, y=cat_counts.values, order=top_cats, ax=ax1)
     plt.title('Distribution of Coat Pattern for Cats (Top {})'.format(top_n))
     plt.xlabel('Coat Pattern')
     plt.ylabel('Number of Cats (Total: {:,})'.format(total_cats), fontsize=10)
@@ -689,7 +865,7 @@ def viz_coatpattern(home_dir, processed_df, top_n=5, chart_title="Enter Chart Ti
                     ha='center', va='bottom', fontsize=9, color='black')
     # Create a subplot for Dogs
     ax2 = plt.subplot(1, 2, 2)
-    sns.countplot(x='CoatPattern', data=processed_df[processed_df['AnimalType'] == 'Dog'], order=top_dogs)
+    sns.barplot(x=dog_counts.index, y=dog_counts.values, order=top_dogs, ax=ax2)
     plt.title('Distribution of Coat Pattern for Dogs (Top {})'.format(top_n), fontsize=12)
     plt.xlabel('Coat Pattern')
     plt.ylabel('Number of Dogs (Total: {:,})'.format(total_dogs), fontsize=10)
@@ -705,7 +881,7 @@ def viz_coatpattern(home_dir, processed_df, top_n=5, chart_title="Enter Chart Ti
                     (p.get_x() + p.get_width() / 2., height), 
                     ha='center', va='bottom', fontsize=9, color='black')
     # Apply the custom y-axis formatter to both subplots
-    formatter = FuncFormatter(utils.format_y_tick)
+    formatter = plt.FuncFormatter(utils.format_y_tick)
     plt.gca().yaxis.set_major_formatter(formatter)  # This applies to the last subplot by default
     # Get all axes and apply the formatter to each
     axes = plt.gcf().get_axes()
@@ -716,9 +892,112 @@ def viz_coatpattern(home_dir, processed_df, top_n=5, chart_title="Enter Chart Ti
     ax2.text(1, -0.15, text, transform=ax2.transAxes, ha='right', color='red', fontsize=8)
     # Adjust layout
     plt.tight_layout()
-    # Show the plots
-    plt.show()
-
-
-
-
+    # Show the plot, or write it to save_path
+    return _show_or_save(save_path) or None
+
+
+
+
+
+# Batch rendering
+# Charts of the chart pack: the viz function, the cube dimensions it reads and its default titles
+CHART_PACK = {
+    "outcometype": (viz_outcometype, ["OutcomeType"], {"chart_title": "Distribution of OutcomeType"}),
+    "animal_type": (viz_animal_type, ["AnimalType", "OutcomeType"], {"chart_title1": "Distribution of AnimalType", "chart_title2": "OutcomeType by AnimalType"}),
+    "age": (viz_age, ["AgeuponOutcome", "OutcomeType"], {"chart_title": "OutcomeType by Age Group"}),
+    "sex": (viz_sex, ["SexuponOutcome", "OutcomeType"], {"chart_title": "OutcomeType by Sex"}),
+    "sterilization": (viz_sterilization, ["Sterilization", "OutcomeType"], {"chart_title": "OutcomeType by Sterilization Status"}),
+    "breed": (viz_breed, ["AnimalType", "BreedDisplay"], {"chart_title": "Most Common Breeds"}),
+    "breed_mix": (viz_breed_mix, ["Mix", "OutcomeType"], {"chart_title1": "Mixed and Pure Breeds", "chart_title2": "OutcomeType by Mixed and Pure Breeds"}),
+    "coatcolor": (viz_coatcolor, ["AnimalType", "CoatColor"], {"chart_title": "Most Common Coat Colors"}),
+    "coatpattern": (viz_coatpattern, ["AnimalType", "CoatPattern"], {"chart_title": "Most Common Coat Patterns"})
+}
+
+
+def _render_chart(name, cube_slice, output_dir, fmt, titles):
+    # Runs in a worker process: draws one chart of the pack from its cube slice on the non-interactive Agg backend
+    plt.switch_backend('Agg')
+    viz_function = CHART_PACK[name][0]
+    return viz_function(None, cube_slice, save_path=os.path.join(output_dir, "{}.{}".format(name, fmt)), **titles)
+
+
+@instrumentation.instrument
+def render_chart_pack(cube, output_dir, fmt="png", n_workers=None, titles=None, charts=None):
+    """
+    Renders the chart pack to image files without a display, in parallel worker processes.
+
+    Every chart is drawn on matplotlib's Agg backend in a `ProcessPoolExecutor` worker. Workers receive only the
+    slice of the cube their chart reads (`slice_cube` over the dimensions listed in `CHART_PACK`, typically tens of
+    rows), never the processed frame.
+
+    Parameters:
+    cube (pd.DataFrame): A cube returned by `build_cube`.
+    output_dir (str): Destination directory. It is created if needed.
+    fmt (str, optional): "png" or "svg". Defaults to "png".
+    n_workers (int, optional): Number of worker processes, or 0 to render in this process. Defaults to `os.cpu_count()`.
+    titles (dict, optional): Title arguments per chart name, overriding the defaults in `CHART_PACK`, e.g. {"age": {"chart_title": "..."}}.
+    charts (list, optional): Names of the charts to render. Defaults to all of `CHART_PACK`.
+
+    Returns:
+    dict: The written files of each chart, keyed by chart name. Charts with two figures write <name>_1 and <name>_2.
+
+    Raises:
+    - ValueError: If `fmt` is not supported.
+
+    Example usage:
+    cube = build_cube(processed_df, breed, breed_mix, coat_color, coat_patterns)
+    files = render_chart_pack(cube, "/path/to/charts", fmt="svg")
+    """
+    if fmt not in RENDER_FORMATS:
+        raise ValueError("fmt must be one of {}, got {!r}".format(", ".join(RENDER_FORMATS), fmt))
+    titles = titles or {}
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = {
+        name: (slice_cube(cube, CHART_PACK[name][1]), {**CHART_PACK[name][2], **titles.get(name, {})})
+        for name in (charts or CHART_PACK)
+    }
+
+    if n_workers == 0:
+        # Render in this process, restoring the interactive backend afterwards
+        backend = plt.get_backend()
+        try:
+            return {name: _render_chart(name, cube_slice, output_dir, fmt, chart_titles) for name, (cube_slice, chart_titles) in jobs.items()}
+        finally:
+            plt.switch_backend(backend)
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {
+            name: executor.submit(_render_chart, name, cube_slice, output_dir, fmt, chart_titles)
+            for name, (cube_slice, chart_titles) in jobs.items()
+        }
+
+    return {name: future.result() for name, future in futures.items()}
+
+
+def benchmark_chart_pack(cube, output_dir, worker_counts=(1, 2, 4, 8), fmt="png"):
+    """
+    Measures the render time of the full chart pack in this process and with a number of worker processes.
+
+    Parameters:
+    cube (pd.DataFrame): A cube returned by `build_cube`.
+    output_dir (str): Scratch directory; each run writes to `<output_dir>/<workers>`.
+    worker_counts (list, optional): Worker counts to measure. Defaults to (1, 2, 4, 8).
+    fmt (str, optional): "png" or "svg". Defaults to "png".
+
+    Returns:
+    pd.DataFrame: One row per run with the number of workers (0 for the run in this process), the wall time in
+    seconds, the speedup over the run in this process and the number of files written.
+
+    Example usage:
+    report = benchmark_chart_pack(cube, "/tmp/chart_benchmark")
+    """
+    rows = []
+    for workers in [0] + list(worker_counts):
+        start = time.perf_counter()
+        files = render_chart_pack(cube, os.path.join(output_dir, str(workers)), fmt=fmt, n_workers=workers)
+        seconds = time.perf_counter() - start
+        rows.append({"workers": workers, "seconds": seconds, "files": sum(len(paths) for paths in files.values())})
+
+    report = pd.DataFrame(rows)
+    report.insert(2, "speedup", report["seconds"].iloc[0] / report["seconds"])
+    return report